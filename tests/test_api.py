@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""HTTP API мини-приложения: подпись initData, ETag и вызовы"""
+
+import asyncio
+import time
+from urllib.parse import parse_qsl, urlencode
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+from tigerrozetka_bot import Config, create_app
+from tigerrozetka_bot.api import FrontendAPI, etag_matches, sign_init_data, verify_init_data
+
+TOKEN = '123456:test-token'
+
+
+def test_init_data_valid():
+    user = verify_init_data(sign_init_data(TOKEN, 42, first_name='Тигр'), TOKEN)
+    assert user == {'id': 42, 'first_name': 'Тигр'}
+
+
+def test_init_data_tampered():
+    fields = dict(parse_qsl(sign_init_data(TOKEN, 42)))
+    fields['user'] = fields['user'].replace('42', '43')
+    assert verify_init_data(urlencode(fields), TOKEN) is None
+    assert verify_init_data(sign_init_data(TOKEN, 42), 'other:token') is None
+    assert verify_init_data('auth_date=1&user=%7B%7D', TOKEN) is None
+
+
+def test_init_data_expired():
+    now = time.time()
+    init_data = sign_init_data(TOKEN, 42, auth_date=int(now) - 7200)
+    assert verify_init_data(init_data, TOKEN, max_age=3600, now=now) is None
+    assert verify_init_data(init_data, TOKEN, max_age=86400, now=now)['id'] == 42
+
+
+@pytest.mark.parametrize('header, matches', [
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ('"x",W/"abc" ', True),
+    ('*', True),
+    ('"ab"', False),
+    ('"abcd"', False),
+    ('"x", "y"', False),
+    ('', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+def run_api(scenario):
+    """Приложение с хранилищем в памяти и пятью игроками; scenario(client, app, auth)"""
+    async def main():
+        app = create_app(Config(bot_token=TOKEN, storage_backend='memory'))
+        for user_id in range(1, 6):
+            await app.manager.register_user(user_id, f'user{user_id}', f'Игрок {user_id}', None)
+        api = FrontendAPI(app)
+
+        def auth(user_id):
+            return {'Authorization': f'tma {sign_init_data(TOKEN, user_id)}'}
+
+        async with TestClient(TestServer(api.web_app)) as client:
+            await scenario(client, app, auth)
+
+    asyncio.run(main())
+
+
+def test_players_requires_valid_init_data():
+    async def scenario(client, app, auth):
+        assert (await client.get('/api/duels/players')).status == 401
+        bad = {'Authorization': 'tma ' + sign_init_data('other:token', 1)}
+        assert (await client.get('/api/duels/players', headers=bad)).status == 401
+
+    run_api(scenario)
+
+
+def test_players_not_modified():
+    async def scenario(client, app, auth):
+        response = await client.get('/api/duels/players', headers=auth(1))
+        assert response.status == 200
+        body = await response.json()
+        assert 1 not in [player['id'] for player in body['players']]
+        etag = response.headers['ETag']
+
+        for header in (etag, f'"other", W/{etag}', '*'):
+            cached = await client.get('/api/duels/players', headers={**auth(1), 'If-None-Match': header})
+            assert cached.status == 304
+        stale = await client.get('/api/duels/players', headers={**auth(1), 'If-None-Match': etag[:-2] + '"'})
+        assert stale.status == 200
+
+    run_api(scenario)
+
+
+def test_invite_validation():
+    async def scenario(client, app, auth):
+        created = []
+
+        async def create_challenge(from_user_id, to_user_id):
+            created.append((from_user_id, to_user_id))
+            return 'duel-1'
+
+        app.api_create_duel_challenge = create_challenge
+        post = client.post
+        assert (await post('/api/duels/invite', headers=auth(1), json={})).status == 400
+        assert (await post('/api/duels/invite', headers=auth(1), json={'toUserId': 1})).status == 400
+        assert (await post('/api/duels/invite', headers=auth(1), json={'toUserId': 99})).status == 404
+
+        await app.manager.deactivate_user(3)
+        assert (await post('/api/duels/invite', headers=auth(1), json={'toUserId': 3})).status == 404
+
+        response = await post('/api/duels/invite', headers=auth(1), json={'toUserId': 2})
+        assert response.status == 200
+        assert await response.json() == {'success': True, 'duelId': 'duel-1'}
+        assert created == [(1, 2)]
+
+    run_api(scenario)
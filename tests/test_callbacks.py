@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Кодирование callback_data"""
+
+import uuid
+
+import pytest
+
+from tigerrozetka_bot import callbacks
+
+DUEL_ID = str(uuid.UUID('12345678-1234-5678-1234-567812345678'))
+
+
+@pytest.mark.parametrize('action, args', [
+    ('duel_menu', ()),
+    ('refresh_players', ()),
+    ('players_next', (12, 345, 987654321)),
+    ('players_prev', (0, 0, 1)),
+    ('challenge', (2 ** 40,)),
+    ('accept_duel', (DUEL_ID,)),
+    ('decline_duel', (DUEL_ID,)),
+    ('tournament_join', (7,)),
+])
+def test_round_trip(action, args):
+    data = callbacks.encode(action, *args)
+    assert len(data.encode()) <= 64  # Лимит Telegram на callback_data
+    assert callbacks.decode(data) == (action, args)
+
+
+def test_uuid_argument_is_compact():
+    assert len(callbacks.encode('accept_duel', DUEL_ID)) == 24
+
+
+def test_legacy_text_format():
+    assert callbacks.decode(f'accept_duel:{DUEL_ID}') == ('accept_duel', (DUEL_ID,))
+    assert callbacks.decode('players_next:3:10:42') == ('players_next', (3, 10, 42))
+    assert callbacks.decode('duel_menu') == ('duel_menu', ())
+
+
+@pytest.mark.parametrize('data', [
+    None, '', 'unknown:1', 'challenge:abc', 'challenge:1:2', 'accept_duel:not-a-uuid',
+    '!!!', 'AQ', 'AQU', 'AgE', 'CQ',
+])
+def test_garbage_is_rejected(data):
+    assert callbacks.decode(data) is None
+
+
+def test_truncated_payload_is_rejected():
+    data = callbacks.encode('accept_duel', DUEL_ID)
+    assert callbacks.decode(data[:-4]) is None
+    assert callbacks.decode(callbacks.encode('players_next', 1, 2, 300)[:-1]) is None
+
+
+def test_encode_validates_arguments():
+    with pytest.raises(ValueError):
+        callbacks.encode('challenge')
+    with pytest.raises(ValueError):
+        callbacks.encode('challenge', -1)
+    with pytest.raises(KeyError):
+        callbacks.encode('no_such_action')
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Итоги дуэлей: статистика, сезон и рейтинг игроков"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from tigerrozetka_bot.config import Config
+from tigerrozetka_bot.manager import TigerRozetkaBotManager
+
+
+def make_manager(backend, tmp_path):
+    manager = TigerRozetkaBotManager(Config(storage_backend=backend, database_path=str(tmp_path / 'bot.db')))
+
+    async def setup():
+        for user_id in (1, 2):
+            await manager.register_user(user_id, None, f"Игрок {user_id}", None)
+        return await manager.storage.duels.create(1, 2, datetime.now() + timedelta(minutes=5))
+
+    return manager, asyncio.run(setup())
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_draw_is_a_game_without_win_or_loss(backend, tmp_path):
+    manager, duel_id = make_manager(backend, tmp_path)
+
+    async def scenario():
+        await manager.save_duel_result(duel_id, 1, 2, None, (3, 3), b'')
+        return [await manager.get_user_stats(user_id) for user_id in (1, 2)]
+
+    for stats in asyncio.run(scenario()):
+        assert (stats['total_games'], stats['wins'], stats['losses']) == (1, 0, 0)
+    assert [manager.season_tracker.stats(user_id) for user_id in (1, 2)] == [(0, 1), (0, 1)]
+    assert asyncio.run(manager.get_head_to_head(1, [2])) == {2: (0, 0, 1)}
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'memory'])
+def test_win_and_loss_are_counted(backend, tmp_path):
+    manager, duel_id = make_manager(backend, tmp_path)
+
+    async def scenario():
+        await manager.save_duel_result(duel_id, 1, 2, 2, (1, 4), b'')
+        return [await manager.get_user_stats(user_id) for user_id in (1, 2)]
+
+    loser, winner = asyncio.run(scenario())
+    assert (loser['total_games'], loser['wins'], loser['losses']) == (1, 0, 1)
+    assert (winner['total_games'], winner['wins'], winner['losses']) == (1, 1, 0)
+    assert [manager.season_tracker.stats(user_id) for user_id in (1, 2)] == [(0, 1), (1, 1)]
+
+
+def test_stats_show_rating_while_batch_is_written(tmp_path):
+    manager, duel_id = make_manager('memory', tmp_path)
+    users = manager.storage.users
+    apply_ratings = users.apply_ratings
+    seen = []
+
+    async def apply_during_stats(updates):
+        seen.append(await manager.get_user_stats(1))
+        await apply_ratings(updates)
+
+    users.apply_ratings = apply_during_stats
+
+    async def scenario():
+        await manager.save_duel_result(duel_id, 1, 2, 1, (5, 0), b'')
+        await manager.flush_ratings()
+        return await manager.get_user_stats(1)
+
+    stored = asyncio.run(scenario())
+    assert seen[0]['rating'] == stored['rating'] == 1520.0
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Присутствие: корзины скользящего окна"""
+
+from tigerrozetka_bot.presence import PresenceTracker
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_tracker():
+    clock = Clock()
+    return clock, PresenceTracker(window=60, bucket=15, clock=clock)
+
+
+def test_users_expire_with_their_bucket():
+    clock, tracker = make_tracker()
+    tracker.touch(1)
+    clock.now += 30
+    tracker.touch(2)
+    assert tracker.online() == [2, 1] and len(tracker) == 2
+
+    clock.now += 45  # Корзина игрока 1 вышла из окна
+    assert 1 not in tracker and 2 in tracker
+    assert tracker.online() == [2]
+    assert tracker.stats()['buckets'] == 1
+
+
+def test_touch_moves_user_to_latest_bucket():
+    clock, tracker = make_tracker()
+    tracker.touch(1)
+    tracker.touch(2)
+    clock.now += 30
+    tracker.touch(1)
+    assert tracker.online() == [1, 2]
+    clock.now += 30
+    assert tracker.online() == [1]
+
+
+def test_online_limit_and_exclude():
+    clock, tracker = make_tracker()
+    for user_id in range(1, 6):
+        tracker.touch(user_id)
+        clock.now += 15
+    assert tracker.online(limit=2) == [5, 4]
+    assert tracker.online(exclude_user_id=5, limit=2) == [4, 3]
+
+
+def test_merge_does_not_override_newer_events():
+    clock, tracker = make_tracker()
+    tracker.touch(1)
+    tracker.merge([(1, 45), (2, 20), (3, 600)])
+    assert tracker.online() == [1, 2]
+    clock.now += 45  # Событие игрока 2 было 65 с назад
+    assert tracker.online() == [1]
+
+
+def test_take_unsaved():
+    clock, tracker = make_tracker()
+    tracker.touch(1)
+    tracker.touch(1)
+    tracker.merge([(2, 0)])  # Из базы - записывать повторно не нужно
+    assert tracker.take_unsaved() == [1]
+    assert tracker.take_unsaved() == []
+    tracker.touch(1)  # Та же корзина - без записи
+    assert tracker.take_unsaved() == []
+    clock.now += 15
+    tracker.touch(1)
+    assert tracker.take_unsaved() == [1]
+    assert tracker.touches == 4
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""Рейтинг Эло: формула, пакетная запись и пересчет по истории"""
+
+import asyncio
+
+import pytest
+
+from tigerrozetka_bot.ratings import EloModel, RatingEngine, replay, sample_results
+from tigerrozetka_bot.storage import InMemoryUserRepository
+
+
+def test_update_is_zero_sum_for_equal_k():
+    model = EloModel()
+    first, second = model.update((1500.0, 50), (1500.0, 50), 1.0)
+    assert first == (1510.0, 51) and second == (1490.0, 51)
+    (favourite, _), (underdog, _) = model.update((1600.0, 50), (1400.0, 50), 0.5)
+    assert favourite < 1600.0 and favourite - 1600.0 == pytest.approx(1400.0 - underdog)
+
+
+def test_provisional_players_move_faster():
+    model = EloModel()
+    (newcomer, _), (veteran, _) = model.update((1500.0, 0), (1500.0, 100), 1.0)
+    assert newcomer - 1500.0 == pytest.approx(model.k_provisional / 2)
+    assert 1500.0 - veteran == pytest.approx(model.k / 2)
+
+
+def test_level_from_rating():
+    model = EloModel()
+    assert model.level(1200.0) == 1
+    assert model.level(model.initial) == 1
+    assert model.level(model.initial + model.level_step) == 2
+    assert model.level(model.initial + 3.5 * model.level_step) == 4
+
+
+class FlakyUsers(InMemoryUserRepository):
+    """Репозиторий, у которого запись рейтингов падает заданное число раз"""
+
+    def __init__(self, failures=0):
+        super().__init__()
+        self.failures = failures
+        self.batches = []
+
+    async def apply_ratings(self, updates):
+        if self.failures:
+            self.failures -= 1
+            raise OSError('database is locked')
+        self.batches.append(sorted(updates))
+        await super().apply_ratings(updates)
+
+
+def make_engine(failures=0, batch_size=100):
+    users = FlakyUsers(failures)
+    for user_id in (1, 2, 3):
+        asyncio.run(users.upsert(user_id, None, None, None, None))
+    return users, RatingEngine(users, batch_size=batch_size)
+
+
+def test_results_are_batched_until_flush():
+    users, engine = make_engine()
+
+    async def scenario():
+        await engine.record(1, 2, 1)
+        await engine.record(1, 3, None)
+        assert users.batches == []
+        assert (await engine.states([1]))[1][1] == 2  # Вторая игра видит первую
+        return await engine.flush()
+
+    assert asyncio.run(scenario()) == 3
+    assert len(users.batches) == 1 and engine.pending == {}
+    assert users.rows[1]['rating'] > 1500.0 > users.rows[2]['rating']
+    assert engine.stats() == {'recorded': 2, 'flushed': 3, 'pending': 0}
+
+
+def test_batch_size_triggers_flush():
+    users, engine = make_engine(batch_size=2)
+    asyncio.run(engine.record(1, 2, 2))
+    assert len(users.batches) == 1 and engine.pending == {}
+
+
+def test_failed_flush_keeps_pending():
+    users, engine = make_engine(failures=1)
+
+    async def scenario():
+        await engine.record(1, 2, 1)
+        before = dict(engine.pending)
+        with pytest.raises(OSError):
+            await engine.flush()
+        assert engine.pending == before
+        return before, await engine.flush()
+
+    before, flushed = asyncio.run(scenario())
+    assert flushed == 2
+    assert users.rows[1]['rating'] == before[1][0]
+
+
+def test_results_during_flush_see_flushed_ratings():
+    users, engine = make_engine()
+
+    async def scenario():
+        await engine.record(1, 2, 1)
+        original = users.apply_ratings
+
+        async def apply_during_game(updates):
+            await engine.record(1, 3, 1)
+            await original(updates)
+
+        users.apply_ratings = apply_during_game
+        await engine.flush()
+        users.apply_ratings = original
+        return engine.pending[1], await engine.flush()
+
+    (rating, games), _ = asyncio.run(scenario())
+    assert games == 2 and users.rows[1]['rating'] == rating
+    assert engine.level(1) is None
+
+
+def test_failed_flush_does_not_overwrite_newer_results():
+    users, engine = make_engine(failures=1)
+
+    async def scenario():
+        await engine.record(1, 2, 1)
+        original = users.apply_ratings
+
+        async def apply_during_game(updates):
+            # Пока идет запись, игрок 1 успевает сыграть еще раз
+            await engine.record(1, 3, 1)
+            await original(updates)
+
+        users.apply_ratings = apply_during_game
+        with pytest.raises(OSError):
+            await engine.flush()
+        return engine.pending[1]
+
+    assert asyncio.run(scenario())[1] == 2
+
+
+def test_replay_matches_sequential_updates():
+    results = sample_results(players=50, games=400, seed=3)
+    model = EloModel()
+    states = {}
+    for player1_id, player2_id, winner_id in results:
+        score = 0.5 if winner_id is None else float(winner_id == player1_id)
+        states[player1_id], states[player2_id] = model.update(
+            states.get(player1_id, (model.initial, 0)), states.get(player2_id, (model.initial, 0)), score)
+
+    for vectorized in (False, True):
+        if vectorized:
+            pytest.importorskip('numpy')
+        replayed = replay(results, model, vectorized=vectorized)
+        assert replayed.keys() == states.keys()
+        for user_id, (rating, games) in states.items():
+            assert replayed[user_id][0] == pytest.approx(rating)
+            assert replayed[user_id][1] == games
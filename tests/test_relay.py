@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Ретрансляция дуэлей: сохранение итога и повтор после сбоя"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from tigerrozetka_bot.config import Config
+from tigerrozetka_bot.manager import TigerRozetkaBotManager
+from tigerrozetka_bot.push import PushHub
+from tigerrozetka_bot.relay import DuelMatch, DuelRelay
+
+
+def test_failed_save_is_retried_without_double_counting(tmp_path):
+    manager = TigerRozetkaBotManager(Config(database_path=str(tmp_path / 'bot.db')))
+    relay = DuelRelay(manager, PushHub())
+    users = manager.storage.users
+    record_result = users.record_result
+    failures = [2]  # Запись результата второго игрока падает один раз
+
+    async def flaky_record_result(user_id, won):
+        if user_id in failures:
+            failures.remove(user_id)
+            raise OSError('database is locked')
+        return await record_result(user_id, won)
+
+    users.record_result = flaky_record_result
+
+    async def scenario():
+        for user_id in (1, 2):
+            await manager.register_user(user_id, None, f"Игрок {user_id}", None)
+        duel_id = await manager.storage.duels.create(1, 2, datetime.now() + timedelta(minutes=5))
+        started = time.monotonic() - 10
+        relay.matches[duel_id] = DuelMatch(duel_id, 1, 2, joined={1, 2}, starts_at=started,
+                                           ends_at=started + 5, scores={1: 30, 2: 10},
+                                           ticks={1: [(1000, 30)], 2: [(1000, 10)]})
+
+        await relay.tick()
+        assert duel_id in relay.matches and relay.finished == 0
+        await relay.tick()
+        assert duel_id not in relay.matches and relay.finished == 1
+
+        await manager.flush_ratings()
+        return [await manager.get_user_stats(user_id) for user_id in (1, 2)]
+
+    winner, loser = asyncio.run(scenario())
+    assert (winner['total_games'], winner['wins'], winner['losses']) == (1, 1, 0)
+    assert (loser['total_games'], loser['wins'], loser['losses']) == (1, 0, 1)
+    assert winner['rating'] == 1520.0 and loser['rating'] == 1480.0
+    assert [manager.season_tracker.stats(user_id) for user_id in (1, 2)] == [(1, 1), (0, 1)]
+    assert asyncio.run(manager.get_head_to_head(1, [2])) == {2: (1, 0, 0)}
+    assert len(asyncio.run(manager.get_duel_history(1))) == 1
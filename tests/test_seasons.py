@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Сезонная таблица: порядок мест и снимки"""
+
+from tigerrozetka_bot.seasons import SeasonTracker
+from tigerrozetka_bot.storage import InMemoryStorage
+
+
+def make_tracker():
+    storage = InMemoryStorage()
+    tracker = SeasonTracker(storage.connect_state)
+    conn = storage.connect_state()
+    tracker.init_tables(conn.cursor())
+    conn.commit()
+    conn.close()
+    return storage, tracker
+
+
+def play(tracker, user_id, wins, losses):
+    for won in [True] * wins + [False] * losses:
+        tracker.record(user_id, won)
+
+
+def test_fewer_games_rank_higher_at_equal_wins():
+    _, tracker = make_tracker()
+    play(tracker, 1, 3, 2)
+    play(tracker, 2, 3, 0)
+    play(tracker, 3, 1, 0)
+    play(tracker, 4, 3, 0)
+    assert tracker.top() == [
+        {'rank': 1, 'user_id': 2, 'wins': 3, 'games': 3},
+        {'rank': 1, 'user_id': 4, 'wins': 3, 'games': 3},
+        {'rank': 3, 'user_id': 1, 'wins': 3, 'games': 5},
+        {'rank': 4, 'user_id': 3, 'wins': 1, 'games': 1},
+    ]
+    assert (tracker.rank(1), tracker.rank(4), tracker.rank(99)) == (3, 1, None)
+    assert tracker.stats(1) == (3, 5)
+
+
+def test_snapshot_and_reload():
+    storage, tracker = make_tracker()
+    play(tracker, 1, 2, 1)
+    play(tracker, 2, 2, 0)
+    assert tracker.snapshot() == 2
+    assert tracker.snapshot() == 0  # Без изменений снимок не пишется
+    assert tracker.past_rank(tracker.current, 1) == {'rank': 2, 'wins': 2, 'games': 3}
+
+    reloaded = SeasonTracker(storage.connect_state)
+    reloaded.load()
+    assert reloaded.top() == tracker.top()
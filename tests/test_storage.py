@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Хранилище: SQLite (в том числе с шардами), память, поиск и keyset-пагинация"""
+
+import asyncio
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from tigerrozetka_bot.sharding import ShardRouter, reshard
+from tigerrozetka_bot.storage import InMemoryStorage, SQLiteStorage, Storage
+
+PLAYERS = [
+    # user_id, username, first_name, level, wins
+    (1, 'tiger', 'Тигран', 5, 40),
+    (2, 'tigress', 'Анна', 5, 41),
+    (3, 'rozetka', 'Розалия', 7, 10),
+    (4, 'volt', 'Тимур', 3, 3),
+    (5, 'ampere', 'Ампер', 1, 0),
+    (6, None, 'Тимофей', 3, 12),
+]
+
+
+def make_storage(kind, tmp_path):
+    if kind == 'memory':
+        storage = InMemoryStorage()
+    else:
+        storage = SQLiteStorage(str(tmp_path / 'bot.db'), shards=3 if kind == 'sharded' else 1)
+    storage.init()
+    return storage
+
+
+async def fill(storage, seen_at=None):
+    seen_at = seen_at or datetime.now()
+    for user_id, username, first_name, level, wins in PLAYERS:
+        await storage.users.upsert(user_id, username, first_name, None, seen_at)
+    await storage.users.apply_ratings([(user_id, 1500.0, level) for user_id, _, _, level, _ in PLAYERS])
+    for user_id, _, _, _, wins in PLAYERS:
+        for _ in range(wins):
+            await storage.users.record_result(user_id, True)
+
+
+@pytest.fixture(params=['sqlite', 'sharded', 'memory'])
+def storage(request, tmp_path):
+    storage = make_storage(request.param, tmp_path)
+    asyncio.run(fill(storage))
+    return storage
+
+
+def test_upsert_keeps_stats(storage):
+    async def scenario():
+        await storage.users.upsert(3, 'rozetka2', 'Роза', None, datetime.now())
+        return await storage.users.get_players([3])
+
+    player = asyncio.run(scenario())[3]
+    assert (player['username'], player['level'], player['wins']) == ('rozetka2', 7, 10)
+
+
+def test_active_top_order(storage):
+    since = datetime.now() - timedelta(days=7)
+    top = asyncio.run(storage.users.active_top(None, since, 4))
+    assert [player['id'] for player in top] == [3, 2, 1, 6]
+
+
+def test_keyset_pagination_walks_all_players(storage):
+    since = datetime.now() - timedelta(days=7)
+
+    async def walk():
+        pages, cursor = [], None
+        while True:
+            page = await storage.users.active_page(5, since, cursor, False, 2)
+            if not page:
+                return pages
+            pages.append([player['id'] for player in page])
+            last = page[-1]
+            cursor = (last['level'], last['wins'], last['id'])
+
+    pages = asyncio.run(walk())
+    assert pages == [[3, 2], [1, 6], [4]]
+
+    # Назад от третьей страницы - вторая (в порядке обхода: от ближайшего)
+    back = asyncio.run(storage.users.active_page(5, since, (3, 3, 4), True, 2))
+    assert [player['id'] for player in back] == [6, 1]
+
+
+def test_pagination_skips_inactive_and_stale(storage):
+    async def scenario():
+        await storage.users.deactivate([3])
+        await storage.users.touch([4], datetime.now() - timedelta(days=30))
+        return await storage.users.active_top(None, datetime.now() - timedelta(days=7), 10)
+
+    assert [player['id'] for player in asyncio.run(scenario())] == [2, 1, 6, 5]
+
+
+def test_search_by_prefix(storage):
+    def ids(query, exclude=None):
+        return [player['id'] for player in asyncio.run(storage.users.search(query, exclude, 10))]
+
+    assert ids('tig') == [2, 1]
+    assert ids('@tigress') == [2]
+    assert ids('тим') == [6, 4]
+    assert ids('тим', exclude=6) == [4]
+    assert ids('розалия') == [3]
+    assert ids('!!!') == []
+    assert ids('nobody') == []
+
+
+def test_search_index_follows_renames(tmp_path):
+    storage = make_storage('sqlite', tmp_path)
+    asyncio.run(fill(storage))
+    assert storage.users.search_enabled
+
+    async def scenario():
+        await storage.users.upsert(5, 'watt', 'Ватт', None, datetime.now())
+        return (await storage.users.search('amp', None, 10), await storage.users.search('wat', None, 10))
+
+    old, new = asyncio.run(scenario())
+    assert old == [] and [player['id'] for player in new] == [5]
+
+
+def test_duels_live_in_owner_shard(tmp_path):
+    storage = make_storage('sharded', tmp_path)
+    router = storage.router
+
+    async def scenario():
+        return [await storage.duels.create(user_id, None, datetime.now() + timedelta(minutes=5))
+                for user_id in range(1, 20)]
+
+    for user_id, duel_id in zip(range(1, 20), asyncio.run(scenario())):
+        assert router.duel_shard(duel_id) == router.user_shard(user_id)
+        assert asyncio.run(storage.duels.get(duel_id))['player1_id'] == user_id
+
+
+def test_claim_is_exclusive(storage):
+    async def scenario():
+        duel_id = await storage.duels.create(1, None, datetime.now() + timedelta(minutes=5))
+        return await storage.duels.claim(duel_id, 2), await storage.duels.claim(duel_id, 3)
+
+    assert asyncio.run(scenario()) == (True, False)
+
+
+def test_memory_backend_keeps_state_off_disk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    first, second = InMemoryStorage(), InMemoryStorage()
+    conn = first.connect_state()
+    conn.execute('CREATE TABLE state (value INTEGER)')
+    conn.execute('INSERT INTO state VALUES (1)')
+    conn.commit()
+    conn.close()
+
+    assert first.connect_state().execute('SELECT value FROM state').fetchall() == [(1,)]
+    with pytest.raises(sqlite3.OperationalError):
+        second.connect_state().execute('SELECT value FROM state')
+    assert os.listdir(tmp_path) == []
+
+
+def test_reshard_moves_rows_to_owner_shards(tmp_path):
+    source = make_storage('sqlite', tmp_path)
+    asyncio.run(fill(source))
+    duel_id = asyncio.run(source.duels.create(4, 5, datetime.now() + timedelta(minutes=5)))
+
+    output = tmp_path / 'resharded'
+    reshard(source.database_path, 1, 3, str(output))
+
+    target = SQLiteStorage(str(output / 'bot.db'), shards=3)
+    target.init()
+    router = ShardRouter(str(output / 'bot.db'), 3)
+    for user_id, *_ in PLAYERS:
+        conn = sqlite3.connect(router.user_path(user_id))
+        assert conn.execute('SELECT 1 FROM bot_users WHERE user_id = ?', (user_id,)).fetchone()
+        conn.close()
+    players = asyncio.run(target.users.get_players([user_id for user_id, *_ in PLAYERS]))
+    assert {user_id: player['wins'] for user_id, player in players.items()} == \
+        {user_id: wins for user_id, _, _, _, wins in PLAYERS}
+    assert asyncio.run(target.duels.get(duel_id))['player2_id'] == 5
+    # Индекс поиска в новых шардах строится при init()
+    assert [player['id'] for player in asyncio.run(target.users.search('tig', None, 10))] == [2, 1]
+
+    with pytest.raises(FileExistsError):
+        reshard(source.database_path, 1, 3, str(output))
+
+
+def test_backend_must_provide_state_database():
+    class NoStateStorage(Storage):
+        pass
+
+    memory = InMemoryStorage()
+    with pytest.raises(TypeError):
+        NoStateStorage(memory.users, memory.duels, memory.history, memory.outbox)
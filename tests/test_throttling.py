@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Защита от спама: скользящее окно и лимиты middleware"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from tigerrozetka_bot import callbacks
+from tigerrozetka_bot.throttling import SlidingWindowCounter, ThrottlingMiddleware, parse_limits
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_limits():
+    assert parse_limits(' challenge=5/60, inline=20/30.5 ,') == {'challenge': (5, 60.0), 'inline': (20, 30.5)}
+
+
+def test_sliding_window_weights_previous_window():
+    counter = SlidingWindowCounter()
+    key = ('user', 1)
+    for _ in range(10):
+        counter.add(key, 60, 30)
+    assert counter.estimate(key, 60, 59) == 10
+    # Середина следующего окна: половина прошлых событий
+    assert counter.estimate(key, 60, 90) == pytest.approx(5)
+    # Через окно прошлые события забыты
+    assert counter.estimate(key, 60, 200) == 0
+
+
+def test_sliding_window_prune():
+    counter = SlidingWindowCounter()
+    counter.add(('user', 1), 60, 0)
+    counter.add(('challenge', 1), 60, 100)
+    counter.add(('gone', 1), 60, 100)
+    assert counter.prune({'user': 60, 'challenge': 60}, 150) == 2
+    assert len(counter) == 1
+
+
+def test_user_limit():
+    clock = Clock()
+    throttling = ThrottlingMiddleware({'user': (3, 60)}, clock=clock)
+    assert [throttling.allow(1) for _ in range(4)] == [True, True, True, False]
+    assert throttling.allow(2)
+    clock.now += 120
+    assert throttling.allow(1)
+    assert throttling.stats()['throttled'] == {'user': 1}
+
+
+def test_challenge_scopes():
+    clock = Clock()
+    throttling = ThrottlingMiddleware({'challenge': (10, 60), 'challenge_pair': (2, 300),
+                                       'challenge_target': (3, 300)}, clock=clock)
+    assert throttling.allow(1, 'challenge', 9) and throttling.allow(1, 'challenge', 9)
+    assert not throttling.allow(1, 'challenge', 9)  # Третий вызов той же цели
+    assert throttling.allow(2, 'challenge', 9)
+    assert not throttling.allow(3, 'challenge', 9)  # Цель получила уже три вызова
+    assert throttling.allow(3, 'challenge', 8)
+    assert throttling.throttled == {'challenge_pair': 1, 'challenge_target': 1}
+
+
+def test_rejected_events_are_not_counted():
+    throttling = ThrottlingMiddleware({'user': (5, 60), 'refresh_players': (1, 60)}, clock=Clock())
+    assert throttling.allow(1, 'refresh_players')
+    for _ in range(10):
+        assert not throttling.allow(1, 'refresh_players')
+    assert throttling.allow(1, 'stats')
+
+
+def test_classify():
+    classify = ThrottlingMiddleware.classify
+    assert classify(SimpleNamespace(data=callbacks.encode('challenge', 42))) == ('challenge', 42)
+    assert classify(SimpleNamespace(data=callbacks.encode('players_next', 1, 2, 3))) == ('players_page', None)
+    assert classify(SimpleNamespace(data='garbage')) == (None, None)
+    assert classify(SimpleNamespace(query='tig', offset='')) == ('inline', None)
+    assert classify(SimpleNamespace(text='/duel@TigerRozetkaBot')) == ('duel', None)
+    assert classify(SimpleNamespace(text='/duel tig')) == ('search', None)
+    assert classify(SimpleNamespace(text='привет')) == (None, None)
+
+
+def test_middleware_answers_dropped_callbacks():
+    throttling = ThrottlingMiddleware({'refresh_players': (1, 60)}, clock=Clock())
+    answers, handled = [], []
+
+    async def answer(text, show_alert=False):
+        answers.append(text)
+
+    async def handler(event, data):
+        handled.append(event)
+        return 'ok'
+
+    event = SimpleNamespace(from_user=SimpleNamespace(id=1), data=callbacks.encode('refresh_players'),
+                            answer=answer)
+
+    async def scenario():
+        return [await throttling(handler, event, {}) for _ in range(2)]
+
+    assert asyncio.run(scenario()) == ['ok', None]
+    assert len(handled) == 1 and len(answers) == 1
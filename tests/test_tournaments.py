@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""Турниры: сетка, пропуски, ничьи и технические победы по дедлайну"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from tigerrozetka_bot.config import Config
+from tigerrozetka_bot.manager import TigerRozetkaBotManager
+from tigerrozetka_bot.tournaments import bracket_order, round_name
+
+START = datetime(2026, 10, 19, 12, 0)
+
+
+@pytest.mark.parametrize('size', [2, 4, 8, 16, 64])
+def test_bracket_order(size):
+    order = bracket_order(size)
+    assert sorted(order) == list(range(1, size + 1))
+    # В первом раунде посевы в паре дают в сумме size + 1
+    assert all(order[i] + order[i + 1] == size + 1 for i in range(0, size, 2))
+    # Первый и второй посевы - в разных половинах сетки
+    assert order.index(1) < size // 2 <= order.index(2)
+
+
+def test_bracket_order_eight():
+    assert bracket_order(8) == [1, 8, 4, 5, 2, 7, 3, 6]
+
+
+def test_round_names():
+    assert [round_name(r, 4) for r in range(1, 5)] == ["1/8 финала", "1/4 финала", "полуфинал", "финал"]
+
+
+async def start_tournament(players):
+    """Турнир на players игроков: игрок 100+i получает i-й посев"""
+    manager = TigerRozetkaBotManager(Config(storage_backend='memory'))
+    user_ids = [100 + seed for seed in range(1, players + 1)]
+    for user_id in user_ids:
+        await manager.register_user(user_id, None, f"Игрок {user_id}", None)
+    await manager.storage.users.apply_ratings([(user_id, 2000.0 - user_id, 1) for user_id in user_ids])
+    engine = manager.tournaments
+    notified = []
+    engine.notify = lambda user_id, text, duel_id: notified.append(user_id)
+    tournament_id = engine.create("Кубок", START, round_minutes=15)
+    assert engine.register(tournament_id, user_ids) == players
+    tournament = await engine.start(tournament_id, START)
+    return manager, engine, tournament, notified
+
+
+def test_seeding_and_byes():
+    async def scenario():
+        manager, engine, tournament, notified = await start_tournament(5)
+        assert tournament.size == 8 and tournament.round == 1
+        first_round = tournament.round_matches(1)
+        assert [(match.seed1, match.seed2) for match in first_round] == [(1, None), (4, 5), (2, None), (3, None)]
+        assert [match.result for match in first_round] == ['bye', None, 'bye', 'bye']
+        # Пропустившие раунд уже ждут соперников во втором
+        second_round = tournament.round_matches(2)
+        assert (second_round[0].player1_id, second_round[1].player1_id, second_round[1].player2_id) == \
+            (101, 102, 103)
+        # Дуэль создана только для реального матча
+        playable = first_round[1]
+        duel = await manager.get_duel_info(playable.duel_id)
+        assert duel['status'] == 'accepted' and {duel['player1_id'], duel['player2_id']} == {104, 105}
+        assert sorted(notified) == [104, 105]
+
+    asyncio.run(scenario())
+
+
+def test_results_advance_to_final():
+    async def scenario():
+        manager, engine, tournament, _ = await start_tournament(4)
+        semifinals = tournament.round_matches(1)
+        assert await engine.on_result(semifinals[0].duel_id, semifinals[0].player2_id, START)  # Посев 4
+        assert tournament.round == 1
+        assert await engine.on_result(semifinals[1].duel_id, None, START)  # Ничья - посеву 2
+        assert tournament.round == 2
+        final = tournament.round_matches(2)[0]
+        assert (final.player1_id, final.player2_id, final.seed1, final.seed2) == (104, 102, 4, 2)
+        assert semifinals[1].result == 'draw'
+        assert not await engine.on_result('not-a-tournament-duel', 101)
+
+        await engine.on_result(final.duel_id, 104, START)
+        assert tournament.id not in engine.running and final.winner_id == 104
+
+    asyncio.run(scenario())
+
+
+def test_walkover_after_deadline():
+    async def scenario():
+        manager, engine, tournament, _ = await start_tournament(4)
+        match = tournament.round_matches(1)[0]
+
+        await engine.tick(START + timedelta(minutes=14))
+        assert match.winner_id is None
+
+        await engine.tick(START + timedelta(minutes=16))
+        assert (match.result, match.winner_id) == ('walkover', 101)
+        assert await manager.get_duel_info(match.duel_id) is None
+
+    asyncio.run(scenario())
+
+
+def test_no_walkover_while_result_pending():
+    async def scenario():
+        manager, engine, tournament, _ = await start_tournament(4)
+        relayed, playing = tournament.round_matches(1)
+        deadline = START + timedelta(minutes=15)
+
+        # Первый матч еще в ретрансляции, второй идет с концом игры на дедлайне
+        engine.in_progress = lambda duel_id: duel_id == relayed.duel_id
+        await manager.storage.duels.update_game(playing.duel_id, 'playing', None, deadline)
+
+        await engine.tick(deadline + timedelta(seconds=10))
+        assert relayed.winner_id is None and playing.winner_id is None
+
+        # Итог пришел вовремя
+        await engine.on_result(relayed.duel_id, relayed.player2_id, deadline)
+        assert relayed.result == 'played'
+
+        # Запас на сохранение итога исчерпан
+        await engine.tick(deadline + engine.result_grace + timedelta(seconds=1))
+        assert (playing.result, playing.winner_id) == ('walkover', playing.favourite())
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_without_players():
+    async def scenario():
+        manager = TigerRozetkaBotManager(Config(storage_backend='memory'))
+        engine = manager.tournaments
+        tournament_id = engine.create("Пусто", START)
+        engine.register(tournament_id, [1])
+        assert await engine.start(tournament_id, START) is None
+        assert engine.open_registration() is None
+        # Повторный старт не находит турнир в статусе регистрации
+        assert await engine.start(tournament_id, START) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Telegram Bot (aiogram)
+Импорт пакета не загружает aiogram: Bot и Dispatcher создаются в create_app() по требованию.
+
+Запуск:
+    python -m tigerrozetka_bot
+    python -m tigerrozetka_bot workers 4
+    python -m tigerrozetka_bot run --handoff    (перезапуск без потери обновлений)
+    python -m tigerrozetka_bot check-startup --budget-ms 300
+"""
+
+from .app import BotApp, create_app
+from .config import Config
+
+__all__ = ['BotApp', 'Config', 'create_app']
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - точка входа:
+    python -m tigerrozetka_bot [run|workers N] [--handoff]
+    python -m tigerrozetka_bot check-startup | push-bench | migrate-game-data | game-data-bench
+    python -m tigerrozetka_bot recompute-ratings | ratings-bench
+    python -m tigerrozetka_bot tournament-create NAME [--start-in 60] | tournament-sim
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+# Выполняется в отдельном интерпретаторе, чтобы мерить холодный старт
+_STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import tigerrozetka_bot
+imported = time.perf_counter()
+tigerrozetka_bot.create_app(tigerrozetka_bot.Config(database_path=sys.argv[1], storage_backend='memory'))
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_ms': (created - imported) * 1000,
+    'aiogram_loaded': 'aiogram' in sys.modules,
+}))
+"""
+
+
+def check_startup(budget_ms: float) -> int:
+    """Проверка времени импорта пакета и создания приложения"""
+    import tempfile
+
+    # Пакет должен импортироваться в дочернем процессе из любого рабочего каталога
+    env = dict(os.environ)
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        result = subprocess.run(
+            [sys.executable, '-c', _STARTUP_PROBE, os.path.join(tmp, 'startup.db')],
+            capture_output=True, text=True, env=env
+        )
+    if result.returncode != 0:
+        print(f"❌ Ошибка при запуске пакета:\n{result.stderr}")
+        return 1
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    total = timings['import_ms'] + timings['create_ms']
+
+    print(f"⏱️ Импорт пакета:       {timings['import_ms']:.1f} мс")
+    print(f"⏱️ create_app():        {timings['create_ms']:.1f} мс")
+    print(f"⏱️ Итого:               {total:.1f} мс (бюджет {budget_ms:.0f} мс)")
+
+    if timings['aiogram_loaded']:
+        print("❌ aiogram загружен при импорте - его нужно импортировать лениво")
+        return 1
+    if total > budget_ms:
+        print("❌ Бюджет времени запуска превышен")
+        return 1
+    print("✅ Запуск укладывается в бюджет")
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='tigerrozetka_bot', description="TigerRozetka Telegram Bot")
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='запуск бота (по умолчанию)')
+    run_parser.add_argument('--handoff', action='store_true', help='перехватить работу у запущенного процесса')
+    workers_parser = subparsers.add_parser('workers', help='запуск с N рабочими процессами')
+    workers_parser.add_argument('count', type=int, nargs='?', default=os.cpu_count() or 1)
+    workers_parser.add_argument('--handoff', action='store_true', help='перехватить работу у запущенного процесса')
+    startup_parser = subparsers.add_parser('check-startup', help='проверка времени холодного старта')
+    startup_parser.add_argument('--budget-ms', type=float, default=300)
+    push_parser = subparsers.add_parser('push-bench', help='нагрузочный тест WebSocket-уведомлений')
+    push_parser.add_argument('--clients', type=int, default=2000)
+    push_parser.add_argument('--events', type=int, default=2000)
+    push_parser.add_argument('--rate', type=float, default=0, help='событий в секунду (0 - без ограничения)')
+    subparsers.add_parser('migrate-game-data', help='перевод game_data дуэлей из JSON в двоичный формат')
+    game_data_parser = subparsers.add_parser('game-data-bench', help='размер и скорость формата game_data')
+    game_data_parser.add_argument('--ticks', type=int, default=200, help='изменений счета на игрока')
+    ratings_parser = subparsers.add_parser('recompute-ratings', help='пересчет рейтинга по всей истории дуэлей')
+    ratings_parser.add_argument('--k', type=float, default=20.0)
+    ratings_parser.add_argument('--k-provisional', type=float, default=40.0, help='K для новичков')
+    ratings_parser.add_argument('--provisional-games', type=int, default=30)
+    ratings_parser.add_argument('--level-step', type=float, default=50.0, help='очков рейтинга на уровень')
+    ratings_bench_parser = subparsers.add_parser('ratings-bench', help='скорость пересчета рейтинга')
+    ratings_bench_parser.add_argument('--players', type=int, default=10000)
+    ratings_bench_parser.add_argument('--games', type=int, default=200000)
+    tournament_parser = subparsers.add_parser('tournament-create', help='турнир с записью через /tournament')
+    tournament_parser.add_argument('name')
+    tournament_parser.add_argument('--start-in', type=float, default=60, help='минут до старта')
+    tournament_parser.add_argument('--round-minutes', type=int, help='минут на матч раунда')
+    simulation_parser = subparsers.add_parser('tournament-sim', help='офлайн-прогон турнира')
+    simulation_parser.add_argument('--players', type=int, default=1024)
+    simulation_parser.add_argument('--no-show', type=float, default=0.05, help='доля несыгранных матчей')
+    simulation_parser.add_argument('--rate', type=float, default=25.0, help='уведомлений в секунду')
+    args = parser.parse_args(argv)
+
+    if args.command == 'check-startup':
+        return check_startup(args.budget_ms)
+
+    if args.command == 'migrate-game-data':
+        from .config import Config
+        from .gamedata import migrate_sqlite
+        from .sharding import shard_paths
+        config = Config.from_env()
+        migrated = migrate_sqlite(shard_paths(config.database_path, config.database_shards))
+        print(f"✅ Переведено строк game_data: {migrated}")
+        return 0
+
+    if args.command == 'game-data-bench':
+        from .gamedata import benchmark
+        benchmark(args.ticks)
+        return 0
+
+    if args.command == 'recompute-ratings':
+        from .config import Config
+        from .ratings import EloModel, recompute
+        from .storage import create_storage
+        config = Config.from_env()
+        storage = create_storage(config.storage_backend, config.database_path, config.database_shards)
+        storage.init()
+        model = EloModel(k=args.k, k_provisional=args.k_provisional,
+                         provisional_games=args.provisional_games, level_step=args.level_step)
+
+        async def run_recompute() -> int:
+            return await recompute(storage.users, await storage.history.results(), model)
+
+        players = asyncio.run(run_recompute())
+        print(f"✅ Рейтинг пересчитан: игроков с дуэлями {players}")
+        return 0
+
+    if args.command == 'ratings-bench':
+        from .ratings import benchmark as ratings_benchmark
+        ratings_benchmark(args.players, args.games)
+        return 0
+
+    if args.command == 'tournament-create':
+        from datetime import datetime, timedelta
+        from .config import Config
+        from .manager import TigerRozetkaBotManager
+        config = Config.from_env()
+        starts_at = datetime.now() + timedelta(minutes=args.start_in)
+        tournament_id = TigerRozetkaBotManager(config).tournaments.create(
+            args.name, starts_at, args.round_minutes or config.tournament_round_minutes)
+        print(f"✅ Турнир {tournament_id} «{args.name}» начнется в {starts_at:%d.%m %H:%M}")
+        return 0
+
+    if args.command == 'tournament-sim':
+        from .tournaments import simulate
+        simulate(args.players, args.no_show, args.rate)
+        return 0
+
+    if args.command == 'push-bench':
+        from .push import bench
+        bench(args.clients, args.events, args.rate)
+        return 0
+
+    if args.command == 'workers':
+        from .scaling import run
+        run(args.count, args.handoff)
+        return 0
+
+    import importlib.util
+    missing = [name for name in ('aiogram', 'aiohttp') if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"⚠️  Некоторые зависимости не установлены: {', '.join(missing)}")
+        print("📦 Запустите: pip install aiogram aiohttp python-dotenv")
+        return 1
+
+    from .app import create_app
+    asyncio.run(create_app().run(handoff=getattr(args, 'handoff', False)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - HTTP API для мини-приложения
+Встроенный в процесс бота сервер aiohttp вместо обращений фронтенда к боту
+через Node-бэкенд. Пользователь определяется по подписанному initData
+Telegram WebApp, переданному в заголовке:
+    Authorization: tma <window.Telegram.WebApp.initData>
+
+    GET  /api/duels/players   - соперники, близкие по рейтингу, сначала в сети (кеш + ETag)
+    POST /api/duels/invite    - {"toUserId": ...} -> {"success": true, "duelId": ...}
+    GET  /api/duels/pending   - ожидающие вызовы игрока
+    GET  /api/duels/history?limit=20[&opponentId=...]  - сыгранные дуэли игрока
+    GET  /api/duels/ws?initData=...  - WebSocket: смены состояния дуэлей (push.py)
+                                       и счет идущей дуэли (relay.py)
+
+Браузер не передает заголовки при открытии WebSocket, поэтому для него
+initData допускается в параметре запроса.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from aiohttp import WSMsgType, web
+
+from .ratings import closest
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson необязателен
+    orjson = None
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .app import BotApp
+
+
+def dumps(data: Any) -> bytes:
+    """JSON в байты: orjson, если установлен, иначе стандартный json"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def json_response(data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> web.Response:
+    return web.Response(body=dumps(data), status=status, headers=headers,
+                        content_type='application/json', charset='utf-8')
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match (список через запятую или *)
+
+    Сравнение слабое, как требует RFC 9110 для If-None-Match: префикс W/ не учитывается.
+    """
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith('W/') else tag
+
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or (candidate and opaque(candidate) == opaque(etag)):
+            return True
+    return False
+
+
+def verify_init_data(init_data: str, bot_token: str, max_age: int = 86400,
+                     now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Пользователь из initData Telegram WebApp или None, если подпись неверна или устарела
+
+    Проверка по документации Telegram: secret = HMAC_SHA256("WebAppData", bot_token),
+    hash = hex(HMAC_SHA256(secret, data_check_string)), где data_check_string -
+    отсортированные пары key=value без hash, разделенные переводом строки.
+    """
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received_hash = fields.pop('hash', None)
+    if not received_hash or not bot_token:
+        return None
+
+    data_check_string = '\n'.join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected, received_hash):
+        return None
+
+    try:
+        auth_date = int(fields.get('auth_date', '0'))
+        user = json.loads(fields.get('user', 'null'))
+    except ValueError:
+        return None
+    if max_age and (now or time.time()) - auth_date > max_age:
+        return None
+    if not isinstance(user, dict) or not isinstance(user.get('id'), int):
+        return None
+    return user
+
+
+def sign_init_data(bot_token: str, user_id: int, auth_date: Optional[int] = None, **user: Any) -> str:
+    """initData, подписанный токеном бота (для нагрузочных тестов и локальной отладки)"""
+    fields = {
+        'auth_date': str(auth_date or int(time.time())),
+        'user': json.dumps({'id': user_id, **user}, separators=(',', ':')),
+    }
+    data_check_string = '\n'.join(f"{key}={fields[key]}" for key in sorted(fields))
+    secret = hmac.new(b'WebAppData', bot_token.encode(), hashlib.sha256).digest()
+    fields['hash'] = hmac.new(secret, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def history_entry(user_id: int, duel: Dict[str, Any]) -> Dict[str, Any]:
+    """Сыгранная дуэль с точки зрения игрока"""
+    mine = 0 if duel['player1_id'] == user_id else 1
+    if duel['winner_id'] is None:
+        result = 'draw'
+    else:
+        result = 'win' if duel['winner_id'] == user_id else 'loss'
+    return {
+        'duelId': duel['duel_id'],
+        'opponentId': duel['player2_id'] if mine == 0 else duel['player1_id'],
+        'result': result,
+        'myScore': duel['scores'][mine],
+        'opponentScore': duel['scores'][1 - mine],
+        'finishedAt': int(duel['finished_at'].timestamp() * 1000),
+    }
+
+
+class PlayersCache:
+    """Общий список активных игроков на ttl секунд
+
+    Список один для всех запросов: игроки в сети и candidates лучших
+    активных игроков с отметкой online. Каждому отдаются limit ближайших к
+    нему по рейтингу - сначала из тех, кто в сети (сам игрок исключается). ETag ответа - хеш общего списка, id и рейтинг игрока и
+    его счета личных встреч с выбранными соперниками (из кеша менеджера),
+    так что 304 отдается без сериализации.
+    """
+
+    def __init__(self, app: "BotApp", ttl: float = 10.0, limit: int = 20, candidates: int = 200):
+        self.app = app
+        self.ttl = ttl
+        self.limit = limit
+        self.candidates = max(candidates, limit + 1)
+        self.players: List[Dict[str, Any]] = []
+        self.digest = ''
+        self.expires_at = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self) -> Tuple[List[Dict[str, Any]], str]:
+        now = time.monotonic()
+        if now >= self.expires_at:
+            self.misses += 1
+            manager = self.app.manager
+            online = await manager.get_online_players(limit=self.candidates)
+            online_ids = {player['id'] for player in online}
+            self.players = [{**player, 'online': True} for player in online] + [
+                {**player, 'online': False}
+                for player in await manager.get_active_players(limit=self.candidates)
+                if player['id'] not in online_ids
+            ]
+            self.digest = hashlib.sha1(dumps(self.players)).hexdigest()[:16]
+            self.expires_at = now + self.ttl
+        else:
+            self.hits += 1
+        return self.players, self.digest
+
+    def invalidate(self):
+        self.expires_at = 0.0
+
+    async def for_user(self, user_id: int) -> Tuple[List[Dict[str, Any]], str]:
+        """(соперники, близкие по рейтингу, со счетом личных встреч, ETag)"""
+        players, digest = await self.get()
+        rating = await self.app.manager.get_rating(user_id)
+        others = [player for player in players if player['id'] != user_id]
+        visible = closest((player for player in others if player['online']), rating, self.limit)
+        if len(visible) < self.limit:
+            visible += closest((player for player in others if not player['online']),
+                               rating, self.limit - len(visible))
+        records = await self.app.manager.get_head_to_head(user_id, [player['id'] for player in visible])
+        if records:
+            # Общий список не меняется: к игрокам со встречами добавляется копия
+            visible = [
+                {**player, 'headToHead': dict(zip(('wins', 'losses', 'draws'), records[player['id']]))}
+                if player['id'] in records else player
+                for player in visible
+            ]
+            digest += '-' + hashlib.sha1(repr(sorted(records.items())).encode()).hexdigest()[:8]
+        return visible, f'"{digest}-{user_id}-{round(rating)}"'
+
+
+class FrontendAPI:
+    """Маршруты /api/duels/* поверх API-функций BotApp"""
+
+    def __init__(self, app: "BotApp"):
+        self.app = app
+        self.config = app.config
+        self.players = PlayersCache(app, ttl=app.config.api_players_cache_ttl,
+                                    candidates=app.config.api_players_candidates)
+        self.push = app.manager.push
+        self.push.encode = lambda data: dumps(data).decode()
+        self.web_app = web.Application(middlewares=[self.cors_middleware])
+        self.web_app.add_routes([
+            web.get('/api/duels/players', self.get_players),
+            web.post('/api/duels/invite', self.create_invite),
+            web.get('/api/duels/pending', self.get_pending),
+            web.get('/api/duels/history', self.get_history),
+            web.get('/api/duels/ws', self.websocket),
+            web.get('/api/push/stats', self.get_push_stats),
+        ])
+        self._runner: Optional[web.AppRunner] = None
+        self._site: Optional[web.TCPSite] = None
+
+    # Авторизация и CORS
+    def authenticate(self, request: web.Request) -> Dict[str, Any]:
+        """Пользователь Telegram из заголовка Authorization: tma <initData>"""
+        scheme, _, init_data = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'tma':
+            init_data = request.query.get('initData', '') if request.path == '/api/duels/ws' else ''
+        if not init_data:
+            raise web.HTTPUnauthorized(text=dumps({'success': False, 'error': 'initData required'}).decode(),
+                                       content_type='application/json')
+        user = verify_init_data(init_data, self.config.bot_token, self.config.api_init_data_max_age)
+        if user is None:
+            raise web.HTTPUnauthorized(text=dumps({'success': False, 'error': 'invalid initData'}).decode(),
+                                       content_type='application/json')
+        self.app.manager.presence.touch(user['id'])
+        return user
+
+    @web.middleware
+    async def cors_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        origin = self.config.api_cors_origin
+        if request.method == 'OPTIONS':
+            response: web.StreamResponse = web.Response(status=204)
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                # Исключение как ответ aiohttp считает устаревшим - копируется в Response
+                response = web.Response(status=e.status, text=e.text, headers=e.headers)
+        if origin and not response.prepared:
+            response.headers['Access-Control-Allow-Origin'] = origin
+            response.headers['Access-Control-Allow-Headers'] = 'Authorization, Content-Type, If-None-Match'
+            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, OPTIONS'
+            response.headers['Access-Control-Expose-Headers'] = 'ETag'
+        return response
+
+    # Маршруты
+    async def get_players(self, request: web.Request) -> web.Response:
+        user = self.authenticate(request)
+        players, etag = await self.players.for_user(user['id'])
+        headers = {'ETag': etag, 'Cache-Control': f"private, max-age={int(self.players.ttl)}"}
+        if etag_matches(request.headers.get('If-None-Match', ''), etag):
+            return web.Response(status=304, headers=headers)
+        return json_response({'success': True, 'players': players}, headers=headers)
+
+    async def create_invite(self, request: web.Request) -> web.Response:
+        user = self.authenticate(request)
+        try:
+            body = await request.json(loads=orjson.loads if orjson is not None else json.loads)
+            to_user_id = int(body['toUserId'])
+        except (ValueError, KeyError, TypeError):
+            return json_response({'success': False, 'error': 'toUserId required'}, status=400)
+        if to_user_id == user['id']:
+            return json_response({'success': False, 'error': 'cannot challenge yourself'}, status=400)
+        if await self.app.manager.get_player(to_user_id) is None:
+            # Неизвестный или неактивный (заблокировал бота, давно не заходил) игрок
+            return json_response({'success': False, 'error': 'user not found'}, status=404)
+
+        # Те же лимиты, что и для кнопки вызова в чате
+        if not self.app.throttling.allow(user['id'], 'challenge', to_user_id):
+            return json_response({'success': False, 'error': 'too many requests'}, status=429)
+
+        duel_id = await self.app.api_create_duel_challenge(user['id'], to_user_id)
+        if duel_id is None:
+            return json_response({'success': False, 'error': 'pending invites limit'}, status=409)
+        return json_response({'success': True, 'duelId': duel_id})
+
+    async def get_pending(self, request: web.Request) -> web.Response:
+        user = self.authenticate(request)
+        pending = await self.app.api_get_pending_invites(user['id'])
+        return json_response({
+            'success': True,
+            'outgoing': [{'userId': user_id, 'duelId': duel_id} for user_id, duel_id in pending['outgoing'].items()],
+            'incoming': [{'userId': user_id, 'duelId': duel_id} for user_id, duel_id in pending['incoming'].items()],
+        })
+
+    async def get_history(self, request: web.Request) -> web.Response:
+        user = self.authenticate(request)
+        try:
+            limit = min(max(int(request.query.get('limit', '20')), 1), 100)
+            opponent = request.query.get('opponentId')
+            opponent_id = int(opponent) if opponent else None
+        except ValueError:
+            return json_response({'success': False, 'error': 'invalid query'}, status=400)
+
+        duels = await self.app.manager.get_duel_history(user['id'], limit, opponent_id)
+        return json_response({'success': True, 'duels': [history_entry(user['id'], duel) for duel in duels]})
+
+    async def websocket(self, request: web.Request) -> web.WebSocketResponse:
+        """Поток событий дуэлей игрока; входящие сообщения - для ретрансляции счета"""
+        user = self.authenticate(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        subscriber = self.push.subscribe(user['id'])
+
+        async def send_events():
+            while not ws.closed:
+                batch = await subscriber.next_batch()
+                if not batch:
+                    # Клиент не успевает читать: пусть переподключится и перечитает состояние
+                    await ws.close(code=4008, message=b'too slow')
+                    return
+                for message in batch:
+                    await ws.send_str(message)
+
+        sender = asyncio.create_task(send_events())
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    data = json.loads(message.data)
+                except ValueError:
+                    continue
+                if isinstance(data, dict):
+                    await self.app.relay.handle(user['id'], data)
+        finally:
+            sender.cancel()
+            self.push.unsubscribe(subscriber)
+        return ws
+
+    async def get_push_stats(self, request: web.Request) -> web.Response:
+        if request.remote not in ('127.0.0.1', '::1'):
+            raise web.HTTPForbidden()
+        return json_response({**self.push.stats(), 'duels': self.app.relay.stats()})
+
+    # Запуск и остановка
+    async def serve(self, host: str, port: int):
+        self._runner = web.AppRunner(self.web_app, access_log=None)
+        await self._runner.setup()
+        self._site = web.TCPSite(self._runner, host, port)
+        await self._site.start()
+        print(f"🌐 API для мини-приложения: http://{host}:{self.port}/api/duels/players")
+
+    @property
+    def port(self) -> int:
+        """Фактический порт (при запуске с port=0)"""
+        server = self._site._server if self._site is not None else None
+        return server.sockets[0].getsockname()[1] if server is not None and server.sockets else 0
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - фабрика приложения
+Bot, Dispatcher и обработчики создаются лениво, при первом обращении:
+импорт пакета и create_app() не загружают aiogram и не ходят в сеть.
+"""
+
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from .config import Config
+from .jobs import JobSupervisor
+from .lifecycle import Lifecycle
+from .manager import TigerRozetkaBotManager
+from .relay import DuelRelay
+from .sender import RateLimitedSender
+from .throttling import ThrottlingMiddleware
+
+if TYPE_CHECKING:  # pragma: no cover
+    from aiogram import Bot, Dispatcher
+
+
+class BotApp:
+    """Приложение бота: менеджер данных, Bot, Dispatcher и фоновые задачи"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.manager = TigerRozetkaBotManager(config)
+        self.lifecycle = Lifecycle(config.shutdown_timeout, config.pid_file)
+        self.jobs = JobSupervisor(self.lifecycle)
+        self.throttling = ThrottlingMiddleware(config.throttle_limits)
+        self.jobs.routes['/debug/throttling'] = self.throttling.http_stats
+        self.relay = DuelRelay(self.manager, self.manager.push, duration=config.duel_duration,
+                               max_points_per_second=config.duel_max_points_per_second)
+        # Массовые уведомления (раунды турниров) с ограничением частоты, см. sender.py
+        self.sender = RateLimitedSender(self.send_message, rate=config.send_rate)
+        self.manager.tournaments.notify = self.notify_player
+        self.manager.tournaments.in_progress = self.relay.matches.__contains__
+        self._bot: Optional["Bot"] = None
+        self._dp: Optional["Dispatcher"] = None
+
+    @property
+    def bot(self) -> "Bot":
+        if self._bot is None:
+            from aiogram import Bot
+            self._bot = Bot(token=self.config.bot_token)
+        return self._bot
+
+    @property
+    def dp(self) -> "Dispatcher":
+        if self._dp is None:
+            from aiogram import Dispatcher
+            from aiogram.fsm.storage.memory import MemoryStorage
+            from .handlers import create_router
+            self._dp = Dispatcher(storage=MemoryStorage())
+            self._dp.update.outer_middleware(self.lifecycle.update_middleware)
+            self._dp.include_router(create_router(self.manager, self.throttling))
+        return self._dp
+
+    # API функции для интеграции с frontend
+    async def api_get_available_players(self, user_id: int) -> List[Dict[str, Any]]:
+        """API функция для получения доступных игроков"""
+        return await self.manager.get_active_players(exclude_user_id=user_id)
+
+    async def api_create_duel_challenge(self, from_user_id: int, to_user_id: int) -> Optional[str]:
+        """API функция для создания вызова на дуэль (None - превышен лимит вызовов)"""
+        from .handlers import send_duel_notification
+        duel_id, result = await self.manager.invite(from_user_id, to_user_id)
+        if result == 'created':
+            await send_duel_notification(self.bot, self.manager, to_user_id, from_user_id, duel_id)
+        return duel_id
+
+    async def api_get_pending_invites(self, user_id: int) -> Dict[str, Dict[int, str]]:
+        """API функция для получения ожидающих вызовов игрока"""
+        return self.manager.pending_invites(user_id)
+
+    # Исходящие сообщения
+    async def send_message(self, chat_id: int, text: str, reply_markup: Any = None):
+        from aiogram.exceptions import TelegramForbiddenError
+        try:
+            await self.bot.send_message(chat_id, text, reply_markup=reply_markup)
+        except TelegramForbiddenError:
+            await self.manager.deactivate_user(chat_id)
+            raise
+
+    def notify_player(self, user_id: int, text: str, duel_id: Optional[str] = None):
+        """Уведомление через очередь отправки; с duel_id - с кнопкой входа в дуэль"""
+        if user_id in self.manager.blocked:
+            return
+        reply_markup = None
+        if duel_id is not None:
+            from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+            reply_markup = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text="🎮 Играть матч", web_app=WebAppInfo(url=f"{self.config.game_url}?duel={duel_id}")
+            )]])
+        self.sender.submit(user_id, text, reply_markup)
+
+    # Периодические задачи (выполняются под наблюдением JobSupervisor, см. jobs.py)
+    async def season_snapshot(self):
+        """Материализация рейтинга недели и ротация сезонов"""
+        self.manager.season_tracker.periodic()
+
+    async def refresh_shared_state(self):
+        """Перечитывание рейтингов из БД (другие процессы обновляют свои шарды)"""
+        await self.manager.load_leaderboard()
+        await self.manager.load_invites()
+        await self.manager.load_presence()
+        self.manager.season_tracker.load()
+
+    # Настройка команд бота
+    async def set_bot_commands(self):
+        """Установка команд бота"""
+        from .handlers import BOT_COMMANDS
+        await self.bot.set_my_commands(BOT_COMMANDS)
+
+    async def confirm_updates(self):
+        """Подтверждение Telegram обработанных обновлений (иначе их получит следующий процесс)"""
+        if self.lifecycle.last_update_id is not None:
+            await self.bot.get_updates(offset=self.lifecycle.last_update_id + 1, limit=1, timeout=0)
+
+    async def flush_buffers(self):
+        """Сброс отложенных записей перед выходом"""
+        await self.manager.flush_ratings()
+        await self.manager.flush_presence()
+        await self.manager.flush_outbox()
+        self.manager.season_tracker.snapshot()
+
+    def start_profiler(self):
+        """Профилирование цикла событий (BOT_PROFILE=1)"""
+        from .profiler import LoopProfiler
+        profiler = LoopProfiler(self.config.slow_callback_ms)
+        profiler.start()
+        self.jobs.routes['/debug/profile'] = profiler.http_profile
+        self.lifecycle.on_shutdown('profiler', profiler.stop)
+
+    async def start_api(self):
+        """HTTP API для мини-приложения (BOT_API_PORT, см. api.py)"""
+        from .api import FrontendAPI
+        api = FrontendAPI(self)
+        await api.serve(self.config.api_host, self.config.api_port)
+        self.lifecycle.on_shutdown('api', api.stop)
+
+    def start_background_tasks(self, shared: bool = True, refresh: bool = False):
+        """Запуск фоновых задач; shared - общие для всех процессов (очистка, outbox, сезоны)"""
+        jobs, config = self.jobs, self.config
+        if config.profile:
+            self.start_profiler()
+        jobs.add('throttle_prune', self.throttling.prune, interval=60)
+        # Присутствие учитывается в каждом процессе, last_seen пишет каждый свой
+        jobs.add('presence_flush', self.manager.flush_presence, interval=config.presence_flush_interval)
+        if shared:
+            jobs.add('cleanup_duels', self.manager.cleanup_expired_duels, interval=60)
+            jobs.add('outbox', self.manager.flush_outbox, interval=60)
+            jobs.add('ratings_flush', self.manager.flush_ratings, interval=config.rating_flush_interval)
+            jobs.add('tournaments', self.manager.tournaments.tick, interval=config.tournament_tick_interval)
+            jobs.add('inactivity_sweep', self.manager.sweep_inactive, interval=config.inactivity_sweep_interval)
+            self.lifecycle.spawn('sender', self.sender.run())
+            self.lifecycle.on_shutdown('sender', self.sender.drain)
+            jobs.add('season_snapshot', self.season_snapshot, interval=config.season_snapshot_interval,
+                     initial_delay=config.season_snapshot_interval)
+            jobs.start_lag_monitor()
+            if config.health_port:
+                self.lifecycle.spawn('healthz', jobs.serve_health(port=config.health_port))
+            if config.api_port:
+                self.lifecycle.spawn('api', self.start_api())
+                # Дуэли мини-приложения идут в процессе с WebSocket-подключениями
+                jobs.add('duel_relay', self.relay.tick, interval=1 / config.duel_tick_hz)
+        if refresh:
+            jobs.add('shared_state_refresh', self.refresh_shared_state,
+                     interval=config.shared_state_refresh_interval,
+                     initial_delay=config.shared_state_refresh_interval)
+
+    async def run(self, handoff: bool = False):
+        """Запуск бота"""
+        if not self.config.bot_token:
+            print("❌ BOT_TOKEN не установлен!")
+            return
+
+        dp, lifecycle = self.dp, self.lifecycle
+
+        # Строим таблицу лидеров и загружаем текущий сезон
+        await self.manager.load_leaderboard()
+        await self.manager.load_invites()
+        await self.manager.load_presence()
+        self.manager.season_tracker.load()
+        self.manager.tournaments.load()
+
+        print("🚀 TigerRozetka Bot (aiogram) запускается...")
+
+        # Предыдущий процесс останавливается только после полной инициализации нового
+        if handoff and not await lifecycle.take_over():
+            return
+        lifecycle.write_pid_file()
+        lifecycle.install_signal_handlers()
+        lifecycle.on_shutdown('confirm_updates', self.confirm_updates)
+        lifecycle.on_shutdown('flush_buffers', self.flush_buffers)
+
+        # Устанавливаем команды
+        await self.set_bot_commands()
+
+        # Запускаем фоновые задачи
+        self.start_background_tasks()
+
+        print("✅ TigerRozetka Bot запущен!")
+        print("📱 Команды бота: /start, /duel, /stats, /top, /tournament, /play")
+        print(f"🔗 Backend API:  {self.config.backend_api_url}")
+        print("🌐 Frontend:     http://localhost:5173")
+        print(f"📱 Game URL:     {self.config.game_url}")
+        print("")
+        print("💡 Закройте все окна для остановки сервисов")
+        print("")
+
+        # Запускаем polling до сигнала остановки
+        polling = asyncio.create_task(
+            dp.start_polling(self.bot, handle_signals=False, close_bot_session=False)
+        )
+        stop = asyncio.create_task(lifecycle.stop_requested.wait())
+        await asyncio.wait({polling, stop}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+        if not polling.done():
+            await dp.stop_polling()
+
+        # Прием обновлений остановлен: дорабатываем начатое и сбрасываем буферы
+        try:
+            await lifecycle.shutdown()
+        finally:
+            await self.bot.session.close()
+        polling.result()
+        print("👋 TigerRozetka Bot остановлен")
+
+    # Рабочий процесс многопроцессного режима (см. scaling.py)
+    async def relay_push_events(self, events: Any):
+        """Публикация событий других рабочих процессов подписчикам этого"""
+        import queue
+
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # С таймаутом: поток executor не должен держать процесс после отмены задачи
+                user_ids, event = await loop.run_in_executor(None, events.get, True, 0.5)
+            except queue.Empty:
+                continue
+            self.manager.push.publish(user_ids, event)
+
+    async def run_worker(self, index: int, workers: int, queue: Any, events: Any = None):
+        """Обработка обновлений, которые фронт-процесс направил в этот шард"""
+        from aiogram.types import Update
+
+        bot, dp, lifecycle = self.bot, self.dp, self.lifecycle
+        # HTTP API и WebSocket-подписчики - в первом рабочем процессе, остальные пересылают ему события
+        if events is not None:
+            if index == 0:
+                lifecycle.spawn('push_relay', self.relay_push_events(events))
+            else:
+                self.manager.push.forward = events.put
+        await self.manager.load_leaderboard()
+        await self.manager.load_invites()
+        await self.manager.load_presence()
+        self.manager.season_tracker.load()
+        if index == 0:
+            self.manager.tournaments.load()
+
+        # Общие фоновые задачи выполняет только первый рабочий процесс
+        self.start_background_tasks(shared=index == 0, refresh=True)
+        if index == 0:
+            await self.set_bot_commands()
+            lifecycle.on_shutdown('flush_buffers', self.flush_buffers)
+        else:
+            lifecycle.on_shutdown('flush_presence', self.manager.flush_presence)
+            lifecycle.on_shutdown('flush_outbox', self.manager.flush_outbox)
+
+        print(f"✅ Рабочий процесс {index + 1}/{workers} готов")
+
+        # Очередь читается до маркера None: фронт-процесс отправляет его при остановке
+        loop = asyncio.get_running_loop()
+        in_flight: set = set()
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data is None:
+                break
+            update = Update.model_validate(data, context={"bot": bot})
+            task = asyncio.create_task(dp.feed_update(bot, update))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        try:
+            await lifecycle.shutdown()
+        finally:
+            await bot.session.close()
+
+
+def create_app(config: Optional[Config] = None) -> BotApp:
+    """Создание приложения (конфигурация по умолчанию - из окружения)"""
+    return BotApp(config or Config.from_env())
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - компактное кодирование callback_data
+Формат: base64url без дополнения от байтов [версия, код действия, аргументы].
+Аргументы по схеме действия: 'u' - UUID дуэли (16 байт), 'i' - неотрицательное
+целое (varint). Например, accept_duel занимает 24 символа вместо 48.
+
+Кнопки в уже отправленных сообщениях остаются в старом текстовом формате
+"действие:аргументы" - decode() разбирает и его.
+"""
+
+import base64
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+CALLBACK_VERSION = 1
+
+# Реестр действий: имя -> (код, схема аргументов). Коды не переиспользуются.
+ACTIONS: Dict[str, Tuple[int, str]] = {
+    'duel_menu': (1, ''),
+    'refresh_players': (2, ''),
+    'players_next': (3, 'iii'),  # level, wins, user_id последнего игрока страницы
+    'players_prev': (4, 'iii'),  # level, wins, user_id первого игрока страницы
+    'challenge': (5, 'i'),  # user_id цели
+    'accept_duel': (6, 'u'),
+    'decline_duel': (7, 'u'),
+    'tournament_join': (8, 'i'),  # id турнира
+    'players_online': (9, ''),
+    'quick_match': (10, ''),
+}
+_BY_CODE = {code: (name, schema) for name, (code, schema) in ACTIONS.items()}
+
+Callback = Tuple[str, Tuple[Any, ...]]
+
+
+def _write_varint(out: bytearray, value: int):
+    if value < 0:
+        raise ValueError("varint не поддерживает отрицательные значения")
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def _read_varint(raw: bytes, position: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = raw[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def encode(action: str, *args: Any) -> str:
+    """callback_data для действия из реестра"""
+    code, schema = ACTIONS[action]
+    if len(args) != len(schema):
+        raise ValueError(f"{action}: ожидается аргументов {len(schema)}, передано {len(args)}")
+    out = bytearray((CALLBACK_VERSION, code))
+    for kind, value in zip(schema, args):
+        if kind == 'u':
+            out += uuid.UUID(value).bytes
+        else:
+            _write_varint(out, int(value))
+    return base64.urlsafe_b64encode(bytes(out)).rstrip(b'=').decode('ascii')
+
+
+def decode(data: Optional[str]) -> Optional[Callback]:
+    """(действие, аргументы) или None для неизвестных и поврежденных данных"""
+    if not data:
+        return None
+    if ':' in data or data in ACTIONS:
+        return _decode_legacy(data)
+    try:
+        raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+        if len(raw) < 2 or raw[0] != CALLBACK_VERSION or raw[1] not in _BY_CODE:
+            return None
+        action, schema = _BY_CODE[raw[1]]
+        args = []
+        position = 2
+        for kind in schema:
+            if kind == 'u':
+                if position + 16 > len(raw):
+                    return None
+                args.append(str(uuid.UUID(bytes=raw[position:position + 16])))
+                position += 16
+            else:
+                value, position = _read_varint(raw, position)
+                args.append(value)
+        if position != len(raw):
+            return None
+        return action, tuple(args)
+    except (ValueError, IndexError):
+        return None
+
+
+def _decode_legacy(data: str) -> Optional[Callback]:
+    """Текстовый формат "действие:аргумент:..." кнопок, отправленных ранее"""
+    action, *raw_args = data.split(':')
+    if action not in ACTIONS:
+        return None
+    schema = ACTIONS[action][1]
+    if len(raw_args) != len(schema):
+        return None
+    try:
+        return action, tuple(
+            str(uuid.UUID(value)) if kind == 'u' else int(value)
+            for kind, value in zip(schema, raw_args)
+        )
+    except ValueError:
+        return None
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - конфигурация
+Значения читаются из окружения (и .env) при вызове Config.from_env(), а не при импорте
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
+
+
+@dataclass
+class Config:
+    bot_token: str = ''
+    database_path: str = 'bot_users.db'
+    database_shards: int = 1  # Число файлов SQLite (шардов) для пользователей и дуэлей
+    storage_backend: str = 'sqlite'  # Бэкенд хранилища: sqlite или memory
+    backend_api_url: str = 'http://localhost:3001'
+    game_url: str = 'https://orspiritus.github.io/tigerrosette/'
+    players_page_size: int = 10  # Игроков на одной странице списка соперников
+    duel_ttl_minutes: int = 5  # Время жизни приглашения на дуэль
+    max_pending_outgoing: int = 5  # Ожидающих ответа вызовов от одного игрока
+    max_pending_incoming: int = 10  # Ожидающих ответа вызовов одному игроку
+    inline_cache_time: int = 60  # Серверный кеш Telegram для inline-результатов (сек)
+    inline_cache_max_users: int = 10000  # Размер локального кеша inline-результатов
+    season_snapshot_interval: int = 300  # Период снимков сезонного рейтинга (сек)
+    season_retention: int = 12  # Сколько прошедших сезонов (недель) хранить
+    shared_state_refresh_interval: int = 30  # Перечитывание общих таблиц в многопроцессном режиме (сек)
+    shutdown_timeout: int = 20  # Дедлайн корректного завершения по SIGTERM (сек)
+    pid_file: str = 'bot.pid'  # pid-файл для передачи работы новому процессу
+    health_port: int = 8081  # Локальный порт /healthz (0 - отключить)
+    api_host: str = '127.0.0.1'  # HTTP API для мини-приложения (см. api.py)
+    api_port: int = 8082  # 0 - отключить
+    api_cors_origin: str = 'https://orspiritus.github.io'  # Origin мини-приложения
+    api_init_data_max_age: int = 86400  # Срок действия initData (сек)
+    api_players_cache_ttl: float = 10.0  # Кеш списка соперников (сек)
+    api_players_candidates: int = 200  # Активных игроков, из которых API подбирает близких по рейтингу
+    duel_duration: float = 60.0  # Длительность игры в дуэли (сек, см. relay.py)
+    duel_tick_hz: float = 5.0  # Частота рассылки счета соперника
+    duel_max_points_per_second: float = 500.0  # Предел роста счета (защита от подмены)
+    rating_flush_interval: float = 5.0  # Период пакетной записи рейтингов (сек, см. ratings.py)
+    rating_batch_size: int = 200  # Игроков с изменившимся рейтингом до внеочередной записи
+    tournament_round_minutes: int = 15  # Время на матч раунда турнира (см. tournaments.py)
+    tournament_tick_interval: float = 15.0  # Проверка старта турниров и дедлайнов раундов (сек)
+    tournament_result_grace: float = 30.0  # Ожидание итога идущей дуэли после ее expires_at (сек)
+    send_rate: float = 25.0  # Сообщений в секунду из очереди отправки (лимит Bot API ~30)
+    presence_window: float = 300.0  # Игрок в сети, если было событие за это время (сек, см. presence.py)
+    presence_bucket: float = 15.0  # Точность учета присутствия (сек)
+    presence_flush_interval: float = 30.0  # Период пакетной записи last_seen (сек)
+    inactive_after_days: int = 30  # Не заходившие дольше помечаются неактивными
+    inactivity_sweep_interval: float = 3600.0  # Период поиска неактивных игроков (сек)
+    inactivity_sweep_batch: int = 500  # Игроков в одной транзакции пометки
+    profile: bool = False  # Профилирование цикла событий (см. profiler.py)
+    slow_callback_ms: int = 100  # Порог блокировки цикла событий для вывода стека
+    # Переопределение лимитов антиспама: область -> (событий, за секунд), см. throttling.py
+    throttle_limits: Dict[str, Tuple[int, float]] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls, load_dotenv_file: bool = True) -> "Config":
+        """Конфигурация из переменных окружения"""
+        from .throttling import parse_limits
+
+        if load_dotenv_file:
+            try:
+                from dotenv import load_dotenv
+                load_dotenv()
+            except ImportError:
+                pass
+        return cls(
+            bot_token=os.getenv('VITE_TELEGRAM_BOT_TOKEN') or os.getenv('TELEGRAM_BOT_TOKEN', ''),
+            database_path=os.getenv('BOT_DATABASE_PATH', cls.database_path),
+            database_shards=int(os.getenv('BOT_DB_SHARDS', '1')),
+            storage_backend=os.getenv('BOT_STORAGE', cls.storage_backend),
+            shutdown_timeout=int(os.getenv('BOT_SHUTDOWN_TIMEOUT', str(cls.shutdown_timeout))),
+            pid_file=os.getenv('BOT_PID_FILE', cls.pid_file),
+            health_port=int(os.getenv('BOT_HEALTH_PORT', str(cls.health_port))),
+            api_host=os.getenv('BOT_API_HOST', cls.api_host),
+            api_port=int(os.getenv('BOT_API_PORT', str(cls.api_port))),
+            api_cors_origin=os.getenv('BOT_API_CORS_ORIGIN', cls.api_cors_origin),
+            profile=os.getenv('BOT_PROFILE', '') not in ('', '0'),
+            slow_callback_ms=int(os.getenv('BOT_SLOW_CALLBACK_MS', str(cls.slow_callback_ms))),
+            throttle_limits=parse_limits(os.getenv('BOT_THROTTLE', '')),
+        )
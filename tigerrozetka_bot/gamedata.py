@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - двоичный формат active_duels.game_data
+Итог дуэли и история счета обоих игроков (см. relay.py) в компактном виде:
+
+    версия     1 байт: FORMAT_VERSION | 0x80, если остальное сжато zlib
+    заголовок  <qqqIIIB: player1_id, player2_id, начало (мс), длительность (мс),
+               счет 1, счет 2, победитель (0 - ничья, 1, 2)
+    на игрока  <IBB: число изменений счета, typecode приращений времени и счета,
+               затем два массива array: приращения времени (мс) и счета
+
+Время и счет не убывают, поэтому хранятся приращения - обычно они умещаются
+в 1-2 байта (typecode массива выбирается по максимальному значению). Тело
+сжимается, только если zlib его действительно уменьшает.
+
+Версия 1 - JSON, который писался до этого формата; decode() читает обе.
+Миграция существующих строк: python -m tigerrozetka_bot migrate-game-data
+"""
+
+import json
+import operator
+import struct
+import sys
+import time
+import zlib
+from array import array
+from dataclasses import dataclass, field
+from itertools import accumulate, chain
+from typing import Iterable, List, Optional, Sequence, Tuple, Union
+
+FORMAT_VERSION = 2
+_COMPRESSED = 0x80
+_HEADER = struct.Struct('<qqqIIIB')
+_SERIES = struct.Struct('<IBB')
+# Беззнаковые typecode array по возрастанию размера элемента
+_TYPECODES = 'BHIQ'
+
+Tick = Tuple[int, int]  # (мс от начала, счет)
+
+
+@dataclass
+class DuelGameData:
+    player_ids: Tuple[int, int]
+    started_at_ms: int
+    duration_ms: int
+    scores: Tuple[int, int]
+    winner_id: Optional[int] = None
+    ticks: Tuple[List[Tick], List[Tick]] = field(default_factory=lambda: ([], []))
+
+
+def _typecode(values: Sequence[int]) -> str:
+    largest = max(values, default=0)
+    for code in _TYPECODES:
+        if largest < 1 << (8 * array(code).itemsize):
+            return code
+    raise ValueError("значение не помещается в 64 бита")
+
+
+def _deltas(values: Sequence[int]) -> List[int]:
+    result = list(map(operator.sub, values, chain((0,), values)))
+    if result and min(result) < 0:
+        raise ValueError("время и счет в истории не должны убывать")
+    return result
+
+
+def _pack_series(ticks: List[Tick]) -> bytes:
+    moments, scores = zip(*ticks) if ticks else ((), ())
+    time_deltas, score_deltas = _deltas(moments), _deltas(scores)
+    time_code, score_code = _typecode(time_deltas), _typecode(score_deltas)
+    time_array, score_array = array(time_code, time_deltas), array(score_code, score_deltas)
+    if sys.byteorder != 'little':
+        time_array.byteswap()
+        score_array.byteswap()
+    return (_SERIES.pack(len(ticks), ord(time_code), ord(score_code))
+            + time_array.tobytes() + score_array.tobytes())
+
+
+def _unpack_array(code: str, body: bytes, position: int, count: int) -> Tuple[array, int]:
+    values = array(code)
+    end = position + count * values.itemsize
+    if end > len(body):
+        raise ValueError("game_data обрезаны")
+    values.frombytes(body[position:end])
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values, end
+
+
+def encode(game: DuelGameData, compress: Optional[bool] = None) -> bytes:
+    """Двоичное представление; compress=None - сжимать, только если это выгодно"""
+    player1, player2 = game.player_ids
+    winner = 0 if game.winner_id is None else game.player_ids.index(game.winner_id) + 1
+    body = (_HEADER.pack(player1, player2, game.started_at_ms, game.duration_ms,
+                         game.scores[0], game.scores[1], winner)
+            + b''.join(_pack_series(ticks) for ticks in game.ticks))
+    if compress is not False:
+        packed = zlib.compress(body, 6)
+        if compress or len(packed) < len(body):
+            return bytes((FORMAT_VERSION | _COMPRESSED,)) + packed
+    return bytes((FORMAT_VERSION,)) + body
+
+
+def decode(raw: Union[bytes, str], player_ids: Optional[Tuple[int, int]] = None) -> DuelGameData:
+    """Данные дуэли из двоичного формата или JSON версии 1 (для него нужны player_ids)"""
+    if isinstance(raw, str) or raw[:1] == b'{':
+        return _decode_json(raw, player_ids)
+
+    version, body = raw[0], raw[1:]
+    if version & _COMPRESSED:
+        body = zlib.decompress(body)
+    if version & ~_COMPRESSED != FORMAT_VERSION:
+        raise ValueError(f"неизвестная версия game_data: {version & ~_COMPRESSED}")
+
+    player1, player2, started_at, duration, score1, score2, winner = _HEADER.unpack_from(body)
+    position = _HEADER.size
+    series: List[List[Tick]] = []
+    for _ in range(2):
+        count, time_code, score_code = _SERIES.unpack_from(body, position)
+        position += _SERIES.size
+        times, position = _unpack_array(chr(time_code), body, position, count)
+        scores, position = _unpack_array(chr(score_code), body, position, count)
+        series.append(list(zip(accumulate(times), accumulate(scores))))
+
+    ids = (player1, player2)
+    return DuelGameData(ids, started_at, duration, (score1, score2),
+                        None if winner == 0 else ids[winner - 1], (series[0], series[1]))
+
+
+def _decode_json(raw: Union[bytes, str], player_ids: Optional[Tuple[int, int]]) -> DuelGameData:
+    data = json.loads(raw)
+    if player_ids is None:
+        raise ValueError("для game_data версии 1 нужны id игроков")
+    ticks = data.get('ticks') or [[], []]
+    return DuelGameData(
+        player_ids=player_ids,
+        started_at_ms=data['startedAt'],
+        duration_ms=data['durationMs'],
+        scores=(data['scores'][0], data['scores'][1]),
+        winner_id=data.get('winnerId'),
+        ticks=([tuple(tick) for tick in ticks[0]], [tuple(tick) for tick in ticks[1]]),
+    )
+
+
+def migrate_sqlite(paths: Iterable[str], batch_size: int = 500) -> int:
+    """Перевод строк active_duels с JSON game_data в двоичный формат; возвращает число строк"""
+    import sqlite3
+
+    migrated = 0
+    for path in paths:
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        while True:
+            cursor.execute('''
+                SELECT id, player1_id, player2_id, game_data FROM active_duels
+                WHERE typeof(game_data) = 'text' LIMIT ?
+            ''', (batch_size,))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = []
+            for duel_id, player1_id, player2_id, game_data in rows:
+                try:
+                    updates.append((encode(decode(game_data, (player1_id, player2_id))), duel_id))
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    print(f"⚠️ game_data дуэли {duel_id} не распознаны ({e}), удалены")
+                    updates.append((None, duel_id))
+            cursor.executemany('UPDATE active_duels SET game_data = ? WHERE id = ?', updates)
+            conn.commit()
+            migrated += len(updates)
+        conn.close()
+    return migrated
+
+
+# --- Бенчмарк формата ---
+
+def sample_game(ticks_per_player: int = 200, seed: int = 1) -> DuelGameData:
+    """Дуэль на 60 секунд со счетом, меняющимся в среднем каждые 300 мс"""
+    import random
+
+    generator = random.Random(seed)
+    series = []
+    for _ in range(2):
+        moment, score, ticks = 0, 0, []
+        for _ in range(ticks_per_player):
+            moment += generator.randint(50, 550)
+            score += generator.choice((10, 15, 20, 25, 50, 100))
+            ticks.append((moment, score))
+        series.append(ticks)
+    scores = (series[0][-1][1] if series[0] else 0, series[1][-1][1] if series[1] else 0)
+    return DuelGameData((123456789, 987654321), int(time.time() * 1000), 60000, scores,
+                        123456789 if scores[0] > scores[1] else 987654321, (series[0], series[1]))
+
+
+def _legacy_json(game: DuelGameData) -> str:
+    return json.dumps({
+        'v': 1, 'startedAt': game.started_at_ms, 'durationMs': game.duration_ms,
+        'scores': list(game.scores), 'winnerId': game.winner_id, 'ticks': list(game.ticks),
+    }, separators=(',', ':'))
+
+
+def benchmark(ticks_per_player: int = 200, rounds: int = 2000):
+    """Размер и скорость двоичного формата против JSON версии 1"""
+    game = sample_game(ticks_per_player)
+    players = game.player_ids
+    variants = [
+        ('JSON (v1)', lambda: _legacy_json(game), lambda raw: decode(raw, players)),
+        ('binary', lambda: encode(game, compress=False), decode),
+        ('binary+zlib', lambda: encode(game, compress=True), decode),
+    ]
+    print(f"📊 game_data: {ticks_per_player} изменений счета на игрока, {rounds} повторов")
+    print(f"{'формат':<12} {'байт':>7} {'encode мкс':>11} {'decode мкс':>11}")
+    for name, encoder, decoder in variants:
+        raw = encoder()
+        assert decoder(raw) == game
+        started = time.perf_counter()
+        for _ in range(rounds):
+            encoder()
+        encode_us = (time.perf_counter() - started) / rounds * 1e6
+        started = time.perf_counter()
+        for _ in range(rounds):
+            decoder(raw)
+        decode_us = (time.perf_counter() - started) / rounds * 1e6
+        size = len(raw.encode() if isinstance(raw, str) else raw)
+        print(f"{name:<12} {size:>7} {encode_us:>11.1f} {decode_us:>11.1f}")
@@ -0,0 +1,756 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - обработчики команд, кнопок и inline-запросов (aiogram)
+Модуль импортируется только при создании Dispatcher в create_app
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Router
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.filters import Command, CommandObject, CommandStart
+from aiogram.types import (
+    BotCommand, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent, Message, WebAppInfo
+)
+
+from . import callbacks
+from .manager import TigerRozetkaBotManager
+from .throttling import ThrottlingMiddleware
+from .tournaments import round_name
+
+# Кнопки без аргументов кодируются один раз
+DUEL_MENU = callbacks.encode("duel_menu")
+REFRESH_PLAYERS = callbacks.encode("refresh_players")
+PLAYERS_ONLINE = callbacks.encode("players_online")
+QUICK_MATCH = callbacks.encode("quick_match")
+
+BOT_COMMANDS = [
+    BotCommand(command="start", description="🚀 Запустить бота"),
+    BotCommand(command="play", description="🎮 Играть в TigerRozetka"),
+    BotCommand(command="duel", description="⚔️ Найти соперника для дуэли"),
+    BotCommand(command="stats", description="📊 Моя статистика"),
+    BotCommand(command="top", description="🏆 Таблица лидеров"),
+    BotCommand(command="tournament", description="🥇 Турнир"),
+]
+
+
+def player_key(player: Dict[str, Any]) -> Tuple[int, int, int]:
+    """Ключ игрока (level, wins, user_id) для кнопок перелистывания"""
+    return player['level'], player['wins'], player['id']
+
+
+def format_head_to_head(record: Optional[Tuple[int, int, int]]) -> str:
+    """Счет личных встреч для строки списка соперников"""
+    if not record:
+        return ""
+    wins, losses, draws = record
+    return f" • 🤝 {wins}:{losses}" + (f" (ничьих {draws})" if draws else "")
+
+
+async def send_duel_notification(bot: "Bot", manager: TigerRozetkaBotManager,
+                                 to_user_id: int, from_user_id: int, duel_id: str):
+    """Отправка уведомления о дуэли"""
+    if to_user_id in manager.blocked:
+        return  # Игрок заблокировал бота - уведомление не дойдет
+    try:
+        # Получаем информацию об отправителе
+        sender_info = await manager.storage.users.get_profile(from_user_id)
+
+        if sender_info:
+            sender_name, sender_level = sender_info['first_name'], sender_info['level']
+            record = (await manager.get_head_to_head(to_user_id, [from_user_id])).get(from_user_id)
+            history = ""
+            if record:
+                wins, losses, draws = record
+                history = f"\n📊 Ваши встречи: {wins} побед, {losses} поражений" + (
+                    f", {draws} ничьих" if draws else "") + "\n"
+
+            text = f"""🎮⚔️ ВЫЗОВ НА ДУЭЛЬ!
+
+{sender_name} (Уровень {sender_level}) вызывает вас на дуэль в TigerRozetka!
+{history}
+⚡ Игра на 60 секунд
+🏆 Кто наберет больше очков - тот победил!
+⏰ У вас есть 5 минут, чтобы ответить
+
+Принять вызов?"""
+
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [
+                    InlineKeyboardButton(
+                        text="✅ Принять дуэль", 
+                        callback_data=callbacks.encode("accept_duel", duel_id)
+                    ),
+                    InlineKeyboardButton(
+                        text="❌ Отклонить", 
+                        callback_data=callbacks.encode("decline_duel", duel_id)
+                    )
+                ],
+                [InlineKeyboardButton(
+                    text="🎮 Открыть игру", 
+                    web_app=WebAppInfo(url=manager.config.game_url)
+                )]
+            ])
+
+            await bot.send_message(to_user_id, text, reply_markup=keyboard)
+            print(f"📤 Уведомление о дуэли отправлено: {to_user_id}")
+
+    except TelegramForbiddenError:
+        await manager.deactivate_user(to_user_id)
+    except Exception as e:
+        print(f"❌ Ошибка отправки уведомления: {e}")
+
+
+def create_router(manager: TigerRozetkaBotManager,
+                  throttling: Optional[ThrottlingMiddleware] = None) -> Router:
+    """Роутер со всеми обработчиками бота"""
+    router = Router()
+    config = manager.config
+
+    # Учет присутствия - до антиспама: отброшенное событие тоже значит, что игрок в сети
+    for observer in (router.message, router.callback_query, router.inline_query):
+        observer.outer_middleware(manager.presence)
+
+    # Антиспам проверяется до фильтров и обработчиков
+    if throttling is not None:
+        router.message.outer_middleware(throttling)
+        router.callback_query.outer_middleware(throttling)
+        router.inline_query.outer_middleware(throttling)
+
+    # Middleware для автоматической регистрации пользователей
+    async def user_registration_middleware(handler, event, data):
+        """Middleware для автоматической регистрации пользователей"""
+        if hasattr(event, 'from_user') and event.from_user:
+            user = event.from_user
+            await manager.register_user(
+                user.id, user.username, user.first_name, user.last_name
+            )
+        return await handler(event, data)
+
+    # Команда /start
+    @router.message(CommandStart())  # type: ignore[arg-type]
+    async def start_handler(message: "Message"):
+        """Обработчик команды /start"""
+        if not message.from_user:
+            return
+        user = message.from_user
+        await manager.register_user(user.id, user.username, user.first_name, user.last_name)
+        
+        welcome_text = f"""🐅⚡ Добро пожаловать в TigerRozetka, {user.first_name}!
+
+Опасная игра с электричеством ждет вас!
+
+🎮 Команды:
+/play - Начать игру
+/duel - Найти соперника для дуэли  
+/duel <имя> - Найти игрока по имени или @username
+/stats - Ваша статистика
+/top - Таблица лидеров (/top week - за неделю)
+/tournament - Турнир на выбывание
+/help - Помощь
+
+🚀 Нажмите кнопку ниже, чтобы играть!"""
+
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🎮 Играть в TigerRozetka", 
+                web_app=WebAppInfo(url=config.game_url)
+            )],
+            [InlineKeyboardButton(
+                text="⚔️ Дуэли", 
+                callback_data=DUEL_MENU
+            )]
+        ])
+        
+        await message.answer(welcome_text, reply_markup=keyboard)
+
+    # Команда /play
+    @router.message(Command("play"))  # type: ignore[arg-type]
+    async def play_handler(message: "Message"):
+        """Запуск игры"""
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🎮 Играть в TigerRozetka", 
+                web_app=WebAppInfo(url=config.game_url)
+            )]
+        ])
+        
+        await message.answer(
+            "🎮 Запускаем TigerRozetka!\n\n⚡ Осторожно: игра вызывает привыкание!",
+            reply_markup=keyboard
+        )
+
+    # Команда /duel
+    @router.message(Command("duel"))  # type: ignore[arg-type]
+    async def duel_command_handler(message: "Message", command: "CommandObject"):
+        """Команда дуэли (/duel или /duel <имя> для поиска соперника)"""
+        if command.args and message.from_user:
+            await show_search_results(message, message.from_user.id, command.args)
+            return
+        await show_duel_menu(message)
+
+    async def show_search_results(message: "Message", user_id: int, query: str):
+        """Показать результаты поиска соперника по имени/username"""
+        players = await manager.search_players(query, exclude_user_id=user_id)
+        
+        if not players:
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="⚔️ Все игроки", callback_data=DUEL_MENU)]
+            ])
+            await message.answer(
+                f"🔍 Игроки по запросу «{query}» не найдены.\n\n"
+                "Проверьте имя или username и попробуйте снова.",
+                reply_markup=keyboard
+            )
+            return
+        
+        records = await manager.get_head_to_head(user_id, [player['id'] for player in players])
+        text = f"🔍 Результаты поиска «{query}»:\n\n"
+        keyboard_buttons = []
+        
+        for i, player in enumerate(players):
+            name = player['firstName'] or ''
+            if player['lastName']:
+                name += f" {player['lastName']}"
+            if player['username']:
+                name += f" (@{player['username']})"
+            
+            text += f"{i+1}. {name}\n"
+            text += (f"   ⚡ Уровень {player['level']} • 📈 {player['rating']}"
+                     f" • 🏆 {player['wins']}/{player['totalGames']}"
+                     f"{format_head_to_head(records.get(player['id']))}\n\n")
+            
+            keyboard_buttons.append([InlineKeyboardButton(
+                text=f"⚔️ Вызвать {player['firstName'] or player['username']}", 
+                callback_data=callbacks.encode("challenge", player['id'])
+            )])
+        
+        keyboard_buttons.append([InlineKeyboardButton(text="⚔️ Все игроки", callback_data=DUEL_MENU)])
+        await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=keyboard_buttons))
+
+    async def show_duel_menu(message: "Message", user_id: Optional[int] = None,
+                             cursor_key: Optional[Tuple[int, int, int]] = None,
+                             direction: str = 'next', edit: bool = False, online: bool = False):
+        """Показать меню дуэлей (страница списка соперников; online - только игроки в сети)"""
+        if user_id is None:
+            if not message.from_user:
+                return
+            user_id = message.from_user.id
+        if online:
+            # Одна страница: ближайшие по рейтингу из тех, кто сейчас в сети
+            players = await manager.get_online_players(user_id, rating=await manager.get_rating(user_id))
+            has_prev = has_next = False
+        else:
+            players, has_prev, has_next = await manager.get_active_players_page(
+                exclude_user_id=user_id, cursor_key=cursor_key, direction=direction
+            )
+        refresh = PLAYERS_ONLINE if online else REFRESH_PLAYERS
+        
+        # Отправка нового сообщения или редактирование текущего на месте
+        async def respond(text: str, keyboard: "InlineKeyboardMarkup"):
+            if edit and hasattr(message, 'edit_text'):
+                msg_any: Any = message
+                try:
+                    await msg_any.edit_text(text, reply_markup=keyboard)
+                    return
+                except Exception:
+                    pass  # Сообщение не изменилось или недоступно для редактирования
+            await message.answer(text, reply_markup=keyboard)
+        
+        if not players:
+            keyboard_rows = [
+                [InlineKeyboardButton(
+                    text="🎮 Открыть игру", 
+                    web_app=WebAppInfo(url=config.game_url)
+                )],
+                [InlineKeyboardButton(
+                    text="🔄 Обновить список", 
+                    callback_data=refresh
+                )]
+            ]
+            if online:
+                keyboard_rows.append([InlineKeyboardButton(text="⚔️ Все игроки", callback_data=DUEL_MENU)])
+            
+            await respond(
+                "😴 Сейчас никого нет в сети.\n\n"
+                "Вызовите игрока из общего списка - он получит уведомление!"
+                if online else
+                "😔 Нет доступных игроков для дуэли.\n\n"
+                "Пригласите друзей подписаться на бота!",
+                InlineKeyboardMarkup(inline_keyboard=keyboard_rows)
+            )
+            return
+        
+        records = await manager.get_head_to_head(user_id, [player['id'] for player in players])
+        text = "🟢 Сейчас в сети:\n\n" if online else "⚔️ Доступные игроки для дуэли:\n\n"
+        keyboard_buttons = []
+        
+        for i, player in enumerate(players):
+            name = player['firstName']
+            if player['lastName']:
+                name += f" {player['lastName']}"
+            if player['username']:
+                name += f" (@{player['username']})"
+            if not online and player['id'] in manager.presence:
+                name = f"🟢 {name}"
+            
+            text += f"{i+1}. {name}\n"
+            text += (f"   ⚡ Уровень {player['level']} • 📈 {player['rating']}"
+                     f" • 🏆 {player['wins']}/{player['totalGames']}"
+                     f"{format_head_to_head(records.get(player['id']))}\n\n")
+            
+            keyboard_buttons.append([InlineKeyboardButton(
+                text=f"⚔️ Вызвать {player['firstName']}", 
+                callback_data=callbacks.encode("challenge", player['id'])
+            )])
+        
+        # Кнопки навигации по страницам
+        nav_buttons = []
+        if has_prev:
+            nav_buttons.append(InlineKeyboardButton(
+                text="⬅️ Назад",
+                callback_data=callbacks.encode("players_prev", *player_key(players[0]))
+            ))
+        if has_next:
+            nav_buttons.append(InlineKeyboardButton(
+                text="Вперед ➡️",
+                callback_data=callbacks.encode("players_next", *player_key(players[-1]))
+            ))
+        if nav_buttons:
+            keyboard_buttons.append(nav_buttons)
+        
+        # Добавляем кнопки управления
+        keyboard_buttons.extend([
+            [InlineKeyboardButton(text="⚡ Быстрый матч", callback_data=QUICK_MATCH),
+             InlineKeyboardButton(text="⚔️ Все игроки", callback_data=DUEL_MENU) if online
+             else InlineKeyboardButton(text="🟢 В сети", callback_data=PLAYERS_ONLINE)],
+            [InlineKeyboardButton(text="🔄 Обновить", callback_data=refresh)],
+            [InlineKeyboardButton(text="🎮 Открыть игру", web_app=WebAppInfo(url=config.game_url))]
+        ])
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
+        await respond(text, keyboard)
+
+    # Команда /stats
+    @router.message(Command("stats"))  # type: ignore[arg-type]
+    async def stats_handler(message: "Message"):
+        """Показать статистику пользователя"""
+        if not message.from_user:
+            return
+        user_id = message.from_user.id
+        stats = await manager.get_user_stats(user_id)
+        
+        if stats:
+            win_rate = (stats['wins'] / stats['total_games'] * 100) if stats['total_games'] > 0 else 0
+            
+            text = f"""📊 Ваша статистика:
+
+⚡ Уровень: {stats['level']}
+📈 Рейтинг: {round(stats['rating'])}
+🎮 Всего игр: {stats['total_games']}
+🏆 Побед: {stats['wins']}
+💀 Поражений: {stats['losses']}
+📈 Процент побед: {win_rate:.1f}%
+🏅 Место в рейтинге: {manager.leaderboard.rank(user_id) or '—'} из {len(manager.leaderboard)}
+🗓️ Место за неделю: {manager.season_tracker.rank(user_id) or '—'}
+
+🎯 Продолжайте играть, чтобы повысить уровень!"""
+            neighbors = manager.leaderboard.around(user_id, radius=2)
+            if len(neighbors) > 1:
+                text += "\n\n📍 Рядом с вами:\n" + await format_leaderboard(neighbors, highlight=user_id)
+        else:
+            text = "📊 У вас пока нет статистики.\n\nНачните играть!"
+        
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="🎮 Играть", web_app=WebAppInfo(url=config.game_url))],
+            [InlineKeyboardButton(text="⚔️ Дуэли", callback_data=DUEL_MENU)]
+        ])
+        
+        await message.answer(text, reply_markup=keyboard)
+
+    async def format_leaderboard(entries: List[Dict[str, int]], highlight: Optional[int] = None) -> str:
+        """Текстовое представление строк таблицы лидеров"""
+        users = await manager.get_users_brief([entry['user_id'] for entry in entries])
+        lines = []
+        for entry in entries:
+            user = users.get(entry['user_id'], {})
+            name = user.get('firstName') or (f"@{user['username']}" if user.get('username') else f"Игрок {entry['user_id']}")
+            marker = "👉 " if entry['user_id'] == highlight else ""
+            lines.append(f"{marker}{entry['rank']}. {name} — ⚡ {entry['level']} • 🏆 {entry['wins']}")
+        return "\n".join(lines)
+
+    # Команда /top
+    @router.message(Command("top"))  # type: ignore[arg-type]
+    async def top_handler(message: "Message", command: "CommandObject"):
+        """Показать лучших игроков (/top week - рейтинг текущей недели)"""
+        if command.args and command.args.strip().lower() in ('week', 'неделя'):
+            await show_season_top(message)
+            return
+        entries = manager.leaderboard.top(10)
+        if not entries:
+            await message.answer("🏆 Таблица лидеров пока пуста.\n\nСыграйте первую дуэль!")
+            return
+        
+        user_id = message.from_user.id if message.from_user else None
+        text = "🏆 Лучшие игроки TigerRozetka:\n\n" + await format_leaderboard(entries, highlight=user_id)
+        
+        rank = manager.leaderboard.rank(user_id) if user_id is not None else None
+        if rank is not None and rank > len(entries):
+            text += f"\n\n🏅 Ваше место: {rank} из {len(manager.leaderboard)}"
+        
+        await message.answer(text, reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="⚔️ Дуэли", callback_data=DUEL_MENU)]
+        ]))
+
+    async def show_season_top(message: "Message"):
+        """Рейтинг текущего сезона"""
+        entries = manager.season_tracker.top(10)
+        if not entries:
+            await message.answer("🗓️ На этой неделе еще никто не играл.\n\nСтаньте первым!")
+            return
+        
+        users = await manager.get_users_brief([entry['user_id'] for entry in entries])
+        lines = []
+        for entry in entries:
+            user = users.get(entry['user_id'], {})
+            name = user.get('firstName') or (f"@{user['username']}" if user.get('username') else f"Игрок {entry['user_id']}")
+            lines.append(f"{entry['rank']}. {name} — 🏆 {entry['wins']} из {entry['games']}")
+        text = f"🗓️ Рейтинг недели {manager.season_tracker.current}:\n\n" + "\n".join(lines)
+        
+        user_id = message.from_user.id if message.from_user else None
+        rank = manager.season_tracker.rank(user_id) if user_id is not None else None
+        if rank is not None:
+            text += f"\n\n🏅 Ваше место за неделю: {rank}"
+        
+        await message.answer(text)
+
+    # Команда /tournament
+    @router.message(Command("tournament"))  # type: ignore[arg-type]
+    async def tournament_handler(message: "Message"):
+        """Текущий матч игрока в турнире или запись на ближайший турнир"""
+        if not message.from_user:
+            return
+        user_id = message.from_user.id
+        
+        current = manager.tournaments.current_match(user_id)
+        if current is not None:
+            tournament, match = current
+            opponent_id = match.player2_id if match.player1_id == user_id else match.player1_id
+            opponent = (await manager.get_users_brief([opponent_id])).get(opponent_id, {})  # type: ignore[list-item]
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text="🎮 Играть матч", web_app=WebAppInfo(url=f"{config.game_url}?duel={match.duel_id}")
+            )]])
+            await message.answer(
+                f"🏆 Турнир «{tournament.name}», {round_name(match.round, tournament.rounds)}\n\n"
+                f"⚔️ Ваш соперник: {opponent.get('firstName') or f'игрок {opponent_id}'}\n"
+                f"⏰ Сыграйте дуэль до {tournament.round_deadline:%H:%M}",
+                reply_markup=keyboard
+            )
+            return
+        
+        registration = manager.tournaments.open_registration(user_id)
+        if registration is None:
+            await message.answer("🏆 Сейчас нет турниров с открытой регистрацией.\n\n"
+                                 "Следите за новостями бота!")
+            return
+        
+        text = f"""🏆 Турнир «{registration['name']}»
+
+🗓️ Старт: {registration['starts_at']:%d.%m в %H:%M}
+👥 Участников: {registration['players']}
+⏱️ На матч каждого раунда: {registration['round_minutes']} минут
+🎯 Посев по рейтингу, игра на выбывание"""
+        keyboard = None
+        if registration['joined']:
+            text += "\n\n✅ Вы зарегистрированы"
+        else:
+            keyboard = InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(
+                text="✅ Участвовать", callback_data=callbacks.encode("tournament_join", registration['id'])
+            )]])
+        await message.answer(text, reply_markup=keyboard)
+
+    # Обработчики callback запросов
+    async def duel_menu_callback(callback: "CallbackQuery"):
+        """Показать меню дуэлей из callback"""
+        await callback.answer()
+        if callback.message:
+            await show_duel_menu(callback.message, user_id=callback.from_user.id)  # type: ignore[arg-type]
+
+    async def refresh_players_callback(callback: "CallbackQuery"):
+        """Обновить список игроков"""
+        await callback.answer("🔄 Обновляем список...")
+        if callback.message:
+            await show_duel_menu(
+                callback.message, user_id=callback.from_user.id, edit=True  # type: ignore[arg-type]
+            )
+
+    async def players_online_callback(callback: "CallbackQuery"):
+        """Только игроки в сети (редактирует сообщение на месте)"""
+        await callback.answer()
+        if callback.message:
+            await show_duel_menu(
+                callback.message, user_id=callback.from_user.id, edit=True, online=True  # type: ignore[arg-type]
+            )
+
+    async def quick_match_callback(callback: "CallbackQuery"):
+        """Вызов ближайшего по рейтингу игрока в сети"""
+        await callback.answer()
+        if callback.message is None:
+            return
+        challenger_id = callback.from_user.id
+        opponent, duel_id, result = await manager.quick_match(challenger_id)
+        
+        if opponent is not None and result == 'created':
+            await send_duel_notification(callback.bot, manager, opponent['id'], challenger_id, duel_id)
+            text = (f"⚡ Соперник найден: {opponent['firstName']} "
+                    f"(⚡ Уровень {opponent['level']} • 📈 {opponent['rating']})\n\n"
+                    f"⏰ Ожидайте ответа в течение {config.duel_ttl_minutes} минут...")
+        elif result == 'challenger_limit':
+            text = (f"🚫 У вас уже {config.max_pending_outgoing} вызовов без ответа.\n\n"
+                    "Дождитесь ответа на них или их истечения.")
+        else:
+            text = ("😴 Сейчас в сети нет свободных соперников.\n\n"
+                    "Попробуйте позже или вызовите игрока из общего списка.")
+        
+        if hasattr(callback.message, 'edit_text'):
+            msg_any: Any = callback.message
+            await msg_any.edit_text(
+                text,
+                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🔙 Назад к списку", callback_data=DUEL_MENU)]
+                ])
+            )
+
+    async def players_page_callback(callback: "CallbackQuery", direction: str,
+                                    level: int, wins: int, user_id: int):
+        """Перелистывание списка соперников (редактирует сообщение на месте)"""
+        await callback.answer()
+        if not callback.message:
+            return
+        await show_duel_menu(
+            callback.message,  # type: ignore[arg-type]
+            user_id=callback.from_user.id,
+            cursor_key=(level, wins, user_id),
+            direction=direction,
+            edit=True
+        )
+
+    async def challenge_callback(callback: "CallbackQuery", target_user_id: int):
+        """Отправить вызов на дуэль"""
+        await callback.answer()
+        if not callback.from_user:
+            return
+        if callback.message is None:
+            return
+        challenger_id = callback.from_user.id
+        
+        # Создаем дуэль (или находим уже ожидающее приглашение этому игроку)
+        duel_id, result = await manager.invite(challenger_id, target_user_id)
+        
+        if result == 'created':
+            # Отправляем уведомление получателю
+            await send_duel_notification(callback.bot, manager, target_user_id, challenger_id, duel_id)
+            text = ("⚔️ Приглашение на дуэль отправлено!\n\n"
+                    f"⏰ Ожидайте ответа в течение {config.duel_ttl_minutes} минут...")
+        elif result == 'existing':
+            text = ("⏳ Вы уже вызвали этого игрока!\n\n"
+                    "Приглашение ещё ждёт ответа - повторно отправлять не нужно.")
+        elif result == 'challenger_limit':
+            text = (f"🚫 У вас уже {config.max_pending_outgoing} вызовов без ответа.\n\n"
+                    "Дождитесь ответа на них или их истечения.")
+        else:
+            text = "🚫 У этого игрока слишком много непринятых вызовов. Попробуйте позже!"
+        
+        # Уведомляем отправителя
+        if callback.message is not None and hasattr(callback.message, 'edit_text'):
+            msg_any: Any = callback.message
+            await msg_any.edit_text(
+            text,
+            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
+                [InlineKeyboardButton(text="🔙 Назад к списку", callback_data=DUEL_MENU)]
+            ])
+            )
+
+    @router.inline_query()  # type: ignore[arg-type]
+    async def inline_duel_handler(inline_query: "InlineQuery"):
+        """Inline-режим: карточка вызова на дуэль для отправки в любой чат"""
+        user = inline_query.from_user
+        duel_id = manager.inline_cache.get(user.id)
+        if duel_id is None:
+            duel_id = await manager.create_duel(user.id, None)
+            # Локальный кеш живет, пока Telegram еще может показать результат
+            manager.inline_cache.put(user.id, duel_id, config.duel_ttl_minutes * 60 - config.inline_cache_time)
+        
+        text = f"""🎮⚔️ ВЫЗОВ НА ДУЭЛЬ!
+
+{user.first_name} вызывает на дуэль в TigerRozetka!
+
+⚡ Игра на 60 секунд
+🏆 Кто наберет больше очков - тот победил!
+⏰ Вызов действует {config.duel_ttl_minutes} минут"""
+
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(text="✅ Принять вызов", callback_data=callbacks.encode("accept_duel", duel_id))],
+            [InlineKeyboardButton(text="🎮 Открыть игру", url=config.game_url)]
+        ])
+        
+        result = InlineQueryResultArticle(
+            id=duel_id,
+            title="⚔️ Вызвать на дуэль",
+            description=f"Игра на 60 секунд • действует {config.duel_ttl_minutes} минут",
+            input_message_content=InputTextMessageContent(message_text=text),
+            reply_markup=keyboard
+        )
+        await inline_query.answer([result], cache_time=config.inline_cache_time, is_personal=True)
+
+    async def accept_duel_callback(callback: "CallbackQuery", duel_id: str):
+        """Принять дуэль"""
+        if not callback.from_user:
+            await callback.answer()
+            return
+        user_id = callback.from_user.id
+        
+        async def edit_response(text: str, keyboard: Optional["InlineKeyboardMarkup"] = None):
+            """Редактирование приглашения (обычное или inline-сообщение)"""
+            if callback.inline_message_id:
+                await callback.bot.edit_message_text(
+                    text, inline_message_id=callback.inline_message_id, reply_markup=keyboard
+                )
+            elif callback.message and hasattr(callback.message, 'edit_text'):
+                msg_any: Any = callback.message
+                await msg_any.edit_text(text, reply_markup=keyboard)
+        
+        duel_info = await manager.get_duel_info(duel_id)
+        
+        if not duel_info:
+            await callback.answer()
+            await edit_response("❌ Приглашение не найдено или недействительно")
+            return
+        
+        # Проверяем срок действия
+        try:
+            expires_at_raw = duel_info['expires_at']
+            if isinstance(expires_at_raw, str):
+                expires_at = datetime.fromisoformat(expires_at_raw)
+            else:
+                expires_at = expires_at_raw  # type: ignore
+            if expires_at < datetime.now():
+                await callback.answer()
+                await edit_response("⏰ Время для ответа истекло")
+                return
+        except Exception:
+            pass
+        
+        # Открытый вызов из inline-режима закрепляем за первым принявшим
+        if duel_info['player2_id'] is None:
+            if user_id == duel_info['player1_id']:
+                await callback.answer("Нельзя принять собственный вызов", show_alert=True)
+                return
+            if not await manager.claim_open_duel(duel_id, user_id):
+                await callback.answer("Вызов уже принят другим игроком", show_alert=True)
+                return
+            duel_info['player2_id'] = user_id
+            manager.inline_cache.invalidate(duel_info['player1_id'], duel_id)
+        elif duel_info['player2_id'] != user_id:
+            await callback.answer("Это приглашение адресовано не вам", show_alert=True)
+            return
+        
+        await callback.answer()
+        
+        # Принимаем дуэль
+        await manager.update_duel_status(duel_id, 'accepted')
+        manager.push.publish_duel(duel_id, 'accepted', duel_info['player1_id'], duel_info['player2_id'])
+        
+        # Уведомляем обоих игроков
+        game_url_with_duel = f"{config.game_url}?duel={duel_id}"
+        
+        duel_keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🎮 Начать дуэль!", 
+                web_app=WebAppInfo(url=game_url_with_duel)
+            )]
+        ])
+        
+        # Уведомляем инициатора
+        await callback.bot.send_message(
+            duel_info['player1_id'],
+            "✅ Ваш вызов принят! Дуэль начинается!\n\n"
+            "🎮 Нажмите кнопку ниже для входа в игру:",
+            reply_markup=duel_keyboard
+        )
+        
+        # Уведомляем принявшего (в inline-сообщениях web_app кнопки недоступны)
+        if callback.inline_message_id:
+            await edit_response(
+                f"⚔️ Дуэль принята игроком {callback.from_user.first_name}! Удачи!",
+                InlineKeyboardMarkup(inline_keyboard=[
+                    [InlineKeyboardButton(text="🎮 Начать дуэль!", url=game_url_with_duel)]
+                ])
+            )
+        else:
+            await edit_response(
+                "⚔️ Дуэль принята! Удачи!\n\n"
+                "🎮 Нажмите кнопку ниже для входа в игру:",
+                duel_keyboard
+            )
+        
+        # Уведомляем backend
+        await manager.notify_backend_duel_start(duel_id, duel_info['player1_id'], duel_info['player2_id'])
+
+    async def decline_duel_callback(callback: "CallbackQuery", duel_id: str):
+        """Отклонить дуэль"""
+        await callback.answer()
+        duel_info = await manager.get_duel_info(duel_id)
+        
+        if duel_info:
+            # Удаляем дуэль
+            await manager.delete_duel(duel_id)
+            manager.push.publish_duel(duel_id, 'declined', duel_info['player1_id'], duel_info['player2_id'])
+            
+            # Уведомляем инициатора
+            await callback.bot.send_message(
+                duel_info['player1_id'],
+                "❌ Ваш вызов на дуэль отклонен"
+            )
+        
+        if callback.message and hasattr(callback.message, 'edit_text'):
+            msg_any: Any = callback.message
+            await msg_any.edit_text("❌ Вы отклонили приглашение на дуэль")
+
+    async def tournament_join_callback(callback: "CallbackQuery", tournament_id: int):
+        """Запись на турнир"""
+        if manager.tournaments.register(tournament_id, [callback.from_user.id]):
+            await callback.answer("✅ Вы зарегистрированы на турнир!", show_alert=True)
+            if callback.message and hasattr(callback.message, 'edit_reply_markup'):
+                msg_any: Any = callback.message
+                await msg_any.edit_reply_markup(reply_markup=None)
+        else:
+            await callback.answer("Регистрация на этот турнир закрыта или вы уже записаны")
+
+    # Единая точка входа для всех кнопок: callback_data разбирается один раз
+    callback_handlers = {
+        'duel_menu': duel_menu_callback,
+        'refresh_players': refresh_players_callback,
+        'players_next': lambda callback, *key: players_page_callback(callback, 'next', *key),
+        'players_prev': lambda callback, *key: players_page_callback(callback, 'prev', *key),
+        'challenge': challenge_callback,
+        'accept_duel': accept_duel_callback,
+        'decline_duel': decline_duel_callback,
+        'tournament_join': tournament_join_callback,
+        'players_online': players_online_callback,
+        'quick_match': quick_match_callback,
+    }
+
+    @router.callback_query()  # type: ignore[arg-type]
+    async def callback_dispatcher(callback: "CallbackQuery"):
+        """Разбор callback_data и вызов обработчика действия"""
+        decoded = callbacks.decode(callback.data)
+        if decoded is None:
+            await callback.answer("⚠️ Кнопка устарела")
+            return
+        action, args = decoded
+        await callback_handlers[action](callback, *args)
+
+    return router
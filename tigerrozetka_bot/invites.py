@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - индекс ожидающих приглашений на дуэль
+Ожидающие ответа вызовы хранятся в памяти по вызывающему и по цели:
+повторный вызов той же цели возвращает существующее приглашение вместо
+новой строки в active_duels, а лимиты проверяются без запросов к базе.
+"""
+
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+
+class PendingInviteIndex:
+    """Приглашения (duel_id) по вызывающему и по цели"""
+
+    def __init__(self, max_outgoing: int = 5, max_incoming: int = 10):
+        self.max_outgoing = max_outgoing
+        self.max_incoming = max_incoming
+        # duel_id -> (вызывающий, цель, истекает)
+        self.invites: Dict[str, Tuple[int, int, datetime]] = {}
+        self.by_challenger: Dict[int, Dict[int, str]] = {}
+        self.by_target: Dict[int, Dict[int, str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.invites)
+
+    def load(self, rows: Iterable[Tuple[str, int, int, datetime]]):
+        """Построение индекса из (duel_id, вызывающий, цель, истекает)"""
+        self.invites.clear()
+        self.by_challenger.clear()
+        self.by_target.clear()
+        for duel_id, challenger, target, expires_at in rows:
+            self.add(duel_id, challenger, target, expires_at)
+
+    def add(self, duel_id: str, challenger: int, target: int, expires_at: datetime):
+        previous = self.by_challenger.get(challenger, {}).get(target)
+        if previous is not None:
+            self.remove(previous)
+        self.invites[duel_id] = (challenger, target, expires_at)
+        self.by_challenger.setdefault(challenger, {})[target] = duel_id
+        self.by_target.setdefault(target, {})[challenger] = duel_id
+
+    def remove(self, duel_id: str) -> Optional[Tuple[int, int, datetime]]:
+        invite = self.invites.pop(duel_id, None)
+        if invite is None:
+            return None
+        challenger, target, _ = invite
+        for index, owner, other in ((self.by_challenger, challenger, target),
+                                    (self.by_target, target, challenger)):
+            entries = index.get(owner)
+            if entries is not None:
+                entries.pop(other, None)
+                if not entries:
+                    del index[owner]
+        return invite
+
+    def _expire(self, entries: Optional[Dict[int, str]], now: datetime):
+        """Удаление истекших приглашений одного игрока (не больше лимита записей)"""
+        if entries:
+            for duel_id in [d for d in entries.values() if self.invites[d][2] <= now]:
+                self.remove(duel_id)
+
+    def find(self, challenger: int, target: int, now: datetime) -> Optional[str]:
+        """Ожидающее приглашение challenger -> target"""
+        duel_id = self.by_challenger.get(challenger, {}).get(target)
+        if duel_id is not None and self.invites[duel_id][2] <= now:
+            self.remove(duel_id)
+            return None
+        return duel_id
+
+    def outgoing(self, user_id: int, now: datetime) -> Dict[int, str]:
+        """Ожидающие вызовы игрока: цель -> duel_id"""
+        self._expire(self.by_challenger.get(user_id), now)
+        return dict(self.by_challenger.get(user_id, {}))
+
+    def incoming(self, user_id: int, now: datetime) -> Dict[int, str]:
+        """Вызовы, ожидающие ответа игрока: вызывающий -> duel_id"""
+        self._expire(self.by_target.get(user_id), now)
+        return dict(self.by_target.get(user_id, {}))
+
+    def check_limits(self, challenger: int, target: int, now: datetime) -> Optional[str]:
+        """Причина отказа в новом вызове ('challenger_limit', 'target_limit') или None"""
+        self._expire(self.by_challenger.get(challenger), now)
+        self._expire(self.by_target.get(target), now)
+        if len(self.by_challenger.get(challenger, ())) >= self.max_outgoing:
+            return 'challenger_limit'
+        if len(self.by_target.get(target, ())) >= self.max_incoming:
+            return 'target_limit'
+        return None
+
+    def prune(self, now: datetime) -> int:
+        expired = [duel_id for duel_id, invite in self.invites.items() if invite[2] <= now]
+        for duel_id in expired:
+            self.remove(duel_id)
+        return len(expired)
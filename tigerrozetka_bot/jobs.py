@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - фоновые задачи под наблюдением
+Периодические задачи (очистка дуэлей, outbox, снимки сезонов) выполняются
+супервизором: ошибка одной итерации не останавливает задачу, повтор идет
+с экспоненциальной задержкой. Состояние задач и задержка цикла событий
+доступны по HTTP: GET http://127.0.0.1:<BOT_HEALTH_PORT>/healthz
+"""
+
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from .lifecycle import Lifecycle
+
+# Обработчик HTTP-маршрута: параметры запроса -> (статус, Content-Type, тело)
+RouteHandler = Callable[[Dict[str, str]], Awaitable[Tuple[str, str, bytes]]]
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[Any]]
+    interval: float
+    initial_delay: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+    last_success: Optional[float] = None
+    last_error: Optional[str] = None
+    failures: int = 0  # Ошибок подряд (сбрасывается после успешной итерации)
+    total_failures: int = 0
+
+    @property
+    def stale_after(self) -> float:
+        """Через сколько секунд без успешной итерации задача считается зависшей"""
+        return self.initial_delay + max(3 * self.interval, self.interval + 60)
+
+
+class JobSupervisor:
+    """Запуск периодических задач с повтором при ошибках и учетом их состояния"""
+
+    def __init__(self, lifecycle: Lifecycle, max_backoff: float = 300.0,
+                 lag_interval: float = 0.5, max_lag_ms: float = 500.0):
+        self.lifecycle = lifecycle
+        self.max_backoff = max_backoff
+        self.lag_interval = lag_interval
+        self.max_lag_ms = max_lag_ms
+        self.jobs: Dict[str, Job] = {}
+        self.loop_lag_ms = 0.0
+        self.max_loop_lag_ms = 0.0  # Максимум с прошлого запроса /healthz
+        self.routes: Dict[str, RouteHandler] = {'/healthz': self._http_health}
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], interval: float,
+            initial_delay: float = 0.0):
+        """Регистрация и запуск задачи: func выполняет одну итерацию"""
+        job = Job(name, func, interval, initial_delay)
+        self.jobs[name] = job
+        self.lifecycle.spawn(f"job:{name}", self._run(job))
+
+    def backoff(self, job: Job) -> float:
+        delay = min(self.max_backoff, job.interval, 2 ** (job.failures - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    async def _run(self, job: Job):
+        if job.initial_delay:
+            await asyncio.sleep(job.initial_delay)
+        while True:
+            try:
+                await job.func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                job.failures += 1
+                job.total_failures += 1
+                job.last_error = f"{type(e).__name__}: {e}"
+                delay = self.backoff(job)
+                print(f"❌ Задача {job.name} упала ({job.last_error}), повтор через {delay:.1f} с")
+                await asyncio.sleep(delay)
+                continue
+
+            job.failures = 0
+            job.last_success = time.monotonic()
+            await asyncio.sleep(job.interval)
+
+    def start_lag_monitor(self):
+        self.lifecycle.spawn('loop_lag', self._measure_lag())
+
+    async def _measure_lag(self):
+        """Задержка цикла событий: насколько позже срока просыпается sleep()"""
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.lag_interval)
+            lag_ms = max(0.0, (time.monotonic() - started - self.lag_interval) * 1000)
+            self.loop_lag_ms = lag_ms
+            self.max_loop_lag_ms = max(self.max_loop_lag_ms, lag_ms)
+
+    def health(self) -> Dict[str, Any]:
+        """Состояние задач и цикла событий для /healthz"""
+        now = time.monotonic()
+        healthy = self.max_loop_lag_ms <= self.max_lag_ms
+        jobs: Dict[str, Any] = {}
+        for name, job in self.jobs.items():
+            task = self.lifecycle.tasks.get(f"job:{name}")
+            alive = task is not None and not task.done()
+            reference = job.last_success if job.last_success is not None else job.started_at
+            stale = now - reference > job.stale_after
+            healthy = healthy and alive and not stale
+            jobs[name] = {
+                'alive': alive,
+                'stale': stale,
+                'last_success_ago': None if job.last_success is None else round(now - job.last_success, 1),
+                'failures': job.failures,
+                'total_failures': job.total_failures,
+                'last_error': job.last_error,
+            }
+
+        report = {
+            'status': 'ok' if healthy else 'degraded',
+            'loop_lag_ms': round(self.loop_lag_ms, 1),
+            'max_loop_lag_ms': round(self.max_loop_lag_ms, 1),
+            'in_flight_updates': self.lifecycle.in_flight,
+            'jobs': jobs,
+        }
+        self.max_loop_lag_ms = self.loop_lag_ms
+        return report
+
+    async def _http_health(self, query: Dict[str, str]) -> Tuple[str, str, bytes]:
+        report = self.health()
+        status = '200 OK' if report['status'] == 'ok' else '503 Service Unavailable'
+        return status, 'application/json; charset=utf-8', json.dumps(report, ensure_ascii=False).encode()
+
+    # Локальный HTTP-сервер /healthz и отладочных маршрутов (без зависимостей, на asyncio)
+    async def serve_health(self, host: str = '127.0.0.1', port: int = 8081):
+        server = await asyncio.start_server(self._handle_http, host, port)
+        print(f"🩺 Health-check: http://{host}:{port}/healthz")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки запроса не нужны, но их надо дочитать
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path, _, query_string = (parts[1] if len(parts) > 1 else '').partition('?')
+
+            route = self.routes.get(path)
+            if route is not None:
+                status, content_type, body = await route(dict(parse_qsl(query_string)))
+            else:
+                status, content_type, body = '404 Not Found', 'application/json', b'{"error": "not found"}'
+
+            headers: List[str] = [
+                f"HTTP/1.1 {status}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                "Connection: close",
+            ]
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka - таблица лидеров в памяти
+Инкрементальное поддержание рангов игроков без COUNT(*) по bot_users
+"""
+
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+# Ключ сортировки: (-level, -wins, user_id) - лучшие игроки в начале
+RankKey = Tuple[int, int, int]
+
+
+class _Fenwick:
+    """Дерево Фенвика над размерами блоков (префиксные суммы за O(log n))"""
+
+    def __init__(self, sizes: List[int]):
+        self.n = len(sizes)
+        self.tree = [0] * (self.n + 1)
+        for i, size in enumerate(sizes):
+            self.add(i, size)
+
+    def add(self, i: int, delta: int):
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        """Сумма размеров блоков [0, i)"""
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def locate(self, index: int) -> Tuple[int, int]:
+        """Поиск (блок, позиция в блоке) для глобального индекса"""
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self.tree[nxt] <= index:
+                pos = nxt
+                index -= self.tree[nxt]
+            step >>= 1
+        return pos, index
+
+
+class SortedKeyList:
+    """Отсортированный список с блочной организацией (порядковая статистика)
+
+    Вставка и удаление - бинарный поиск блока плюс сдвиг внутри небольшого
+    блока; позиция элемента и доступ по индексу - O(log n) через дерево
+    Фенвика над размерами блоков.
+    """
+
+    def __init__(self, keys: Optional[List[RankKey]] = None, load: int = 512):
+        self.load = load
+        self._lists: List[List[RankKey]] = []
+        self._maxes: List[RankKey] = []
+        self._len = 0
+        self._build(sorted(keys or []))
+
+    def _build(self, keys: List[RankKey]):
+        self._lists = [keys[i:i + self.load] for i in range(0, len(keys), self.load)]
+        self._reindex()
+
+    def _reindex(self):
+        self._maxes = [bucket[-1] for bucket in self._lists]
+        self._fenwick = _Fenwick([len(bucket) for bucket in self._lists])
+        self._len = sum(len(bucket) for bucket in self._lists)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, key: RankKey):
+        if not self._lists:
+            self._lists.append([key])
+            self._reindex()
+            return
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            b -= 1
+        bucket = self._lists[b]
+        insort(bucket, key)
+        self._maxes[b] = bucket[-1]
+        self._fenwick.add(b, 1)
+        self._len += 1
+        if len(bucket) > 2 * self.load:
+            self._lists[b:b + 1] = [bucket[:self.load], bucket[self.load:]]
+            self._reindex()
+
+    def remove(self, key: RankKey) -> bool:
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            return False
+        bucket = self._lists[b]
+        pos = bisect_left(bucket, key)
+        if pos == len(bucket) or bucket[pos] != key:
+            return False
+        del bucket[pos]
+        self._len -= 1
+        if bucket:
+            self._maxes[b] = bucket[-1]
+            self._fenwick.add(b, -1)
+        else:
+            del self._lists[b]
+            self._reindex()
+        return True
+
+    def position(self, key: Tuple[int, ...]) -> int:
+        """Количество элементов строго меньше key"""
+        b = bisect_left(self._maxes, key)
+        if b == len(self._maxes):
+            return self._len
+        return self._fenwick.prefix(b) + bisect_left(self._lists[b], key)
+
+    def __getitem__(self, index: int) -> RankKey:
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('SortedKeyList index out of range')
+        b, pos = self._fenwick.locate(index)
+        return self._lists[b][pos]
+
+    def slice(self, start: int, stop: int) -> List[RankKey]:
+        """Элементы с позиций [start, stop)"""
+        start = max(start, 0)
+        stop = min(stop, self._len)
+        if start >= stop:
+            return []
+        b, pos = self._fenwick.locate(start)
+        result: List[RankKey] = []
+        while len(result) < stop - start:
+            bucket = self._lists[b]
+            result.extend(bucket[pos:pos + (stop - start - len(result))])
+            b, pos = b + 1, 0
+        return result
+
+
+class Leaderboard:
+    """Таблица лидеров: порядок по level DESC, wins DESC
+
+    Ранг - "спортивный": игроки с одинаковыми уровнем и победами делят место.
+    """
+
+    def __init__(self):
+        self._keys = SortedKeyList()
+        self._stats: Dict[int, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._stats
+
+    @staticmethod
+    def _key(user_id: int, level: int, wins: int) -> RankKey:
+        return (-level, -wins, user_id)
+
+    def load(self, rows: List[Tuple[int, int, int]]):
+        """Полное построение из строк (user_id, level, wins)"""
+        self._stats = {user_id: (level or 0, wins or 0) for user_id, level, wins in rows}
+        self._keys = SortedKeyList([
+            self._key(user_id, level, wins) for user_id, (level, wins) in self._stats.items()
+        ])
+
+    def update(self, user_id: int, level: int, wins: int):
+        """Добавление игрока или изменение его показателей"""
+        old = self._stats.get(user_id)
+        if old == (level, wins):
+            return
+        if old is not None:
+            self._keys.remove(self._key(user_id, *old))
+        self._stats[user_id] = (level, wins)
+        self._keys.add(self._key(user_id, level, wins))
+
+    def remove(self, user_id: int):
+        old = self._stats.pop(user_id, None)
+        if old is not None:
+            self._keys.remove(self._key(user_id, *old))
+
+    def get(self, user_id: int) -> Optional[Tuple[int, int]]:
+        return self._stats.get(user_id)
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место игрока (1 - лучший) или None, если игрок не в таблице"""
+        stats = self._stats.get(user_id)
+        if stats is None:
+            return None
+        level, wins = stats
+        return self._keys.position((-level, -wins)) + 1
+
+    def _entries(self, start: int, stop: int) -> List[Dict[str, int]]:
+        entries = []
+        for key in self._keys.slice(start, stop):
+            level, wins = -key[0], -key[1]
+            entries.append({
+                'rank': self._keys.position((key[0], key[1])) + 1,
+                'user_id': key[2],
+                'level': level,
+                'wins': wins
+            })
+        return entries
+
+    def top(self, n: int = 10) -> List[Dict[str, int]]:
+        """Первые n игроков"""
+        return self._entries(0, n)
+
+    def ranked(self) -> List[Dict[str, int]]:
+        """Вся таблица по порядку с местами (один проход)"""
+        entries: List[Dict[str, int]] = []
+        rank, previous = 0, None
+        for index, key in enumerate(self._keys.slice(0, len(self._keys))):
+            if (key[0], key[1]) != previous:
+                rank, previous = index + 1, (key[0], key[1])
+            entries.append({'rank': rank, 'user_id': key[2], 'level': -key[0], 'wins': -key[1]})
+        return entries
+
+    def around(self, user_id: int, radius: int = 2) -> List[Dict[str, int]]:
+        """Соседи игрока по таблице: radius выше и ниже"""
+        stats = self._stats.get(user_id)
+        if stats is None:
+            return []
+        index = self._keys.position(self._key(user_id, *stats))
+        return self._entries(index - radius, index + radius + 1)
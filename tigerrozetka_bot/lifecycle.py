@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - жизненный цикл процесса
+Фоновые задачи с сохраненными ссылками, учет обрабатываемых обновлений,
+корректное завершение по SIGTERM/SIGINT в пределах дедлайна и передача
+работы новому процессу без потери обновлений.
+
+Передача работы (перезапуск без простоя):
+    python -m tigerrozetka_bot run --handoff
+Новый процесс полностью инициализируется, затем отправляет SIGTERM процессу
+из pid-файла и начинает получать обновления только после его выхода.
+Обновления, пришедшие в этот промежуток, ждут на серверах Telegram.
+Передача работы поддерживается только на POSIX-системах.
+"""
+
+import asyncio
+import os
+import signal
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+
+class Lifecycle:
+    """Фоновые задачи, обрабатываемые обновления и завершение процесса"""
+
+    def __init__(self, shutdown_timeout: float = 20.0, pid_file: Optional[str] = None):
+        self.shutdown_timeout = shutdown_timeout
+        self.pid_file = pid_file
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self.last_update_id: Optional[int] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._hooks: List[Tuple[str, Callable[[], Awaitable[Any]]]] = []
+        self._stop_requested: Optional[asyncio.Event] = None
+
+    # Фоновые задачи
+    def spawn(self, name: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """Запуск фоновой задачи; ссылка хранится до завершения процесса"""
+        task = asyncio.ensure_future(coro)
+        task.set_name(name)
+        self.tasks[name] = task
+        return task
+
+    def on_shutdown(self, name: str, hook: Callable[[], Awaitable[Any]]):
+        """Действие при завершении (сброс буферов, очередей); выполняются по порядку"""
+        self._hooks.append((name, hook))
+
+    # Обрабатываемые обновления
+    async def update_middleware(self, handler, event, data):
+        """Outer-middleware Dispatcher.update: учет обновлений в обработке"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._in_flight.add(task)
+        update_id = getattr(event, 'update_id', None)
+        if update_id is not None and (self.last_update_id is None or update_id > self.last_update_id):
+            self.last_update_id = update_id
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(task)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
+
+    # Сигналы
+    @property
+    def stop_requested(self) -> asyncio.Event:
+        if self._stop_requested is None:
+            self._stop_requested = asyncio.Event()
+        return self._stop_requested
+
+    def request_stop(self, reason: str = ''):
+        if not self.stop_requested.is_set():
+            print(f"🛑 Остановка процесса{': ' + reason if reason else ''}")
+        self.stop_requested.set()
+
+    def install_signal_handlers(self):
+        """SIGTERM/SIGINT - прекратить прием обновлений и завершиться"""
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop, sig.name)
+            except NotImplementedError:
+                # Windows: обработчик сигналов без поддержки со стороны цикла событий
+                signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(
+                    self.request_stop, signal.Signals(signum).name
+                ))
+
+    # Завершение
+    def remaining(self, deadline: float) -> float:
+        return max(0.0, deadline - time.monotonic())
+
+    async def drain(self, deadline: float) -> int:
+        """Ожидание обрабатываемых обновлений; возвращает число незавершенных"""
+        pending = {task for task in self._in_flight if not task.done()}
+        if pending:
+            print(f"⏳ Завершение обработки обновлений: {len(pending)}")
+            _, pending = await asyncio.wait(pending, timeout=self.remaining(deadline))
+            if pending:
+                print(f"⚠️ Не успели обработать обновлений: {len(pending)}")
+        return len(pending)
+
+    async def shutdown(self, deadline: Optional[float] = None):
+        """Действия завершения в пределах дедлайна, затем отмена фоновых задач"""
+        deadline = deadline or time.monotonic() + self.shutdown_timeout
+        await self.drain(deadline)
+
+        for name, hook in self._hooks:
+            try:
+                await asyncio.wait_for(hook(), timeout=max(self.remaining(deadline), 0.1))
+            except asyncio.TimeoutError:
+                print(f"⚠️ Завершение «{name}» не уложилось в дедлайн")
+            except Exception as e:
+                print(f"❌ Ошибка при завершении «{name}»: {e}")
+
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        self.tasks.clear()
+        self.release_pid_file()
+
+    # Передача работы новому процессу
+    def write_pid_file(self):
+        if self.pid_file:
+            with open(self.pid_file, 'w') as f:
+                f.write(str(os.getpid()))
+
+    def release_pid_file(self):
+        """Удаление pid-файла, если он еще наш (новый процесс мог его перезаписать)"""
+        if self.pid_file and read_pid(self.pid_file) == os.getpid():
+            os.remove(self.pid_file)
+
+    async def take_over(self, timeout: Optional[float] = None) -> bool:
+        """Остановка предыдущего процесса из pid-файла и ожидание его выхода"""
+        pid = read_pid(self.pid_file) if self.pid_file else None
+        if os.name == 'nt':
+            print("⚠️ Передача работы не поддерживается в Windows")
+            return pid is None
+        if pid is None or pid == os.getpid() or not pid_alive(pid):
+            return True
+
+        print(f"🔁 Передача работы: остановка процесса {pid}")
+        os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + (timeout or self.shutdown_timeout + 5)
+        while pid_alive(pid):
+            if time.monotonic() >= deadline:
+                print(f"⚠️ Процесс {pid} не завершился вовремя")
+                return False
+            await asyncio.sleep(0.2)
+        print(f"✅ Процесс {pid} завершился, продолжаем работу")
+        return True
+
+
+def read_pid(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
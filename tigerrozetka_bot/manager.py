@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - состояние и функции работы с данными
+Не зависит от aiogram: используется обработчиками, фоновыми задачами и API
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .config import Config
+from .invites import PendingInviteIndex
+from .leaderboard import Leaderboard
+from .presence import PresenceTracker
+from .push import PushHub
+from .ratings import EloModel, RatingEngine, closest
+from .seasons import SeasonTracker
+from .storage import PairRecord, create_storage
+from .tournaments import TournamentEngine
+
+
+class InlineResultCache:
+    """LRU-кеш inline-приглашений по пользователю
+
+    Повторные inline-запросы одного пользователя получают уже созданную
+    дуэль, пока она не истечет, без обращения к базе данных.
+    """
+
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self._entries: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, user_id: int) -> Optional[str]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        valid_until, duel_id = entry
+        if valid_until <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return duel_id
+
+    def put(self, user_id: int, duel_id: str, ttl: float):
+        self._entries[user_id] = (time.monotonic() + ttl, duel_id)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, duel_id: Optional[str] = None):
+        entry = self._entries.get(user_id)
+        if entry and (duel_id is None or entry[1] == duel_id):
+            del self._entries[user_id]
+
+
+class HeadToHeadCache:
+    """LRU-кеш счета личных встреч горячих пар игроков
+
+    Пара хранится один раз (меньший id первым); записи живут ttl секунд,
+    чтобы в многопроцессном режиме результаты других процессов подхватывались.
+    """
+
+    def __init__(self, max_pairs: int = 50000, ttl: float = 600.0):
+        self.max_pairs = max_pairs
+        self.ttl = ttl
+        # (меньший id, больший id) -> (годен до, (победы меньшего, победы большего, ничьи))
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[float, PairRecord]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _orient(user_id: int, opponent_id: int, record: PairRecord) -> PairRecord:
+        """Перевод записи пары в счет с точки зрения user_id"""
+        if user_id < opponent_id:
+            return record
+        return record[1], record[0], record[2]
+
+    def get(self, user_id: int, opponent_id: int) -> Optional[PairRecord]:
+        pair = (min(user_id, opponent_id), max(user_id, opponent_id))
+        entry = self._entries.get(pair)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(pair)
+        return self._orient(user_id, opponent_id, entry[1])
+
+    def put(self, user_id: int, opponent_id: int, record: PairRecord):
+        pair = (min(user_id, opponent_id), max(user_id, opponent_id))
+        self._entries[pair] = (time.monotonic() + self.ttl, self._orient(user_id, opponent_id, record))
+        self._entries.move_to_end(pair)
+        while len(self._entries) > self.max_pairs:
+            self._entries.popitem(last=False)
+
+    def record(self, player1_id: int, player2_id: int, winner_id: Optional[int]):
+        """Инкремент закешированной пары после результата (некешированная прочитается из базы)"""
+        pair = (min(player1_id, player2_id), max(player1_id, player2_id))
+        entry = self._entries.get(pair)
+        if entry is None:
+            return
+        low_wins, high_wins, draws = entry[1]
+        if winner_id is None:
+            draws += 1
+        elif winner_id == pair[0]:
+            low_wins += 1
+        else:
+            high_wins += 1
+        self._entries[pair] = (entry[0], (low_wins, high_wins, draws))
+
+
+class TigerRozetkaBotManager:
+    """Хранилище, таблицы лидеров и кеши одного процесса бота"""
+
+    def __init__(self, config: Config):
+        self.config = config
+        # Хранилище пользователей, дуэлей и исходящих уведомлений (см. storage.py)
+        self.storage = create_storage(config.storage_backend, config.database_path, config.database_shards)
+        # Недельные сезоны (таблицы в базе Storage.connect_state: шард 0 или память)
+        self.season_tracker = SeasonTracker(self.storage.connect_state, retention=config.season_retention)
+        # Таблица лидеров в памяти (заполняется при запуске из bot_users)
+        self.leaderboard = Leaderboard()
+        self.inline_cache = InlineResultCache(config.inline_cache_max_users)
+        self.head_to_head_cache = HeadToHeadCache()
+        # Рейтинг Эло: пересчет после каждой дуэли, запись в bot_users пачками (см. ratings.py)
+        self.ratings = RatingEngine(self.storage.users, EloModel(), config.rating_batch_size)
+        # Кто сейчас в сети (события бота и запросы мини-приложения, см. presence.py)
+        self.presence = PresenceTracker(config.presence_window, config.presence_bucket)
+        # Заблокировавшие бота в этом процессе: уведомления им не отправляются, пока не вернутся
+        self.blocked: Set[int] = set()
+        # Ожидающие ответа вызовы (заполняется при запуске из active_duels)
+        self.invites = PendingInviteIndex(config.max_pending_outgoing, config.max_pending_incoming)
+        # Смены состояния дуэлей для мини-приложения (WebSocket, см. push.py и api.py)
+        self.push = PushHub()
+        # Турниры на выбывание (таблицы там же, где сезоны, см. tournaments.py)
+        self.tournaments = TournamentEngine(self, self.storage.connect_state,
+                                            result_grace=config.tournament_result_grace)
+        self.init_database()
+
+    def init_database(self):
+        """Инициализация базы данных"""
+        self.storage.init()
+
+        conn = self.storage.connect_state()
+        self.season_tracker.init_tables(conn.cursor())
+        self.tournaments.init_tables(conn.cursor())
+        conn.commit()
+        conn.close()
+        print(f"✅ База данных инициализирована ({self.storage.name})")
+
+    async def load_leaderboard(self):
+        """Построение таблицы лидеров из bot_users"""
+        self.leaderboard.load(await self.storage.users.ranking_rows())
+        print(f"🏆 Таблица лидеров загружена: {len(self.leaderboard)} игроков")
+
+    async def load_invites(self):
+        """Построение индекса ожидающих приглашений из active_duels"""
+        self.invites.load(await self.storage.duels.pending_invites(datetime.now()))
+
+    # Функции для работы с базой данных
+    async def register_user(self, user_id: int, username: Optional[str] = None,
+                            first_name: Optional[str] = None, last_name: Optional[str] = None):
+        """Регистрация/обновление пользователя"""
+        await self.storage.users.upsert(user_id, username, first_name, last_name, datetime.now())
+        self.blocked.discard(user_id)
+
+        # Новый игрок попадает в таблицу лидеров со значениями по умолчанию
+        if user_id not in self.leaderboard:
+            self.leaderboard.update(user_id, 1, 0)
+
+    async def get_active_players(self, exclude_user_id: Optional[int] = None,
+                                 limit: int = 20) -> List[Dict[str, Any]]:
+        """Получение активных игроков для дуэлей"""
+        week_ago = datetime.now() - timedelta(days=7)
+        return await self.storage.users.active_top(exclude_user_id, week_ago, limit=limit)
+
+    async def get_active_players_page(self, exclude_user_id: Optional[int] = None,
+                                      cursor_key: Optional[Tuple[int, int, int]] = None,
+                                      direction: str = 'next',
+                                      limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], bool, bool]:
+        """Страница активных игроков (keyset-пагинация по level, wins, user_id)
+
+        cursor_key - ключ (level, wins, user_id) границы текущей страницы:
+        для direction='next' - последний игрок страницы, для 'prev' - первый.
+        Возвращает (игроки, есть_предыдущая, есть_следующая).
+        """
+        limit = limit or self.config.players_page_size
+        week_ago = datetime.now() - timedelta(days=7)
+        backwards = direction == 'prev' and cursor_key is not None
+
+        # Берем на одну строку больше, чтобы узнать, есть ли еще страница
+        players = await self.storage.users.active_page(exclude_user_id, week_ago, cursor_key, backwards, limit + 1)
+
+        has_more = len(players) > limit
+        players = players[:limit]
+        if backwards:
+            players.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = cursor_key is not None, has_more
+
+        return players, has_prev, has_next
+
+    async def get_player(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Активный игрок по id (None - не зарегистрирован или неактивен)"""
+        return (await self.storage.users.get_players([user_id])).get(user_id)
+
+    async def get_online_players(self, exclude_user_id: Optional[int] = None, limit: Optional[int] = None,
+                                 rating: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Игроки в сети: ближайшие к rating по рейтингу или последние активные"""
+        limit = limit or self.config.players_page_size
+        user_ids = self.presence.online(exclude_user_id, limit=self.config.api_players_candidates)
+        if not user_ids:
+            return []
+        players = await self.storage.users.get_players(user_ids)
+        if rating is not None:
+            return closest(players.values(), rating, limit)
+        return [players[user_id] for user_id in user_ids if user_id in players][:limit]
+
+    async def quick_match(self, user_id: int) -> Tuple[Optional[Dict[str, Any]], Optional[str], str]:
+        """Вызов ближайшего по рейтингу игрока в сети
+
+        Возвращает (соперник, duel_id, результат): результат invite() для
+        выбранного соперника или 'nobody', если подходящих игроков в сети нет.
+        Игроки, которым уже отправлен вызов или у которых слишком много
+        непринятых вызовов, пропускаются.
+        """
+        rating = await self.get_rating(user_id)
+        for opponent in await self.get_online_players(user_id, rating=rating):
+            duel_id, result = await self.invite(user_id, opponent['id'])
+            if result in ('existing', 'target_limit'):
+                continue
+            return opponent, duel_id, result
+        return None, None, 'nobody'
+
+    async def flush_presence(self):
+        """Запись last_seen игроков, заходивших с прошлой записи"""
+        user_ids = self.presence.take_unsaved()
+        if user_ids:
+            await self.storage.users.touch(user_ids, datetime.now())
+            self.blocked.difference_update(user_ids)
+
+    async def deactivate_user(self, user_id: int):
+        """Игрок заблокировал бота: исключается из списков соперников и рейтинга до возвращения"""
+        self.blocked.add(user_id)
+        await self.storage.users.deactivate([user_id])
+        self.leaderboard.remove(user_id)
+        print(f"🚫 Пользователь {user_id} заблокировал бота - помечен неактивным")
+
+    async def sweep_inactive(self) -> int:
+        """Пометка неактивными игроков, не заходивших inactive_after_days дней
+
+        Пачками по inactivity_sweep_batch: каждая - короткая транзакция, между
+        пачками цикл событий обрабатывает обновления. Вернувшийся игрок снова
+        становится активным при записи last_seen (см. flush_presence).
+        """
+        before = datetime.now() - timedelta(days=self.config.inactive_after_days)
+        batch = self.config.inactivity_sweep_batch
+        total = 0
+        while True:
+            user_ids = await self.storage.users.deactivate_stale(before, batch)
+            for user_id in user_ids:
+                self.leaderboard.remove(user_id)
+            total += len(user_ids)
+            if len(user_ids) < batch:
+                break
+            await asyncio.sleep(0)
+        if total:
+            print(f"💤 Помечены неактивными (не заходили {self.config.inactive_after_days} дн.): {total}")
+        return total
+
+    async def load_presence(self):
+        """Игроки в сети по last_seen (после перезапуска и из других процессов)"""
+        now = datetime.now()
+        seen = await self.storage.users.seen_since(now - timedelta(seconds=self.config.presence_window))
+        self.presence.merge((user_id, (now - seen_at).total_seconds()) for user_id, seen_at in seen)
+
+    async def search_players(self, query: str, exclude_user_id: Optional[int] = None,
+                             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Поиск игроков по префиксу username или имени"""
+        return await self.storage.users.search(query, exclude_user_id, limit or self.config.players_page_size)
+
+    async def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Получение статистики пользователя"""
+        stats = await self.storage.users.get_stats(user_id)
+        state = self.ratings.unsaved(user_id)
+        if stats is not None and state is not None:
+            # Рейтинг после последних дуэлей еще не записан в базу
+            stats['rating'] = state[0]
+            stats['level'] = self.ratings.model.level(state[0])
+        return stats
+
+    async def get_rating(self, user_id: int) -> float:
+        """Текущий рейтинг игрока (начальный, если игрок не найден)"""
+        state = (await self.ratings.states([user_id])).get(user_id)
+        return state[0] if state else self.ratings.model.initial
+
+    async def record_game_result(self, user_id: int, won: Optional[bool]):
+        """Учет результата игры в статистике и таблице лидеров (won=None - ничья)"""
+        ranking = await self.storage.users.record_result(user_id, won)
+        if ranking is not None:
+            level = self.ratings.level(user_id)
+            self.leaderboard.update(user_id, ranking[0] if level is None else level, ranking[1])
+
+    async def flush_ratings(self):
+        """Запись накопленных изменений рейтинга в bot_users"""
+        flushed = await self.ratings.flush()
+        if flushed:
+            print(f"📈 Записаны рейтинги игроков: {flushed}")
+
+    async def get_users_brief(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Имена игроков по списку id (для вывода таблицы лидеров)"""
+        if not user_ids:
+            return {}
+        return await self.storage.users.get_brief(user_ids)
+
+    async def create_duel(self, from_user_id: int, to_user_id: Optional[int]) -> str:
+        """Создание новой дуэли (to_user_id=None - открытый вызов из inline-режима)"""
+        expires_at = datetime.now() + timedelta(minutes=self.config.duel_ttl_minutes)
+        duel_id = await self.storage.duels.create(from_user_id, to_user_id, expires_at)
+        if to_user_id is not None:
+            self.invites.add(duel_id, from_user_id, to_user_id, expires_at)
+        return duel_id
+
+    async def create_duels(self, pairs: List[Tuple[int, int]], expires_at: datetime,
+                           status: str = 'pending') -> List[str]:
+        """Создание дуэлей пачкой (раунд турнира); в индекс личных приглашений не попадают"""
+        return await self.storage.duels.create_many(pairs, expires_at, status)
+
+    async def invite(self, from_user_id: int, to_user_id: int) -> Tuple[Optional[str], str]:
+        """Вызов игрока на дуэль с учетом ожидающих приглашений
+
+        Возвращает (duel_id, результат), результат: 'created', 'existing'
+        (приглашение этому игроку уже ждет ответа), 'challenger_limit' или
+        'target_limit' (превышен лимит ожидающих вызовов, duel_id = None).
+        """
+        now = datetime.now()
+        existing = self.invites.find(from_user_id, to_user_id, now)
+        if existing is not None:
+            # Приглашение могли принять или отклонить в другом рабочем процессе
+            duel_info = await self.storage.duels.get(existing)
+            if duel_info and duel_info['status'] == 'pending':
+                return existing, 'existing'
+            self.invites.remove(existing)
+
+        limit = self.invites.check_limits(from_user_id, to_user_id, now)
+        if limit is not None:
+            return None, limit
+        return await self.create_duel(from_user_id, to_user_id), 'created'
+
+    def pending_invites(self, user_id: int) -> Dict[str, Dict[int, str]]:
+        """Ожидающие вызовы игрока: исходящие (цель -> duel_id) и входящие"""
+        now = datetime.now()
+        return {
+            'outgoing': self.invites.outgoing(user_id, now),
+            'incoming': self.invites.incoming(user_id, now),
+        }
+
+    async def claim_open_duel(self, duel_id: str, user_id: int) -> bool:
+        """Закрепление открытого вызова за принявшим игроком (атомарно)"""
+        return await self.storage.duels.claim(duel_id, user_id)
+
+    async def get_duel_info(self, duel_id: str) -> Optional[Dict[str, Any]]:
+        """Получение информации о дуэли"""
+        return await self.storage.duels.get(duel_id)
+
+    async def update_duel_status(self, duel_id: str, status: str):
+        """Обновление статуса дуэли"""
+        await self.storage.duels.set_status(duel_id, status)
+        if status != 'pending':
+            self.invites.remove(duel_id)
+
+    async def start_duel_game(self, duel_id: str, seconds: float):
+        """Начало игры: статус 'playing', срок хранения продлевается на время игры"""
+        expires_at = datetime.now() + timedelta(seconds=seconds)
+        await self.storage.duels.update_game(duel_id, 'playing', None, expires_at)
+
+    async def save_duel_result(self, duel_id: str, player1_id: int, player2_id: int,
+                               winner_id: Optional[int], scores: Tuple[int, int], game_data: bytes,
+                               done: Optional[Set[str]] = None):
+        """Итог дуэли: перенос в историю, рейтинг и статистика игроков (ничья - без побед)
+
+        Шаги не объединены в одну транзакцию (разные шарды и состояние в памяти),
+        поэтому выполненные шаги отмечаются в done: при повторе после сбоя
+        (DuelRelay) они пропускаются и ничего не учитывается дважды.
+        """
+        done = set() if done is None else done
+        finished_at = datetime.now()
+
+        async def step(name: str, action: Callable[[], Awaitable[Any]]):
+            if name not in done:
+                await action()
+                done.add(name)
+
+        async def record_head_to_head():
+            self.head_to_head_cache.record(player1_id, player2_id, winner_id)
+
+        async def record_season(user_id: int, won: Optional[bool]):
+            self.season_tracker.record(user_id, won)
+
+        await step('archive', lambda: self.storage.history.archive(
+            duel_id, player1_id, player2_id, winner_id, scores, game_data, finished_at))
+        await step('pair', lambda: self.storage.history.record_pair(player1_id, player2_id, winner_id, finished_at))
+        await step('head_to_head', record_head_to_head)
+        await step('rating', lambda: self.ratings.record(player1_id, player2_id, winner_id))
+        for user_id in (player1_id, player2_id):
+            won = None if winner_id is None else user_id == winner_id
+            await step(f'result:{user_id}', lambda: self.record_game_result(user_id, won))
+            await step(f'season:{user_id}', lambda: record_season(user_id, won))
+        await step('tournament', lambda: self.tournaments.on_result(duel_id, winner_id))
+
+    async def get_head_to_head(self, user_id: int, opponent_ids: List[int]) -> Dict[int, PairRecord]:
+        """Счет личных встреч (победы, поражения, ничьи) с соперниками; без встреч - нет ключа"""
+        cache = self.head_to_head_cache
+        records: Dict[int, PairRecord] = {}
+        missing = []
+        for opponent_id in opponent_ids:
+            record = cache.get(user_id, opponent_id)
+            if record is None:
+                missing.append(opponent_id)
+            elif any(record):
+                records[opponent_id] = record
+        if missing:
+            found = await self.storage.history.pair_stats(user_id, missing)
+            for opponent_id in missing:
+                # Пары без встреч тоже кешируются, иначе их искали бы в базе каждый раз
+                record = found.get(opponent_id, (0, 0, 0))
+                cache.put(user_id, opponent_id, record)
+                if any(record):
+                    records[opponent_id] = record
+        return records
+
+    async def get_duel_history(self, user_id: int, limit: int = 20,
+                               opponent_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Последние сыгранные дуэли игрока (или только с opponent_id)"""
+        if opponent_id is not None:
+            return await self.storage.history.head_to_head(user_id, opponent_id, limit)
+        return await self.storage.history.recent(user_id, limit)
+
+    async def delete_duel(self, duel_id: str) -> bool:
+        """Удаление дуэли"""
+        self.invites.remove(duel_id)
+        return await self.storage.duels.delete(duel_id)
+
+    async def cleanup_expired_duels(self):
+        """Очистка истекших дуэлей"""
+        now = datetime.now()
+        deleted = await self.storage.duels.delete_expired(now)
+        self.invites.prune(now)
+
+        if deleted > 0:
+            print(f"🧹 Удалено истекших дуэлей: {deleted}")
+
+    # Интеграция с backend
+    async def post_to_backend(self, path: str, data: Dict[str, Any]) -> bool:
+        """POST-запрос к backend; True при успешной доставке"""
+        try:
+            import aiohttp
+            async with aiohttp.ClientSession() as session:
+                async with session.post(f'{self.config.backend_api_url}{path}', json=data) as response:
+                    if response.status == 200:
+                        return True
+                    print(f"⚠️ Ошибка уведомления backend: {response.status}")
+        except ImportError:
+            return True
+        except Exception as e:
+            print(f"❌ Ошибка связи с backend: {e}")
+        return False
+
+    async def notify_backend_duel_start(self, duel_id: str, player1_id: int, player2_id: int):
+        """Уведомление backend о начале дуэли (при ошибке - в outbox для повтора)"""
+        data = {
+            'duelId': duel_id,
+            'player1Id': player1_id,
+            'player2Id': player2_id,
+            'status': 'started'
+        }
+
+        if await self.post_to_backend('/api/duels/start', data):
+            print(f"✅ Backend уведомлен о дуэли: {duel_id}")
+        else:
+            await self.storage.outbox.add('backend:/api/duels/start', data)
+
+    async def flush_outbox(self):
+        """Повторная доставка отложенных уведомлений backend"""
+        delivered = []
+        for message_id, kind, payload in await self.storage.outbox.pending():
+            _, _, path = kind.partition(':')
+            if await self.post_to_backend(path, payload):
+                delivered.append(message_id)
+            else:
+                await self.storage.outbox.mark_failed(message_id)
+                break  # Backend недоступен - остальные попробуем в следующий раз
+        await self.storage.outbox.mark_sent(delivered)
+        if delivered:
+            print(f"📤 Доставлено отложенных уведомлений: {len(delivered)}")
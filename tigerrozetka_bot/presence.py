@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - кто сейчас в сети
+Список соперников по last_seen за неделю показывает в основном тех, кто
+давно ушел, и вызовы к ним истекают без ответа. Присутствие учитывается в
+памяти: скользящее окно window секунд из корзин по bucket секунд, в каждой -
+множество пользователей, последнее событие которых попало в эту корзину.
+
+Учет события (outer-middleware) - один поиск в словаре, пока пользователь
+остается в текущей корзине; при переходе в новую корзину - перенос из
+одного множества в другое. Корзины, вышедшие из окна, удаляются целиком.
+
+last_seen в bot_users пишется пачкой раз в presence_flush_interval (одна
+транзакция на шард), а в многопроцессном режиме по нему же подтягиваются
+пользователи, которых обслуживают другие процессы.
+"""
+
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class PresenceTracker:
+    """Пользователи с событиями за последние window секунд (точность - bucket секунд)"""
+
+    def __init__(self, window: float = 300.0, bucket: float = 15.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.bucket = bucket
+        self.clock = clock
+        self.span = max(1, int(window // bucket))  # Корзин в окне
+        self._buckets: Dict[int, Set[int]] = {}  # номер корзины -> пользователи
+        self._last: Dict[int, int] = {}  # пользователь -> номер его корзины
+        self._current = 0
+        self._unsaved: Set[int] = set()  # last_seen еще не записан в базу
+        self.touches = 0
+
+    def __len__(self) -> int:
+        self._expire(self._index(self.clock()))
+        return len(self._last)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.is_online(user_id)
+
+    def _index(self, now: float) -> int:
+        return int(now // self.bucket)
+
+    def _expire(self, index: int):
+        """Удаление корзин, вышедших из окна (при переходе в новую корзину)"""
+        if index <= self._current:
+            return
+        self._current = index
+        horizon = index - self.span
+        for stale in [number for number in self._buckets if number <= horizon]:
+            for user_id in self._buckets.pop(stale):
+                del self._last[user_id]
+
+    def _place(self, user_id: int, index: int) -> bool:
+        previous = self._last.get(user_id)
+        if previous is not None and previous >= index:
+            return False
+        if previous is not None:
+            self._buckets[previous].discard(user_id)
+        self._last[user_id] = index
+        self._buckets.setdefault(index, set()).add(user_id)
+        return True
+
+    def touch(self, user_id: int):
+        """Событие пользователя"""
+        self.touches += 1
+        index = self._index(self.clock())
+        if self._last.get(user_id) == index:
+            return
+        self._expire(index)
+        if self._place(user_id, index):
+            self._unsaved.add(user_id)
+
+    def mark(self, user_id: int, seconds_ago: float):
+        """Событие, известное из базы (другой процесс); более позднее не затирается"""
+        index = self._index(self.clock() - seconds_ago)
+        self._expire(self._index(self.clock()))
+        if index > self._current - self.span:
+            self._place(user_id, index)
+
+    def is_online(self, user_id: int) -> bool:
+        index = self._last.get(user_id)
+        return index is not None and index > self._index(self.clock()) - self.span
+
+    def online(self, exclude_user_id: Optional[int] = None, limit: Optional[int] = None) -> List[int]:
+        """Пользователи в сети, сначала последние активные"""
+        self._expire(self._index(self.clock()))
+        users: List[int] = []
+        for index in sorted(self._buckets, reverse=True):
+            for user_id in self._buckets[index]:
+                if limit is not None and len(users) >= limit:
+                    return users
+                if user_id != exclude_user_id:
+                    users.append(user_id)
+        return users
+
+    def take_unsaved(self) -> List[int]:
+        """Пользователи, чей last_seen нужно записать (список очищается)"""
+        unsaved, self._unsaved = self._unsaved, set()
+        return list(unsaved)
+
+    def merge(self, seen: Iterable[Tuple[int, float]]):
+        """Пачка (user_id, секунд назад) из базы"""
+        for user_id, seconds_ago in seen:
+            self.mark(user_id, seconds_ago)
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        """Outer-middleware aiogram: учет автора события"""
+        user = getattr(event, 'from_user', None)
+        if user is not None:
+            self.touch(user.id)
+        return await handler(event, data)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'online': len(self),
+            'buckets': len(self._buckets),
+            'touches': self.touches,
+            'unsaved': len(self._unsaved),
+        }
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - профилирование цикла событий (включается BOT_PROFILE=1)
+Сторожевой поток следит за пульсом цикла событий: если цикл не отвечает
+дольше BOT_SLOW_CALLBACK_MS, печатается стек потока цикла с указанием
+обработчика и функции работы с данными, которые его заблокировали.
+
+Выборочный профиль за окно времени в формате folded stacks
+(flamegraph.pl, speedscope, inferno):
+    curl 'http://127.0.0.1:8081/debug/profile?seconds=30' > bot.folded
+    kill -USR1 <pid>   # 30 секунд в файл profile-<время>.folded
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import FrameType
+from typing import Dict, List, Optional, Tuple
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def frame_label(frame: FrameType, with_line: bool = True) -> str:
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    location = os.path.basename(code.co_filename)
+    return f"{name} ({location}:{frame.f_lineno})" if with_line else f"{name} ({location})"
+
+
+def stack_of(frame: Optional[FrameType]) -> List[FrameType]:
+    """Кадры стека от внешнего к внутреннему"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def attribute(frames: List[FrameType]) -> Tuple[Optional[str], Optional[str]]:
+    """(обработчик, функция пакета), в которых сейчас выполняется код"""
+    handler = None
+    innermost = None
+    for frame in frames:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if not filename.startswith(_PACKAGE_DIR) or filename == os.path.abspath(__file__):
+            continue
+        if handler is None and os.path.basename(filename) == 'handlers.py' and frame.f_code.co_name != 'create_router':
+            handler = frame_label(frame)
+        innermost = frame_label(frame)
+    return handler, innermost
+
+
+class LoopProfiler:
+    """Сторожевой поток медленных колбэков и выборочный профилировщик цикла событий"""
+
+    def __init__(self, slow_ms: float = 100.0, heartbeat_ms: float = 20.0):
+        self.slow = slow_ms / 1000
+        self.heartbeat = heartbeat_ms / 1000
+        self.slow_blocks = 0
+        self.max_block_ms = 0.0
+        self._beat = time.monotonic()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Запуск из потока цикла событий"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._loop.call_soon(self._pulse)
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        if hasattr(signal, 'SIGUSR1'):
+            self._loop.add_signal_handler(signal.SIGUSR1, self._dump_on_signal)
+        print(f"🔬 Профилирование цикла событий включено (порог {self.slow * 1000:.0f} мс)")
+
+    async def stop(self):
+        self._stopped.set()
+
+    def _pulse(self):
+        self._beat = time.monotonic()
+        if not self._stopped.is_set() and self._loop is not None:
+            self._loop.call_later(self.heartbeat, self._pulse)
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stopped.wait(self.slow / 4):
+            beat = self._beat
+            blocked = time.monotonic() - beat - self.heartbeat
+            if reported_beat is not None and beat != reported_beat:
+                reported_beat = None
+            if blocked < self.slow or reported_beat is not None:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            self._report(blocked, stack_of(frame))
+            threading.Thread(target=self._measure_block, args=(beat,), daemon=True).start()
+
+    def _report(self, blocked: float, frames: List[FrameType]):
+        self.slow_blocks += 1
+        handler, function = attribute(frames)
+        print(f"🐢 Цикл событий заблокирован {blocked * 1000:.0f}+ мс"
+              f" | обработчик: {handler or '—'} | функция: {function or '—'}")
+        print("".join(traceback.format_list(traceback.StackSummary.extract(
+            (frame, frame.f_lineno) for frame in frames[-12:]
+        ))).rstrip())
+
+    def _measure_block(self, beat: float):
+        """Полная длительность блокировки - после возобновления пульса"""
+        while self._beat == beat and not self._stopped.is_set():
+            time.sleep(self.heartbeat)
+        block_ms = (self._beat - beat - self.heartbeat) * 1000
+        self.max_block_ms = max(self.max_block_ms, block_ms)
+        print(f"🐢 Блокировка завершилась: {block_ms:.0f} мс")
+
+    # Выборочный профиль
+    def sample(self, seconds: float, hz: float = 100.0) -> str:
+        """Стеки потока цикла событий за окно времени в формате folded stacks"""
+        counts: Dict[str, int] = Counter()
+        interval = 1 / hz
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline and not self._stopped.is_set():
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is not None:
+                counts[";".join(frame_label(f, with_line=False) for f in stack_of(frame))] += 1
+            time.sleep(interval)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+    async def profile(self, seconds: float) -> str:
+        return await asyncio.get_running_loop().run_in_executor(None, self.sample, seconds)
+
+    async def http_profile(self, query: Dict[str, str]) -> Tuple[str, str, bytes]:
+        """GET /debug/profile?seconds=N"""
+        try:
+            seconds = float(query.get('seconds', '30'))
+        except ValueError:
+            return '400 Bad Request', 'text/plain', b'seconds must be a number'
+        if not 0 < seconds < float('inf'):  # Отсекает и nan
+            return '400 Bad Request', 'text/plain', b'seconds must be positive'
+        folded = await self.profile(min(seconds, 300.0))
+        return '200 OK', 'text/plain; charset=utf-8', folded.encode()
+
+    def _dump_on_signal(self):
+        path = f"profile-{time.strftime('%Y%m%d-%H%M%S')}.folded"
+        print(f"🔬 Запись профиля (30 с) в {path}")
+
+        def dump():
+            with open(path, 'w') as f:
+                f.write(self.sample(30))
+            print(f"🔬 Профиль записан: {path}")
+
+        threading.Thread(target=dump, name='loop-profile-dump', daemon=True).start()
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - push-уведомления мини-приложения о состоянии дуэлей
+Хаб рассылки не зависит от aiohttp: событие сериализуется один раз и
+кладется в ограниченные очереди подписчиков игрока, отправкой в сокет
+занимается задача соединения (WebSocket /api/duels/ws, см. api.py).
+Подписчик, не успевающий читать события, отключается - клиент
+переподключается и запрашивает актуальное состояние.
+
+В многопроцессном режиме события рабочих процессов пересылаются первому,
+который обслуживает HTTP API (см. BotApp.run_worker).
+
+Нагрузочный тест:
+    python -m tigerrozetka_bot push-bench --clients 2000 --events 2000
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def encode_json(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+class Subscriber:
+    """Соединение одного клиента: очередь сериализованных событий"""
+
+    __slots__ = ('user_id', 'queue', 'ready', 'overflowed')
+
+    def __init__(self, user_id: int, max_queue: int):
+        self.user_id = user_id
+        self.queue: Deque[str] = deque(maxlen=max_queue)
+        self.ready = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, message: str) -> bool:
+        if len(self.queue) == self.queue.maxlen:
+            self.overflowed = True
+            self.ready.set()
+            return False
+        self.queue.append(message)
+        self.ready.set()
+        return True
+
+    async def next_batch(self) -> List[str]:
+        """Накопившиеся события (ждет хотя бы одно); пустой список - подписчик отстал"""
+        await self.ready.wait()
+        self.ready.clear()
+        if self.overflowed:
+            return []
+        batch = list(self.queue)
+        self.queue.clear()
+        return batch
+
+
+class PushHub:
+    """Подписчики по user_id и рассылка событий игрокам"""
+
+    def __init__(self, max_queue: int = 64, encode: Callable[[Any], str] = encode_json):
+        self.max_queue = max_queue
+        self.encode = encode
+        self.subscribers: Dict[int, Set[Subscriber]] = {}
+        # Пересылка событий в процесс с подписчиками (многопроцессный режим)
+        self.forward: Optional[Callable[[Tuple[List[int], Dict[str, Any]]], None]] = None
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return sum(len(subscribers) for subscribers in self.subscribers.values())
+
+    def subscribe(self, user_id: int) -> Subscriber:
+        subscriber = Subscriber(user_id, self.max_queue)
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.user_id]
+
+    def publish(self, user_ids: Iterable[int], event: Dict[str, Any]) -> int:
+        """Рассылка события подключенным клиентам игроков; возвращает число получателей"""
+        user_ids = [user_id for user_id in user_ids if user_id is not None]
+        self.published += 1
+        if self.forward is not None:
+            self.forward((user_ids, event))
+            return 0
+
+        message: Optional[str] = None
+        delivered = 0
+        for user_id in user_ids:
+            for subscriber in self.subscribers.get(user_id, ()):
+                if message is None:
+                    message = self.encode(event)
+                if subscriber.push(message):
+                    delivered += 1
+                else:
+                    self.dropped += 1
+        self.delivered += delivered
+        return delivered
+
+    def publish_duel(self, duel_id: str, status: str, player1_id: int, player2_id: Optional[int],
+                     **extra: Any) -> int:
+        """Смена состояния дуэли: обоим игрокам"""
+        event = {
+            'type': 'duel',
+            'duelId': duel_id,
+            'status': status,
+            'player1Id': player1_id,
+            'player2Id': player2_id,
+            'ts': int(time.time() * 1000),
+            **extra,
+        }
+        return self.publish((player1_id, player2_id), event)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'users': len(self.subscribers),
+            'connections': len(self),
+            'published': self.published,
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+        }
+
+
+# --- Нагрузочный тест ---
+
+async def _bench(clients: int, events: int, rate: float):
+    """Реальный HTTP API на локальном порту и clients WebSocket-клиентов"""
+    import aiohttp
+
+    from .api import FrontendAPI, sign_init_data
+    from .app import create_app
+    from .config import Config
+
+    token = '0:bench'
+    app = create_app(Config(bot_token=token, storage_backend='memory', database_path=':memory:',
+                            api_port=0, health_port=0))
+    api = FrontendAPI(app)
+    await api.serve('127.0.0.1', 0)
+    url = f"http://127.0.0.1:{api.port}/api/duels/ws"
+    hub = app.manager.push
+
+    latencies: List[float] = []
+    received = 0
+
+    async def client(session: aiohttp.ClientSession, user_id: int, connected: asyncio.Event):
+        nonlocal received
+        async with session.ws_connect(url, params={'initData': sign_init_data(token, user_id)}) as ws:
+            connected.set()
+            async for message in ws:
+                if message.type != aiohttp.WSMsgType.TEXT:
+                    break
+                event = json.loads(message.data)
+                if event.get('type') == 'duel':
+                    latencies.append(time.perf_counter() - event['sent'])
+                    received += 1
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        started = time.perf_counter()
+        ready = [asyncio.Event() for _ in range(clients)]
+        tasks = [asyncio.create_task(client(session, 1000 + i, ready[i])) for i in range(clients)]
+        await asyncio.gather(*(event.wait() for event in ready))
+        print(f"🔌 Подключено клиентов: {len(hub)} за {time.perf_counter() - started:.2f} с")
+
+        started = time.perf_counter()
+        expected = 0
+        for i in range(events):
+            player1, player2 = random.sample(range(1000, 1000 + clients), 2)
+            expected += hub.publish_duel(f"bench-{i}", 'accepted', player1, player2,
+                                         sent=time.perf_counter())
+            if rate and i % 100 == 99:
+                await asyncio.sleep(100 / rate)
+            elif i % 100 == 99:
+                await asyncio.sleep(0)
+        deadline = time.monotonic() + 30
+        while received < expected and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - started
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await api.stop()
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    print(f"📨 Событий: {events}, доставок: {received}/{expected}, отброшено: {hub.dropped}")
+    print(f"⚡ {received / elapsed:.0f} доставок/с, задержка p50 {percentile(0.5):.1f} мс,"
+          f" p99 {percentile(0.99):.1f} мс, max {percentile(1.0):.1f} мс")
+
+
+def bench(clients: int, events: int, rate: float = 0.0):
+    _raise_fd_limit(clients)
+    asyncio.run(_bench(clients, events, rate))
+
+
+def _raise_fd_limit(connections: int):
+    """Клиент и сервер в одном процессе: по два дескриптора на соединение"""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    needed = 2 * connections + 256
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+
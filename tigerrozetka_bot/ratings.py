@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - рейтинг игроков (Эло) и уровень, который из него следует
+После каждой дуэли рейтинги обоих игроков пересчитываются сразу (в памяти),
+а в bot_users пишутся пачками: одна транзакция на шард раз в несколько
+секунд (RatingEngine.flush) вместо двух UPDATE на каждый итог.
+
+Новички меняют рейтинг быстрее (повышенный K для первых provisional_games
+игр) - упрощенный аналог неопределенности рейтинга в Glicko без хранения
+отдельного отклонения. При смене модели рейтинги пересчитываются по всей
+истории дуэлей:
+    python -m tigerrozetka_bot recompute-ratings [--k 24 ...]
+
+Пересчет векторизован (numpy, если установлен): игры раскладываются на
+волны, в которых каждый игрок встречается не больше одного раза, и волна
+считается одной операцией над массивами. Результат совпадает с
+последовательным пересчетом игра за игрой.
+"""
+
+import heapq
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .storage import UserRepository
+
+# Итог дуэли для пересчета: (player1_id, player2_id, winner_id или None при ничьей)
+Result = Tuple[int, int, Optional[int]]
+# Рейтинг игрока и число его рейтинговых игр (от него зависит K)
+RatingState = Tuple[float, int]
+
+
+@dataclass(frozen=True)
+class EloModel:
+    initial: float = 1500.0
+    k: float = 20.0
+    k_provisional: float = 40.0  # K для первых provisional_games игр
+    provisional_games: int = 30
+    scale: float = 400.0
+    level_step: float = 50.0  # Очков рейтинга на уровень выше начального
+
+    def k_factor(self, games: int) -> float:
+        return self.k_provisional if games < self.provisional_games else self.k
+
+    def expected(self, rating: float, opponent_rating: float) -> float:
+        """Ожидаемый результат игрока (1 - победа, 0.5 - ничья)"""
+        return 1 / (1 + 10 ** ((opponent_rating - rating) / self.scale))
+
+    def update(self, first: RatingState, second: RatingState,
+               score: float) -> Tuple[RatingState, RatingState]:
+        """Новые состояния игроков после игры; score - результат первого"""
+        (rating1, games1), (rating2, games2) = first, second
+        delta = score - self.expected(rating1, rating2)
+        return ((rating1 + self.k_factor(games1) * delta, games1 + 1),
+                (rating2 - self.k_factor(games2) * delta, games2 + 1))
+
+    def level(self, rating: float) -> int:
+        """Уровень (от 1): растет на единицу каждые level_step очков выше начального рейтинга"""
+        return 1 + max(0, int((rating - self.initial) // self.level_step))
+
+
+def _score(player1_id: int, winner_id: Optional[int]) -> float:
+    if winner_id is None:
+        return 0.5
+    return 1.0 if winner_id == player1_id else 0.0
+
+
+class RatingEngine:
+    """Пересчет рейтинга по итогам дуэлей с отложенной пакетной записью
+
+    Состояние не сброшенных в базу игроков хранится в pending; остальные
+    читаются из bot_users при каждом итоге, так что кеш не расходится с
+    базой, если рейтинги меняет другой процесс или пересчет.
+    """
+
+    def __init__(self, users: "UserRepository", model: EloModel = EloModel(), batch_size: int = 200):
+        self.users = users
+        self.model = model
+        self.batch_size = batch_size
+        self.pending: Dict[int, RatingState] = {}
+        # Состояния, которые сейчас пишутся в базу: до конца записи в bot_users их еще нет
+        self._flushing: Dict[int, RatingState] = {}
+        self.recorded = 0
+        self.flushed = 0
+
+    def unsaved(self, user_id: int) -> Optional[RatingState]:
+        """Состояние игрока, еще не записанное в bot_users (None - в базе актуальное)"""
+        return self.pending.get(user_id) or self._flushing.get(user_id)
+
+    def level(self, user_id: int) -> Optional[int]:
+        """Уровень игрока с еще не записанным рейтингом (None - в базе актуальный)"""
+        state = self.unsaved(user_id)
+        return None if state is None else self.model.level(state[0])
+
+    async def states(self, user_ids: Sequence[int]) -> Dict[int, RatingState]:
+        """Текущие (rating, games) игроков с учетом не записанных изменений"""
+        unsaved = {user_id: state for user_id in user_ids
+                   if (state := self.unsaved(user_id)) is not None}
+        missing = [user_id for user_id in user_ids if user_id not in unsaved]
+        states = await self.users.get_ratings(missing) if missing else {}
+        states.update(unsaved)
+        return states
+
+    async def record(self, player1_id: int, player2_id: int,
+                     winner_id: Optional[int]) -> Tuple[RatingState, RatingState]:
+        """Итог дуэли; возвращает новые состояния игроков"""
+        states = await self.states([player1_id, player2_id])
+        initial = (self.model.initial, 0)
+        first, second = self.model.update(states.get(player1_id, initial), states.get(player2_id, initial),
+                                          _score(player1_id, winner_id))
+        self.pending[player1_id], self.pending[player2_id] = first, second
+        self.recorded += 1
+        if len(self.pending) >= self.batch_size:
+            await self.flush()
+        return first, second
+
+    async def flush(self) -> int:
+        """Запись накопленных рейтингов (транзакция на шард); возвращает число игроков"""
+        if not self.pending:
+            return 0
+        pending, self.pending = self.pending, {}
+        self._flushing = {**self._flushing, **pending}
+        try:
+            await self.users.apply_ratings([
+                (user_id, rating, self.model.level(rating)) for user_id, (rating, _) in pending.items()
+            ])
+        except Exception:
+            # Запись не удалась: изменения возвращаются в буфер, более новые
+            # (пришедшие во время записи) не затираются
+            for user_id, state in pending.items():
+                self.pending.setdefault(user_id, state)
+            raise
+        finally:
+            for user_id, state in pending.items():
+                if self._flushing.get(user_id) is state:
+                    del self._flushing[user_id]
+        self.flushed += len(pending)
+        return len(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'recorded': self.recorded, 'flushed': self.flushed, 'pending': len(self.pending)}
+
+
+# --- Подбор соперников ---
+
+def closest(players: Iterable[Dict[str, Any]], rating: float, limit: int) -> List[Dict[str, Any]]:
+    """limit игроков с рейтингом, ближайшим к rating (при равенстве - больше побед)"""
+    return heapq.nsmallest(limit, players, key=lambda player: (abs(player['rating'] - rating), -player['wins']))
+
+
+# --- Пересчет по всей истории ---
+
+@dataclass
+class _History:
+    """Игры в плоских списках: индексы игроков, результат первого, номер игры
+    каждого игрока (для K) и волна - следующая после последней волны любого
+    из двух игроков, так что в одной волне игрок встречается не больше раза"""
+    ids: Dict[int, int]
+    first: List[int]
+    second: List[int]
+    scores: List[float]
+    first_games: List[int]
+    second_games: List[int]
+    waves: List[int]
+    games: List[int]  # Всего игр каждого игрока
+
+
+def _prepare(results: Iterable[Result]) -> _History:
+    history = _History({}, [], [], [], [], [], [], [])
+    ids, games, last = history.ids, history.games, []
+    for player1_id, player2_id, winner_id in results:
+        first = ids.get(player1_id)
+        if first is None:
+            first = ids[player1_id] = len(games)
+            games.append(0)
+            last.append(-1)
+        second = ids.get(player2_id)
+        if second is None:
+            second = ids[player2_id] = len(games)
+            games.append(0)
+            last.append(-1)
+        wave = max(last[first], last[second]) + 1
+        last[first] = last[second] = wave
+        history.first.append(first)
+        history.second.append(second)
+        history.scores.append(0.5 if winner_id is None else float(winner_id == player1_id))
+        history.first_games.append(games[first])
+        history.second_games.append(games[second])
+        history.waves.append(wave)
+        games[first] += 1
+        games[second] += 1
+    return history
+
+
+def _replay_loop(history: _History, model: EloModel) -> List[float]:
+    ratings = [model.initial] * len(history.ids)
+    for first, second, score, first_games, second_games in zip(
+            history.first, history.second, history.scores, history.first_games, history.second_games):
+        (ratings[first], _), (ratings[second], _) = model.update(
+            (ratings[first], first_games), (ratings[second], second_games), score)
+    return ratings
+
+
+def _numpy() -> Any:
+    """numpy импортируется только для пересчета (он заметно замедлил бы запуск бота)"""
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover - без numpy пересчет идет обычным циклом
+        return None
+    return numpy
+
+
+def _replay_vectorized(history: _History, model: EloModel) -> List[float]:
+    numpy = _numpy()
+    waves = numpy.array(history.waves)
+    order = numpy.argsort(waves, kind='stable')
+
+    def sorted_by_wave(values: List[Any], dtype: Any) -> Any:
+        return numpy.array(values, dtype=dtype)[order]
+
+    first, second = sorted_by_wave(history.first, numpy.int64), sorted_by_wave(history.second, numpy.int64)
+    scores = sorted_by_wave(history.scores, numpy.float64)
+    # K зависит только от номера игры игрока - он известен заранее для всех игр
+    k_first = numpy.where(sorted_by_wave(history.first_games, numpy.int64) < model.provisional_games,
+                          model.k_provisional, model.k)
+    k_second = numpy.where(sorted_by_wave(history.second_games, numpy.int64) < model.provisional_games,
+                           model.k_provisional, model.k)
+    bounds = numpy.flatnonzero(numpy.diff(waves[order])) + 1
+
+    ratings = numpy.full(len(history.ids), model.initial)
+    # Игры волны - непрерывный срез; игроки в ней не повторяются, поэтому
+    # присваивание по индексам не теряет обновлений
+    for start, stop in zip([0, *bounds.tolist()], [*bounds.tolist(), len(order)]):
+        wave_first, wave_second = first[start:stop], second[start:stop]
+        rating_first, rating_second = ratings[wave_first], ratings[wave_second]
+        delta = scores[start:stop] - 1 / (1 + 10 ** ((rating_second - rating_first) / model.scale))
+        ratings[wave_first] = rating_first + k_first[start:stop] * delta
+        ratings[wave_second] = rating_second - k_second[start:stop] * delta
+    return ratings.tolist()
+
+
+def replay(results: Iterable[Result], model: EloModel = EloModel(),
+           vectorized: Optional[bool] = None) -> Dict[int, RatingState]:
+    """Рейтинги после всех игр (в порядке завершения) с начальных значений"""
+    history = _prepare(results)
+    if not history.scores:
+        return {}
+    if vectorized is None:
+        vectorized = _numpy() is not None
+    ratings = (_replay_vectorized if vectorized else _replay_loop)(history, model)
+    return {user_id: (ratings[index], history.games[index]) for user_id, index in history.ids.items()}
+
+
+async def recompute(users: "UserRepository", results: Iterable[Result],
+                    model: EloModel = EloModel(), batch_size: int = 5000) -> int:
+    """Пересчет рейтинга и уровня всех игроков по истории; возвращает число игроков с играми"""
+    states = replay(results, model)
+    await users.reset_ratings(model.initial, model.level(model.initial))
+    updates = [(user_id, rating, model.level(rating)) for user_id, (rating, _) in states.items()]
+    for start in range(0, len(updates), batch_size):
+        await users.apply_ratings(updates[start:start + batch_size])
+    return len(states)
+
+
+def sample_results(players: int = 10000, games: int = 200000, seed: int = 1) -> List[Result]:
+    """Случайная история: сильнее тот, у кого больше скрытая сила"""
+    import random
+
+    generator = random.Random(seed)
+    strength = [generator.gauss(0, 1) for _ in range(players)]
+    results: List[Result] = []
+    for _ in range(games):
+        first, second = generator.sample(range(players), 2)
+        chance = 1 / (1 + 10 ** (strength[second] - strength[first]))
+        roll = generator.random()
+        winner = None if abs(roll - chance) < 0.02 else (first if roll < chance else second)
+        results.append((first, second, winner))
+    return results
+
+
+def benchmark(players: int = 10000, games: int = 200000):
+    """Скорость пересчета: векторизованный против последовательного"""
+    results = sample_results(players, games)
+    print(f"📊 Пересчет рейтинга: {players} игроков, {games} игр")
+    model = EloModel()
+    started = time.perf_counter()
+    history = _prepare(results)
+    print(f"📋 Подготовка: {time.perf_counter() - started:.2f} с (волн: {max(history.waves) + 1})")
+    started = time.perf_counter()
+    expected = _replay_loop(history, model)
+    print(f"🐢 Цикл:       {time.perf_counter() - started:.2f} с")
+    if _numpy() is None:
+        print("⚠️ numpy не установлен - векторизованный пересчет недоступен")
+        return
+    started = time.perf_counter()
+    actual = _replay_vectorized(history, model)
+    elapsed = time.perf_counter() - started
+    drift = max(abs(value - reference) for value, reference in zip(actual, expected))
+    print(f"⚡ numpy:      {elapsed:.2f} с (расхождение {drift:.2e})")
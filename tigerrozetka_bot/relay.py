@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - ретрансляция счета дуэли
+Клиенты обоих игроков отправляют по WebSocket (/api/duels/ws) свой текущий
+счет, а время игры задает сервер: он объявляет начало после отсчета,
+принимает очки только внутри окна игры (+ небольшой допуск на сеть) и сам
+подводит итог. Счет соперника рассылается с фиксированной частотой: все
+изменения между тактами сливаются в одно сообщение.
+
+Сообщения клиента:
+    {"type": "join", "duelId": "..."}
+    {"type": "score", "duelId": "...", "score": 1234}
+Сообщения сервера (через PushHub): duel_start, score, duel_finished,
+duel_abandoned, error.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from . import gamedata
+from .push import PushHub
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .manager import TigerRozetkaBotManager
+
+
+@dataclass
+class DuelMatch:
+    duel_id: str
+    player1_id: int
+    player2_id: int
+    created_at: float = field(default_factory=time.monotonic)
+    joined: Set[int] = field(default_factory=set)
+    starts_at: Optional[float] = None  # time.monotonic() окончания отсчета
+    ends_at: Optional[float] = None
+    started_wall_ms: int = 0
+    scores: Dict[int, int] = field(default_factory=dict)
+    last_tick_at: Dict[int, float] = field(default_factory=dict)
+    # Принятые изменения счета игрока: (мс от начала, счет)
+    ticks: Dict[int, List[Tuple[int, int]]] = field(default_factory=dict)
+    dirty: bool = False  # Счет изменился после последней рассылки
+    rejected: int = 0
+    # Выполненные шаги сохранения итога (см. save_duel_result): повтор после сбоя их пропускает
+    saved_steps: Set[str] = field(default_factory=set)
+
+    @property
+    def players(self) -> Tuple[int, int]:
+        return self.player1_id, self.player2_id
+
+    def result(self) -> Optional[int]:
+        """id победителя или None при ничьей"""
+        score1, score2 = self.scores.get(self.player1_id, 0), self.scores.get(self.player2_id, 0)
+        if score1 == score2:
+            return None
+        return self.player1_id if score1 > score2 else self.player2_id
+
+
+class DuelRelay:
+    """Дуэли, идущие в этом процессе: подключение игроков, прием очков, итог"""
+
+    def __init__(self, manager: "TigerRozetkaBotManager", hub: PushHub, duration: float = 60.0,
+                 countdown: float = 3.0, grace: float = 1.0, join_timeout: float = 60.0,
+                 max_points_per_second: float = 500.0):
+        self.manager = manager
+        self.hub = hub
+        self.duration = duration
+        self.countdown = countdown
+        self.grace = grace
+        self.join_timeout = join_timeout
+        self.max_points_per_second = max_points_per_second
+        self.matches: Dict[str, DuelMatch] = {}
+        self.finished = 0
+
+    def _error(self, user_id: int, duel_id: Any, error: str) -> Dict[str, Any]:
+        event = {'type': 'error', 'duelId': duel_id, 'error': error}
+        self.hub.publish((user_id,), event)
+        return event
+
+    async def handle(self, user_id: int, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Сообщение клиента; возвращает отправленную ему ошибку или None"""
+        kind = message.get('type')
+        duel_id = message.get('duelId')
+        if not isinstance(duel_id, str):
+            return self._error(user_id, duel_id, 'duelId required')
+        if kind == 'join':
+            return await self.join(user_id, duel_id)
+        if kind == 'score':
+            score = message.get('score')
+            if not isinstance(score, int) or isinstance(score, bool) or score < 0:
+                return self._error(user_id, duel_id, 'invalid score')
+            return self.score(user_id, duel_id, score)
+        return self._error(user_id, duel_id, 'unknown message type')
+
+    async def join(self, user_id: int, duel_id: str) -> Optional[Dict[str, Any]]:
+        match = self.matches.get(duel_id)
+        if match is None:
+            duel_info = await self.manager.get_duel_info(duel_id)
+            if not duel_info or duel_info['status'] != 'accepted' or duel_info['player2_id'] is None:
+                return self._error(user_id, duel_id, 'duel is not available')
+            # Повторная проверка: пока шел запрос к базе, дуэль мог создать второй игрок
+            match = self.matches.setdefault(
+                duel_id, DuelMatch(duel_id, duel_info['player1_id'], duel_info['player2_id'])
+            )
+        if user_id not in match.players:
+            return self._error(user_id, duel_id, 'not a participant')
+
+        match.joined.add(user_id)
+        if match.starts_at is None and len(match.joined) == 2:
+            await self.start(match)
+        elif match.starts_at is not None:
+            # Переподключение: время начала и текущий счет
+            self.hub.publish((user_id,), self._start_event(match))
+            match.dirty = True
+        return None
+
+    def _start_event(self, match: DuelMatch) -> Dict[str, Any]:
+        return {
+            'type': 'duel_start',
+            'duelId': match.duel_id,
+            'startsAt': match.started_wall_ms,
+            'durationMs': int(self.duration * 1000),
+            'serverTime': int(time.time() * 1000),
+        }
+
+    async def start(self, match: DuelMatch):
+        now = time.monotonic()
+        match.starts_at = now + self.countdown
+        match.ends_at = match.starts_at + self.duration
+        match.started_wall_ms = int((time.time() + self.countdown) * 1000)
+        for player in match.players:
+            match.scores[player] = 0
+            match.last_tick_at[player] = match.starts_at
+            match.ticks[player] = []
+        await self.manager.start_duel_game(match.duel_id, self.countdown + self.duration + self.grace)
+        self.hub.publish(match.players, self._start_event(match))
+
+    def score(self, user_id: int, duel_id: str, score: int) -> Optional[Dict[str, Any]]:
+        """Прием текущего счета игрока (счет не убывает и растет не быстрее лимита)"""
+        match = self.matches.get(duel_id)
+        if match is None or user_id not in match.players or match.starts_at is None:
+            return self._error(user_id, duel_id, 'duel is not running')
+        now = time.monotonic()
+        if now < match.starts_at or now > match.ends_at + self.grace:
+            match.rejected += 1
+            return None
+
+        previous = match.scores[user_id]
+        if score <= previous:
+            return None
+        # Очки, пришедшие в допуск после конца игры, относятся к ее последней миллисекунде
+        elapsed = min(now, match.ends_at) - match.starts_at
+        allowed = previous + self.max_points_per_second * max(now - match.last_tick_at[user_id], 0.1)
+        if score > allowed:
+            match.rejected += 1
+            score = int(allowed)
+        match.scores[user_id] = score
+        match.last_tick_at[user_id] = now
+        match.ticks[user_id].append((int(elapsed * 1000), score))
+        match.dirty = True
+        return None
+
+    async def tick(self):
+        """Такт ретрансляции: рассылка изменившегося счета и завершение дуэлей"""
+        now = time.monotonic()
+        for match in list(self.matches.values()):
+            if match.starts_at is None:
+                if now - match.created_at > self.join_timeout:
+                    del self.matches[match.duel_id]
+                    self.hub.publish(match.players, {
+                        'type': 'duel_abandoned', 'duelId': match.duel_id, 'reason': 'opponent did not join'
+                    })
+                continue
+
+            if match.dirty:
+                match.dirty = False
+                self.hub.publish(match.players, {
+                    'type': 'score',
+                    'duelId': match.duel_id,
+                    'player1Score': match.scores[match.player1_id],
+                    'player2Score': match.scores[match.player2_id],
+                    'remainingMs': max(0, int((match.ends_at - max(now, match.starts_at)) * 1000)),
+                })
+            if now > match.ends_at + self.grace:
+                try:
+                    await self.finish(match)
+                except Exception as e:
+                    # Дуэль остается в ретрансляции: сохранение повторится на следующем такте
+                    print(f"❌ Не удалось сохранить итог дуэли {match.duel_id}: {e}")
+
+    async def finish(self, match: DuelMatch):
+        """Сохранение итога; дуэль убирается из ретрансляции только после успешной записи"""
+        winner_id = match.result()
+        scores = (match.scores[match.player1_id], match.scores[match.player2_id])
+        await self.manager.save_duel_result(match.duel_id, match.player1_id, match.player2_id,
+                                            winner_id, scores, self.game_data(match), match.saved_steps)
+        self.matches.pop(match.duel_id, None)
+        self.finished += 1
+        self.hub.publish(match.players, {
+            'type': 'duel_finished',
+            'duelId': match.duel_id,
+            'player1Score': match.scores[match.player1_id],
+            'player2Score': match.scores[match.player2_id],
+            'winnerId': winner_id,
+        })
+
+    def game_data(self, match: DuelMatch) -> bytes:
+        """Итог и история счета для active_duels.game_data (формат - gamedata.py)"""
+        return gamedata.encode(gamedata.DuelGameData(
+            player_ids=match.players,
+            started_at_ms=match.started_wall_ms,
+            duration_ms=int(self.duration * 1000),
+            scores=(match.scores[match.player1_id], match.scores[match.player2_id]),
+            winner_id=match.result(),
+            ticks=(match.ticks[match.player1_id], match.ticks[match.player2_id]),
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': sum(1 for match in self.matches.values() if match.starts_at is not None),
+            'waiting': sum(1 for match in self.matches.values() if match.starts_at is None),
+            'finished': self.finished,
+        }
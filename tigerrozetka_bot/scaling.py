@@ -0,0 +1,384 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka - многопроцессный режим бота
+Фронт-процесс получает обновления Telegram и распределяет их по N рабочим
+процессам по хешу user_id; каждый рабочий процесс - обычный aiogram Dispatcher.
+
+Запуск:
+    python -m tigerrozetka_bot.scaling run --workers 4
+    python -m tigerrozetka_bot.scaling bench --max-workers 4 --updates 5000
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import Config
+from .lifecycle import Lifecycle
+from .sharding import user_hash
+
+# Разделы обновления, в которых Telegram передает автора события
+_USER_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query',
+    'chosen_inline_result', 'shipping_query', 'pre_checkout_query',
+    'poll_answer', 'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+
+def extract_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Поиск id пользователя в сыром обновлении Telegram"""
+    for field in _USER_FIELDS:
+        event = update.get(field)
+        if not event:
+            continue
+        user = event.get('from') or event.get('user')
+        if user:
+            return user.get('id')
+        chat = event.get('chat')
+        if chat:
+            return chat.get('id')
+    return None
+
+
+def shard_for(user_id: Optional[int], workers: int, fallback: int = 0) -> int:
+    """Номер рабочего процесса для пользователя (мультипликативный хеш)"""
+    return user_hash(user_id if user_id is not None else fallback) % workers
+
+
+def worker_process(index: int, workers: int, queue: "multiprocessing.Queue",
+                   events: "multiprocessing.Queue"):
+    """Точка входа рабочего процесса"""
+    # Остановкой управляет фронт-процесс (маркер None в очереди), а не сигналы терминала
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    from .app import create_app  # импорт aiogram только в дочернем процессе
+    asyncio.run(create_app().run_worker(index, workers, queue, events))
+
+
+class Supervisor:
+    """Запуск, наблюдение и перезапуск рабочих процессов"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.context = multiprocessing.get_context('spawn')
+        self.queues: List[Any] = [self.context.Queue() for _ in range(workers)]
+        # События для мини-приложения: рабочие процессы -> первый (HTTP API и WebSocket)
+        self.events: Any = self.context.Queue()
+        self.processes: List[Any] = [None] * workers
+
+    def start_worker(self, index: int):
+        process = self.context.Process(
+            target=worker_process,
+            args=(index, self.workers, self.queues[index], self.events),
+            name=f"tigerrozetka-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+        print(f"👷 Рабочий процесс {index} запущен (pid {process.pid})")
+
+    def start(self):
+        for index in range(self.workers):
+            self.start_worker(index)
+
+    def route(self, update: Dict[str, Any]):
+        """Передача обновления рабочему процессу владельца пользователя"""
+        index = shard_for(extract_user_id(update), self.workers, update.get('update_id', 0))
+        self.queues[index].put(update)
+
+    async def monitor(self, interval: float = 1.0):
+        """Перезапуск упавших рабочих процессов (очередь сохраняется)"""
+        while True:
+            await asyncio.sleep(interval)
+            for index, process in enumerate(self.processes):
+                if process is not None and not process.is_alive():
+                    print(f"⚠️ Рабочий процесс {index} завершился (код {process.exitcode}), перезапуск")
+                    self.start_worker(index)
+
+    def stop(self, timeout: float = 20.0):
+        """Остановка: рабочие процессы дорабатывают очередь до маркера None"""
+        for queue in self.queues:
+            queue.put(None)
+        deadline = time.monotonic() + timeout
+        for process in self.processes:
+            if process is not None:
+                process.join(max(0.0, deadline - time.monotonic()))
+                if process.is_alive():
+                    print(f"⚠️ Рабочий процесс {process.pid} не завершился вовремя")
+                    process.kill()
+
+
+async def poll_updates(token: str, supervisor: Supervisor, stop: Optional[asyncio.Event] = None,
+                       timeout: int = 30):
+    """Long polling в фронт-процессе без разбора обновлений в модели aiogram"""
+    import aiohttp
+
+    stop = stop or asyncio.Event()
+    api_url = f"https://api.telegram.org/bot{token}/"
+    async with aiohttp.ClientSession() as session:
+        # Накопившиеся обновления не сбрасываются: их обработает этот процесс
+        await session.post(api_url + 'deleteWebhook', json={'drop_pending_updates': False})
+        offset: Optional[int] = None
+        backoff = 1.0  # Пауза после ошибки; удваивается до 30 с, пока ошибки повторяются
+        stopped = asyncio.create_task(stop.wait())
+        while not stop.is_set():
+            request = asyncio.create_task(_get_updates(session, api_url, offset, timeout))
+            await asyncio.wait({request, stopped}, return_when=asyncio.FIRST_COMPLETED)
+            if not request.done():
+                # Неподтвержденные обновления Telegram отдаст следующему процессу
+                request.cancel()
+                break
+            try:
+                payload = request.result()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                print(f"❌ Ошибка получения обновлений: {e}")
+                await _pause(stop, backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            if not payload.get('ok'):
+                # 409 (другой getUpdates или вебхук), 401 (неверный токен), 429 и т.п.:
+                # без паузы цикл сразу повторил бы запрос
+                retry_after = (payload.get('parameters') or {}).get('retry_after')
+                print(f"❌ Telegram отклонил getUpdates ({payload.get('error_code')}): "
+                      f"{payload.get('description')}")
+                await _pause(stop, float(retry_after) if retry_after else backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            backoff = 1.0
+
+            for update in payload.get('result', []):
+                offset = update['update_id'] + 1
+                supervisor.route(update)
+        stopped.cancel()
+
+        # Подтверждаем обновления, уже переданные рабочим процессам
+        if offset is not None:
+            await session.post(api_url + 'getUpdates', json={'offset': offset, 'limit': 1, 'timeout': 0})
+
+
+async def _pause(stop: asyncio.Event, seconds: float):
+    """Пауза перед повтором запроса, прерываемая остановкой"""
+    try:
+        await asyncio.wait_for(stop.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _get_updates(session: Any, api_url: str, offset: Optional[int], timeout: int) -> Dict[str, Any]:
+    import aiohttp
+
+    async with session.post(
+        api_url + 'getUpdates',
+        json={'offset': offset, 'timeout': timeout},
+        timeout=aiohttp.ClientTimeout(total=timeout + 10)
+    ) as response:
+        return await response.json()
+
+
+def run(workers: int, handoff: bool = False):
+    """Запуск бота в многопроцессном режиме"""
+    config = Config.from_env()
+    token = config.bot_token
+    if not token:
+        print("❌ BOT_TOKEN не установлен!")
+        return
+
+    lifecycle = Lifecycle(config.shutdown_timeout, config.pid_file)
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    print(f"🚀 TigerRozetka Bot: фронт-процесс, рабочих процессов: {workers}")
+
+    async def front():
+        # Рабочие процессы уже инициализируются - теперь можно останавливать предыдущий
+        if handoff and not await lifecycle.take_over():
+            return
+        lifecycle.write_pid_file()
+        lifecycle.install_signal_handlers()
+        monitor = asyncio.create_task(supervisor.monitor())
+        try:
+            await poll_updates(token, supervisor, lifecycle.stop_requested)
+        finally:
+            monitor.cancel()
+            lifecycle.release_pid_file()
+
+    try:
+        asyncio.run(front())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop(config.shutdown_timeout)
+
+
+# --- Бенчмарк масштабирования ---
+
+_BENCH_USERS = 20000
+
+
+def _bench_session() -> Any:
+    """Сессия aiogram без сети: ответы Bot API формируются локально"""
+    from aiogram.client.session.base import BaseSession
+    from aiogram.methods import EditMessageText, SendMessage
+
+    class OfflineSession(BaseSession):
+        async def make_request(self, bot: Any, method: Any, timeout: Optional[int] = None) -> Any:
+            if isinstance(method, (SendMessage, EditMessageText)):
+                return method.__returning__.model_validate({
+                    'message_id': 1, 'date': 1, 'text': method.text,
+                    'chat': {'id': getattr(method, 'chat_id', None) or 1, 'type': 'private'},
+                }, context={'bot': bot})
+            return True
+
+        async def stream_content(self, *args: Any, **kwargs: Any) -> Any:  # pragma: no cover
+            yield b''
+
+        async def close(self):
+            pass
+
+    return OfflineSession()
+
+
+def _bench_worker(database_path: str, shards: int, queue: "multiprocessing.Queue",
+                  done: "multiprocessing.Queue"):
+    """Рабочий процесс бенчмарка: настоящие Dispatcher, обработчики и хранилище"""
+    asyncio.run(_bench_feed(database_path, shards, queue, done))
+
+
+async def _bench_feed(database_path: str, shards: int, queue: "multiprocessing.Queue",
+                      done: "multiprocessing.Queue"):
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from .app import create_app
+
+    app = create_app(Config(bot_token='1:bench', database_path=database_path, database_shards=shards,
+                            throttle_limits={'user': (10 ** 6, 60.0)}))
+    app._bot = Bot(token='1:bench', session=_bench_session())
+    bot, dp = app.bot, app.dp
+    await app.manager.load_leaderboard()
+    done.put(0)  # Готов: импорт aiogram и загрузка рейтинга не входят в замер
+    handled = 0
+    while True:
+        data = queue.get()
+        if data is None:
+            break
+        await dp.feed_update(bot, Update.model_validate(data, context={'bot': bot}))
+        handled += 1
+    done.put(handled)
+
+
+def _bench_round(workers: int, updates: List[Dict[str, Any]], database_path: str, shards: int) -> float:
+    context = multiprocessing.get_context('spawn')
+    queues = [context.Queue() for _ in range(workers)]
+    done = context.Queue()
+    processes = [context.Process(target=_bench_worker, args=(database_path, shards, queue, done))
+                 for queue in queues]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        done.get()
+
+    started = time.perf_counter()
+    for update in updates:
+        queues[shard_for(extract_user_id(update), workers)].put(update)
+    for queue in queues:
+        queue.put(None)
+    handled = sum(done.get() for _ in processes)
+    elapsed = time.perf_counter() - started
+
+    for process in processes:
+        process.join()
+    assert handled == len(updates)
+    return elapsed
+
+
+def _bench_database(database_path: str, shards: int):
+    """База с _BENCH_USERS активными игроками (с индексом поиска)"""
+    from datetime import datetime
+
+    from .storage import SQLiteStorage
+
+    storage = SQLiteStorage(database_path, shards)
+    storage.init()
+    now = datetime.now()
+    rows: Dict[str, List[Any]] = {}
+    for user_id in range(1, _BENCH_USERS + 1):
+        rows.setdefault(storage.router.user_path(user_id), []).append(
+            (user_id, f"user{user_id}", f"Bench{user_id}", now, user_id % 50, user_id % 500))
+    for path, shard_rows in rows.items():
+        conn = sqlite3.connect(path)
+        conn.executemany('INSERT INTO bot_users (user_id, username, first_name, last_seen, level, wins) '
+                         'VALUES (?, ?, ?, ?, ?, ?)', shard_rows)
+        conn.commit()
+        conn.close()
+    storage.init()  # Заполнение индекса поиска по уже вставленным игрокам
+
+
+def _bench_updates(total_updates: int) -> List[Dict[str, Any]]:
+    """Смесь команд и кнопок, как у живого бота"""
+    from . import callbacks
+
+    refresh = callbacks.encode('refresh_players')
+    updates: List[Dict[str, Any]] = []
+    for i in range(total_updates):
+        user = {'id': 1 + (i * 7919) % _BENCH_USERS, 'is_bot': False, 'first_name': 'Bench'}
+        chat = {'id': user['id'], 'type': 'private'}
+        kind = i % 5
+        if kind == 4:
+            updates.append({'update_id': i, 'callback_query': {
+                'id': str(i), 'from': user, 'chat_instance': 'bench', 'data': refresh,
+                'message': {'message_id': 1, 'date': 1, 'chat': chat, 'text': 'bench'},
+            }})
+            continue
+        text = ('/duel', '/stats', '/top', '/duel user12')[kind]
+        updates.append({'update_id': i, 'message': {
+            'message_id': i, 'from': user, 'chat': chat, 'date': 1, 'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}],
+        }})
+    return updates
+
+
+def benchmark(max_workers: int, total_updates: int, shards: int = 1):
+    """Пропускная способность при 1..max_workers рабочих процессах
+
+    Обновления проходят через тот же Dispatcher, роутер и хранилище SQLite,
+    что и в работе; в сеть уходят только ответы Bot API (они формируются локально).
+    """
+    import tempfile
+
+    updates = _bench_updates(total_updates)
+    with tempfile.TemporaryDirectory() as tmp:
+        database_path = os.path.join(tmp, 'bench.db')
+        _bench_database(database_path, shards)
+
+        print(f"📊 Бенчмарк: {total_updates} обновлений, {_BENCH_USERS} игроков, "
+              f"шардов БД: {shards}, ядер: {os.cpu_count()}")
+        print("workers  updates/s  speedup")
+        baseline = None
+        for workers in range(1, max_workers + 1):
+            elapsed = _bench_round(workers, updates, database_path, shards)
+            throughput = total_updates / elapsed
+            baseline = baseline or throughput
+            print(f"{workers:7d}  {throughput:9.0f}  {throughput / baseline:6.2f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="TigerRozetka: многопроцессный режим бота")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    run_parser = subparsers.add_parser('run', help='запуск бота с N рабочими процессами')
+    run_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run_parser.add_argument('--handoff', action='store_true', help='перехватить работу у запущенного процесса')
+    bench_parser = subparsers.add_parser('bench', help='бенчмарк масштабирования')
+    bench_parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    bench_parser.add_argument('--updates', type=int, default=5000)
+    bench_parser.add_argument('--shards', type=int, default=1, help='число файлов SQLite')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.workers, args.handoff)
+    else:
+        benchmark(args.max_workers, args.updates, args.shards)
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka - сезонные (недельные) таблицы лидеров
+Инкрементальный учет побед за сезон, периодические снимки рейтинга и ротация
+"""
+
+import sqlite3
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .leaderboard import Leaderboard
+
+
+def season_key(moment: Optional[datetime] = None) -> str:
+    """Ключ сезона - ISO-неделя, например '2026-W42'"""
+    year, week, _ = (moment or datetime.now()).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class SeasonTracker:
+    """Учет текущего сезона
+
+    Результаты игр накапливаются дельтами в season_stats (одна UPSERT-строка
+    на игрока) и в таблице лидеров в памяти. Снимок сезона в season_rankings
+    пишется периодически и только если с прошлого снимка были изменения;
+    при смене недели сезон закрывается финальным снимком, а сезоны старше
+    retention удаляются.
+    """
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], retention: int = 12):
+        self.connect = connect  # Соединение с базой сезонных таблиц (Storage.connect_state)
+        self.retention = retention
+        self.current = season_key()
+        self.board = Leaderboard()  # Ключи таблицы - см. _board_stats
+        self._dirty = False
+
+    def init_tables(self, cursor: sqlite3.Cursor):
+        """Создание сезонных таблиц"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS season_stats (
+                season TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                wins INTEGER DEFAULT 0,
+                games INTEGER DEFAULT 0,
+                PRIMARY KEY (season, user_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS season_rankings (
+                season TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                wins INTEGER NOT NULL,
+                games INTEGER NOT NULL,
+                PRIMARY KEY (season, user_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_season_rankings_rank
+            ON season_rankings (season, rank)
+        ''')
+
+    @staticmethod
+    def _board_stats(wins: int, games: int) -> Tuple[int, int]:
+        """Показатели для Leaderboard: больше побед, при равенстве - меньше игр
+        (выше процент побед); таблица упорядочена по level DESC, wins DESC"""
+        return wins or 0, -(games or 0)
+
+    @staticmethod
+    def _season_entry(entry: Dict[str, int]) -> Dict[str, int]:
+        """Строка Leaderboard -> строка сезона с собственными именами полей"""
+        return {'rank': entry['rank'], 'user_id': entry['user_id'], 'wins': entry['level'], 'games': -entry['wins']}
+
+    def load(self):
+        """Загрузка накопленных результатов текущего сезона"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT user_id, wins, games FROM season_stats WHERE season = ?',
+            (self.current,)
+        )
+        self.board.load([(user_id, *self._board_stats(wins, games)) for user_id, wins, games in cursor.fetchall()])
+        conn.close()
+        # Загруженные данные могли прийти от других процессов - снимок нужен
+        self._dirty = len(self.board) > 0
+
+    def record(self, user_id: int, won: Optional[bool], moment: Optional[datetime] = None):
+        """Учет результата игры в текущем сезоне (ничья - игра без победы)"""
+        season = season_key(moment)
+        if season != self.current:
+            self.rotate(season)
+
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO season_stats (season, user_id, wins, games)
+            VALUES (?, ?, ?, 1)
+            ON CONFLICT(season, user_id) DO UPDATE SET
+                wins = wins + excluded.wins,
+                games = games + 1
+        ''', (season, user_id, 1 if won else 0))
+        conn.commit()
+        conn.close()
+
+        wins, games = self.stats(user_id)
+        self.board.update(user_id, *self._board_stats(wins + (1 if won else 0), games + 1))
+        self._dirty = True
+
+    def stats(self, user_id: int) -> Tuple[int, int]:
+        """(победы, игры) игрока в текущем сезоне"""
+        wins, negative_games = self.board.get(user_id) or (0, 0)
+        return wins, -negative_games
+
+    def rank(self, user_id: int) -> Optional[int]:
+        """Место игрока в текущем сезоне (при равных победах выше тот, у кого меньше игр)"""
+        return self.board.rank(user_id)
+
+    def top(self, n: int = 10) -> List[Dict[str, int]]:
+        """Лучшие игроки текущего сезона: rank, user_id, wins, games"""
+        return [self._season_entry(entry) for entry in self.board.top(n)]
+
+    def snapshot(self, force: bool = False) -> int:
+        """Материализация рейтинга текущего сезона в season_rankings"""
+        if not (self._dirty or force):
+            return 0
+        rows = [
+            (self.current, entry['user_id'], entry['rank'], entry['wins'], entry['games'])
+            for entry in map(self._season_entry, self.board.ranked())
+        ]
+
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM season_rankings WHERE season = ?', (self.current,))
+        cursor.executemany('''
+            INSERT INTO season_rankings (season, user_id, rank, wins, games)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+        conn.close()
+
+        self._dirty = False
+        return len(rows)
+
+    def rotate(self, new_season: Optional[str] = None):
+        """Закрытие текущего сезона и переход к новому"""
+        # Итоговый снимок строится по season_stats: в многопроцессном режиме
+        # таблица в памяти содержит только часть изменений
+        self.load()
+        self.snapshot(force=True)
+        self.current = new_season or season_key()
+        self.board = Leaderboard()
+        self.prune()
+        print(f"🗓️ Начат новый сезон: {self.current}")
+
+    def prune(self):
+        """Удаление сезонов старше retention"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT DISTINCT season FROM season_rankings ORDER BY season DESC LIMIT -1 OFFSET ?',
+            (self.retention,)
+        )
+        expired = [row[0] for row in cursor.fetchall()]
+        for season in expired:
+            cursor.execute('DELETE FROM season_rankings WHERE season = ?', (season,))
+            cursor.execute('DELETE FROM season_stats WHERE season = ?', (season,))
+        conn.commit()
+        conn.close()
+        if expired:
+            print(f"🧹 Удалено старых сезонов: {len(expired)}")
+
+    def past_rank(self, season: str, user_id: int) -> Optional[Dict[str, int]]:
+        """Итоговое место игрока в прошедшем сезоне (поиск по первичному ключу)"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT rank, wins, games FROM season_rankings WHERE season = ? AND user_id = ?',
+            (season, user_id)
+        )
+        row = cursor.fetchone()
+        conn.close()
+        if row:
+            return {'rank': row[0], 'wins': row[1], 'games': row[2]}
+        return None
+
+    def periodic(self):
+        """Шаг фоновой задачи: ротация по календарю и снимок изменений"""
+        season = season_key()
+        if season != self.current:
+            self.rotate(season)
+        else:
+            self.snapshot()
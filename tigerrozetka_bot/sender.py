@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - очередь исходящих сообщений с ограничением частоты
+Массовые рассылки (раунды турниров) не должны упираться в лимиты Bot API
+(около 30 сообщений в секунду на бота): сообщения отправляются из очереди
+не чаще rate в секунду (token bucket) и не более concurrency одновременно.
+На TelegramRetryAfter сообщение возвращается в начало очереди, а отправка
+приостанавливается на указанное время.
+
+Модуль не зависит от aiogram: функция отправки передается снаружи
+(BotApp.send_message), часы и sleep подменяются в симуляции турнира.
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+# (chat_id, текст, reply_markup)
+Outgoing = Tuple[int, str, Any]
+
+
+class RateLimitedSender:
+    """Очередь сообщений и задача, отправляющая их с ограничением частоты"""
+
+    def __init__(self, send: Callable[[int, str, Any], Awaitable[Any]], rate: float = 25.0,
+                 concurrency: int = 8, max_queue: int = 100000,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], Awaitable[Any]] = asyncio.sleep):
+        self.send = send
+        self.rate = rate
+        self.concurrency = concurrency
+        self.clock = clock
+        self.sleep = sleep
+        self.queue: Deque[Outgoing] = deque(maxlen=max_queue)
+        self._ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._in_flight: Set["asyncio.Task[Any]"] = set()
+        self._tokens = 0.0
+        self._updated: Optional[float] = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def submit(self, chat_id: int, text: str, reply_markup: Any = None) -> bool:
+        """Постановка сообщения в очередь; False - очередь переполнена"""
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            return False
+        self.queue.append((chat_id, text, reply_markup))
+        self._idle.clear()
+        self._ready.set()
+        return True
+
+    async def _acquire(self):
+        """Ожидание права на отправку (не чаще rate в секунду, всплеск - до rate)"""
+        while True:
+            now = self.clock()
+            if self._updated is None:
+                self._tokens = self.rate
+            else:
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            # Не меньше миллисекунды: иначе из-за округления можно ждать бесконечно малыми шагами
+            await self.sleep(max((1 - self._tokens) / self.rate, 0.001))
+
+    async def _deliver(self, message: Outgoing):
+        chat_id, text, reply_markup = message
+        try:
+            await self.send(chat_id, text, reply_markup)
+            self.sent += 1
+        except Exception as e:
+            retry_after = getattr(e, 'retry_after', None)
+            if retry_after:
+                # Flood control: повтор этого сообщения после паузы для всей очереди
+                self.retried += 1
+                self.queue.appendleft(message)
+                self._tokens = -retry_after * self.rate
+                self._ready.set()
+                return
+            self.failed += 1
+            print(f"❌ Ошибка отправки сообщения {chat_id}: {e}")
+
+    async def run(self):
+        """Задача отправки (запускается один раз на процесс)"""
+        while True:
+            if not self.queue:
+                if not self._in_flight:
+                    self._idle.set()
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            await self._acquire()
+            while len(self._in_flight) >= self.concurrency:
+                await asyncio.wait(self._in_flight, return_when=asyncio.FIRST_COMPLETED)
+            if not self.queue:
+                continue
+            task = asyncio.create_task(self._deliver(self.queue.popleft()))
+            self._in_flight.add(task)
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task: "asyncio.Task[Any]"):
+        self._in_flight.discard(task)
+        if not self.queue and not self._in_flight:
+            self._idle.set()
+        self._ready.set()
+
+    async def drain(self):
+        """Ожидание отправки всего, что уже в очереди"""
+        await self._idle.wait()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': len(self.queue),
+            'in_flight': len(self._in_flight),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'dropped': self.dropped,
+        }
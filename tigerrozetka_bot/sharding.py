@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka - шардирование SQLite-хранилища
+Пользователи и дуэли распределяются по N файлам по хешу user_id.
+Шард 0 - основной файл базы (в нем же остаются общие таблицы, например сезоны).
+
+Перешардирование существующей базы (бот должен быть остановлен):
+    python -m tigerrozetka_bot.sharding reshard --source bot_users.db --to 4 --output-dir resharded/
+"""
+
+import argparse
+import heapq
+import os
+import sqlite3
+import uuid
+import zlib
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+# Таблицы, распределяемые по шардам; остальные таблицы живут в шарде 0
+SHARDED_TABLES = ('bot_users', 'active_duels', 'duel_pair_stats')
+# Таблицы, строки которых живут в шарде пользователя из первой колонки (иначе - шард дуэли)
+USER_KEYED_TABLES = ('bot_users', 'duel_pair_stats')
+# Месячные таблицы истории дуэлей (см. SQLiteHistoryRepository) шардируются по id дуэли
+HISTORY_PREFIX = 'duel_history_'
+
+
+def user_hash(user_id: int) -> int:
+    """Мультипликативный хеш id пользователя (равномерен и для соседних id)"""
+    return (user_id * 2654435761) & 0xFFFFFFFF
+
+
+def shard_paths(base_path: str, count: int) -> List[str]:
+    """Пути файлов шардов: bot_users.db, bot_users.shard1.db, ..."""
+    root, ext = os.path.splitext(base_path)
+    return [base_path] + [f"{root}.shard{i}{ext or '.db'}" for i in range(1, count)]
+
+
+class ShardRouter:
+    """Выбор файла базы данных для пользователя или дуэли"""
+
+    def __init__(self, base_path: str, count: int = 1):
+        if count < 1:
+            raise ValueError("Количество шардов должно быть >= 1")
+        self.count = count
+        self.paths = shard_paths(base_path, count)
+
+    @property
+    def sharded(self) -> bool:
+        return self.count > 1
+
+    def user_shard(self, user_id: int) -> int:
+        return user_hash(user_id) % self.count
+
+    def user_path(self, user_id: int) -> str:
+        return self.paths[self.user_shard(user_id)]
+
+    def duel_shard(self, duel_id: str) -> int:
+        return zlib.crc32(duel_id.encode()) % self.count
+
+    def duel_path(self, duel_id: str) -> str:
+        return self.paths[self.duel_shard(duel_id)]
+
+    def new_duel_id(self, owner_user_id: int) -> str:
+        """UUID дуэли, попадающий в шард инициатора
+
+        Дуэль ищется по id без обращения к другим шардам, а строка лежит
+        рядом с данными инициатора. В среднем нужно count попыток генерации.
+        """
+        if not self.sharded:
+            return str(uuid.uuid4())
+        target = self.user_shard(owner_user_id)
+        while True:
+            duel_id = str(uuid.uuid4())
+            if self.duel_shard(duel_id) == target:
+                return duel_id
+
+    def group_users(self, user_ids: Iterable[int]) -> Dict[str, List[int]]:
+        """Группировка id пользователей по файлам шардов"""
+        groups: Dict[str, List[int]] = {}
+        for user_id in user_ids:
+            groups.setdefault(self.user_path(user_id), []).append(user_id)
+        return groups
+
+
+def merge_sorted(results: Sequence[List[Any]], key: Callable[[Any], Any], limit: int) -> List[Any]:
+    """Слияние уже отсортированных выборок шардов в общий top-N"""
+    if len(results) == 1:
+        return results[0][:limit]
+    merged = heapq.merge(*results, key=key)
+    return [row for _, row in zip(range(limit), merged)]
+
+
+def _copy_schema(source: sqlite3.Connection, target: sqlite3.Connection):
+    """Перенос схемы обычных таблиц и индексов (FTS-индекс бот строит сам)"""
+    rows = source.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%'
+        ORDER BY CASE type WHEN 'table' THEN 0 ELSE 1 END
+    ''').fetchall()
+    virtual = {name for _, name, sql in rows if sql.upper().startswith('CREATE VIRTUAL')}
+    for kind, name, sql in rows:
+        if name in virtual or any(name.startswith(f"{v}_") for v in virtual):
+            continue
+        target.execute(sql.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1)
+                       .replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+
+
+def reshard(source_base: str, source_count: int, target_count: int, output_dir: str):
+    """Офлайн-перераспределение базы по новому числу шардов"""
+    source_router = ShardRouter(source_base, source_count)
+    target_router = ShardRouter(os.path.join(output_dir, os.path.basename(source_base)), target_count)
+    os.makedirs(output_dir, exist_ok=True)
+    for path in target_router.paths:
+        if os.path.exists(path):
+            raise FileExistsError(f"Целевой файл уже существует: {path}")
+
+    targets = [sqlite3.connect(path) for path in target_router.paths]
+    # Месячные таблицы истории в разных шардах могут отличаться - схема берется из всех
+    for path in source_router.paths:
+        schema_source = sqlite3.connect(path)
+        for target in targets:
+            _copy_schema(schema_source, target)
+        schema_source.close()
+
+    moved = {table: 0 for table in SHARDED_TABLES}
+    moved['duel_history'] = 0
+    for index, path in enumerate(source_router.paths):
+        source = sqlite3.connect(path)
+        history_tables = [row[0] for row in source.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?", (f"{HISTORY_PREFIX}%",)
+        )]
+        present = {row[0] for row in source.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in SHARDED_TABLES + tuple(history_tables):
+            if table not in present:
+                continue  # База создана до появления таблицы
+            cursor = source.execute(f'SELECT * FROM {table}')
+            columns = [description[0] for description in cursor.description]
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            while True:
+                rows = cursor.fetchmany(1000)
+                if not rows:
+                    break
+                for row in rows:
+                    if table in USER_KEYED_TABLES:
+                        shard = target_router.user_shard(row[0])
+                    else:
+                        shard = target_router.duel_shard(row[0])
+                    targets[shard].execute(insert, row)
+                moved['duel_history' if table.startswith(HISTORY_PREFIX) else table] += len(rows)
+
+        # Несегментированные таблицы переносятся из основного файла в шард 0
+        if index == 0:
+            tables = [row[0] for row in source.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND sql NOT LIKE 'CREATE VIRTUAL%' "
+                "AND name NOT LIKE 'sqlite_%'"
+            )]
+            for table in tables:
+                if (table in SHARDED_TABLES or table.startswith('bot_users_search')
+                        or table.startswith(HISTORY_PREFIX)):
+                    continue
+                cursor = source.execute(f'SELECT * FROM {table}')
+                columns = [description[0] for description in cursor.description]
+                targets[0].executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    cursor
+                )
+        source.close()
+
+    for target in targets:
+        target.commit()
+        target.close()
+
+    print(f"✅ Перешардирование {source_count} -> {target_count} завершено: "
+          f"пользователей {moved['bot_users']}, дуэлей {moved['active_duels']}, "
+          f"в истории {moved['duel_history']}")
+    print(f"📁 Новые файлы: {', '.join(target_router.paths)}")
+    print("💡 Замените файлы базы и запустите бота с BOT_DB_SHARDS="
+          f"{target_count}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="TigerRozetka: шардирование SQLite")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    reshard_parser = subparsers.add_parser('reshard', help='перераспределить базу по новому числу шардов')
+    reshard_parser.add_argument('--source', default='bot_users.db', help='основной файл текущей базы')
+    reshard_parser.add_argument('--from', dest='source_count', type=int, default=1,
+                                help='текущее число шардов')
+    reshard_parser.add_argument('--to', dest='target_count', type=int, required=True,
+                                help='новое число шардов')
+    reshard_parser.add_argument('--output-dir', required=True, help='каталог для новых файлов')
+    args = parser.parse_args()
+
+    reshard(args.source, args.source_count, args.target_count, args.output_dir)
@@ -0,0 +1,1413 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka - слой хранения данных бота
+Интерфейсы репозиториев (пользователи, дуэли, история дуэлей, исходящие
+сообщения) и две
+реализации: SQLite (с опциональным шардированием) и в памяти - для тестов,
+бенчмарков и сравнения бэкендов без изменения обработчиков.
+
+Сравнение бэкендов:
+    python -m tigerrozetka_bot.storage bench --users 20000
+"""
+
+import argparse
+import heapq
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .sharding import HISTORY_PREFIX, ShardRouter, merge_sorted
+
+# Ключ keyset-пагинации списка соперников: (level, wins, user_id)
+PlayerKey = Tuple[int, int, int]
+# Счет личных встреч с точки зрения игрока: (победы, поражения, ничьи)
+PairRecord = Tuple[int, int, int]
+# Начальный рейтинг новых игроков (см. ratings.EloModel)
+DEFAULT_RATING = 1500.0
+
+
+def _player_from_row(row) -> Dict[str, Any]:
+    """Преобразование строки bot_users в словарь игрока"""
+    return {
+        'id': row[0],
+        'username': row[1],
+        'firstName': row[2],
+        'lastName': row[3],
+        'level': row[4],
+        'totalGames': row[5],
+        'wins': row[6],
+        'rating': round(row[7])
+    }
+
+
+def _rank_order(player: Dict[str, Any]) -> Tuple[int, int]:
+    return (-player['level'], -player['wins'])
+
+
+def _search_tokens(query: str) -> List[str]:
+    """Слова запроса поиска (как их видит токенизатор unicode61)"""
+    return re.findall(r'[^\W_]+', query.lstrip('@').lower())[:5]
+
+
+# --- Интерфейсы ---
+
+class UserRepository(ABC):
+    """Пользователи бота (таблица bot_users)"""
+
+    @abstractmethod
+    async def upsert(self, user_id: int, username: Optional[str], first_name: Optional[str],
+                     last_name: Optional[str], seen_at: datetime):
+        """Регистрация или обновление профиля без сброса статистики"""
+
+    @abstractmethod
+    async def get_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """level, rating, total_games, wins, losses"""
+
+    @abstractmethod
+    async def get_profile(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Имя и уровень игрока для уведомлений"""
+
+    @abstractmethod
+    async def get_brief(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Имена игроков по списку id"""
+
+    @abstractmethod
+    async def get_players(self, user_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Активные игроки по списку id (для списка игроков в сети)"""
+
+    @abstractmethod
+    async def touch(self, user_ids: List[int], seen_at: datetime):
+        """Запись last_seen пачкой (одна транзакция на шард); вернувшиеся снова активны"""
+
+    @abstractmethod
+    async def deactivate(self, user_ids: List[int]):
+        """Исключение из списков соперников и рейтинга (например, заблокировал бота)"""
+
+    @abstractmethod
+    async def deactivate_stale(self, before: datetime, limit: int) -> List[int]:
+        """Пометка неактивными не более limit игроков, не заходивших с before; их id"""
+
+    @abstractmethod
+    async def seen_since(self, since: datetime) -> List[Tuple[int, datetime]]:
+        """(user_id, last_seen) активных игроков, заходивших после since"""
+
+    @abstractmethod
+    async def active_top(self, exclude_user_id: Optional[int], since: datetime,
+                         limit: int) -> List[Dict[str, Any]]:
+        """Лучшие активные игроки по level, wins"""
+
+    @abstractmethod
+    async def active_page(self, exclude_user_id: Optional[int], since: datetime,
+                          cursor_key: Optional[PlayerKey], backwards: bool,
+                          limit: int) -> List[Dict[str, Any]]:
+        """Страница активных игроков после/до cursor_key (в порядке обхода)"""
+
+    @abstractmethod
+    async def search(self, query: str, exclude_user_id: Optional[int],
+                     limit: int) -> List[Dict[str, Any]]:
+        """Поиск по префиксу username или имени"""
+
+    @abstractmethod
+    async def record_result(self, user_id: int, won: Optional[bool]) -> Optional[Tuple[int, int]]:
+        """Учет игры (won=None - ничья); возвращает (level, wins) активного игрока или None"""
+
+    @abstractmethod
+    async def ranking_rows(self) -> List[Tuple[int, int, int]]:
+        """(user_id, level, wins) всех активных игроков"""
+
+    @abstractmethod
+    async def get_ratings(self, user_ids: List[int]) -> Dict[int, Tuple[float, int]]:
+        """(rating, total_games) зарегистрированных игроков из списка"""
+
+    @abstractmethod
+    async def apply_ratings(self, updates: List[Tuple[int, float, int]]):
+        """Запись (user_id, rating, level) пачкой: одна транзакция на шард"""
+
+    @abstractmethod
+    async def reset_ratings(self, rating: float, level: int):
+        """Начальный рейтинг и уровень всем игрокам (перед пересчетом по истории)"""
+
+
+class DuelRepository(ABC):
+    """Приглашения и активные дуэли (таблица active_duels)"""
+
+    @abstractmethod
+    async def create(self, player1_id: int, player2_id: Optional[int], expires_at: datetime) -> str:
+        """Создание дуэли; возвращает id"""
+
+    @abstractmethod
+    async def create_many(self, pairs: List[Tuple[int, int]], expires_at: datetime,
+                          status: str = 'pending') -> List[str]:
+        """Создание дуэлей пачкой (одна транзакция на шард); id в порядке pairs"""
+
+    @abstractmethod
+    async def get(self, duel_id: str) -> Optional[Dict[str, Any]]:
+        """player1_id, player2_id, status, expires_at"""
+
+    @abstractmethod
+    async def claim(self, duel_id: str, user_id: int) -> bool:
+        """Закрепление открытого вызова за игроком (атомарно)"""
+
+    @abstractmethod
+    async def set_status(self, duel_id: str, status: str):
+        """Обновление статуса дуэли"""
+
+    @abstractmethod
+    async def update_game(self, duel_id: str, status: str, game_data: Optional[bytes], expires_at: datetime):
+        """Статус, данные игры (BLOB, см. gamedata.py) и новый срок хранения принятой дуэли"""
+
+    @abstractmethod
+    async def delete(self, duel_id: str) -> bool:
+        """Удаление дуэли"""
+
+    @abstractmethod
+    async def delete_expired(self, now: datetime) -> int:
+        """Удаление истекших дуэлей; возвращает количество"""
+
+    @abstractmethod
+    async def pending_invites(self, now: datetime) -> List[Tuple[str, int, int, datetime]]:
+        """Неистекшие приглашения конкретному игроку: (id, player1_id, player2_id, expires_at)"""
+
+
+class HistoryRepository(ABC):
+    """Сыгранные дуэли: только добавление, таблицы duel_history_ГГГГММ по месяцам"""
+
+    @abstractmethod
+    async def archive(self, duel_id: str, player1_id: int, player2_id: int, winner_id: Optional[int],
+                      scores: Tuple[int, int], game_data: Optional[bytes], finished_at: datetime):
+        """Перенос дуэли из active_duels в историю (одной транзакцией)"""
+
+    @abstractmethod
+    async def recent(self, user_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Последние дуэли игрока, новые первыми"""
+
+    @abstractmethod
+    async def head_to_head(self, user_id: int, opponent_id: int, limit: int) -> List[Dict[str, Any]]:
+        """Последние дуэли двух игроков между собой, новые первыми"""
+
+    @abstractmethod
+    async def record_pair(self, player1_id: int, player2_id: int, winner_id: Optional[int],
+                          finished_at: datetime):
+        """Учет результата в счете личных встреч пары игроков"""
+
+    @abstractmethod
+    async def results(self) -> List[Tuple[int, int, Optional[int]]]:
+        """(player1_id, player2_id, winner_id) всех сыгранных дуэлей в порядке завершения"""
+
+    @abstractmethod
+    async def pair_stats(self, user_id: int, opponent_ids: List[int]) -> Dict[int, PairRecord]:
+        """Счет личных встреч (победы, поражения, ничьи) игрока с соперниками, которых он уже встречал"""
+
+
+class OutboxRepository(ABC):
+    """Исходящие уведомления, ожидающие (повторной) доставки"""
+
+    @abstractmethod
+    async def add(self, kind: str, payload: Dict[str, Any]) -> int:
+        """Постановка уведомления в очередь"""
+
+    @abstractmethod
+    async def pending(self, limit: int = 100) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """Недоставленные уведомления (id, kind, payload) в порядке постановки"""
+
+    @abstractmethod
+    async def mark_sent(self, message_ids: List[int]):
+        """Удаление доставленных уведомлений"""
+
+    @abstractmethod
+    async def mark_failed(self, message_id: int):
+        """Учет неудачной попытки доставки"""
+
+
+class Storage(ABC):
+    """Набор репозиториев одного бэкенда"""
+
+    name = 'base'
+
+    def __init__(self, users: UserRepository, duels: DuelRepository, history: HistoryRepository,
+                 outbox: OutboxRepository):
+        self.users = users
+        self.duels = duels
+        self.history = history
+        self.outbox = outbox
+
+    def init(self):
+        """Подготовка хранилища (создание схемы)"""
+
+    @abstractmethod
+    def connect_state(self) -> sqlite3.Connection:
+        """Соединение с базой таблиц отдельных функций (сезоны, турниры)"""
+
+
+# --- SQLite ---
+
+class SQLiteUserRepository(UserRepository):
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+        self.search_enabled = False  # Доступен ли FTS5-индекс поиска игроков
+
+    def init_shard(self, cursor: sqlite3.Cursor):
+        """Схема bot_users в одном файле базы"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS bot_users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                is_active BOOLEAN DEFAULT 1,
+                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                level INTEGER DEFAULT 1,
+                total_games INTEGER DEFAULT 0,
+                wins INTEGER DEFAULT 0,
+                losses INTEGER DEFAULT 0,
+                rating REAL DEFAULT 1500,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Базы, созданные до появления рейтинга
+        cursor.execute('PRAGMA table_info(bot_users)')
+        if 'rating' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f'ALTER TABLE bot_users ADD COLUMN rating REAL DEFAULT {DEFAULT_RATING}')
+
+        # Индекс для постраничного просмотра соперников (keyset по level, wins, user_id).
+        # Частичный: неактивные игроки (см. deactivate_stale) в него не попадают
+        cursor.execute('DROP INDEX IF EXISTS idx_bot_users_ranking')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bot_users_active_ranking
+            ON bot_users (level DESC, wins DESC, user_id DESC) WHERE is_active = 1
+        ''')
+        # Недавно заходившие (игроки в сети из других процессов); только активные
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bot_users_seen
+            ON bot_users (last_seen) WHERE is_active = 1
+        ''')
+
+        self.init_search_index(cursor)
+
+    def init_search_index(self, cursor: sqlite3.Cursor):
+        """Префиксный индекс поиска игроков по username/first_name (SQLite FTS5)"""
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS bot_users_search USING fts5(
+                    username, first_name,
+                    prefix='2 3',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5 недоступен, поиск игроков через LIKE: {e}")
+            self.search_enabled = False
+            return
+
+        # Первичное заполнение индекса для уже зарегистрированных пользователей
+        cursor.execute('SELECT 1 FROM bot_users_search LIMIT 1')
+        if cursor.fetchone() is None:
+            cursor.execute('''
+                INSERT INTO bot_users_search (rowid, username, first_name)
+                SELECT user_id, COALESCE(username, ''), COALESCE(first_name, '')
+                FROM bot_users
+            ''')
+        self.search_enabled = True
+
+    def _query_shards(self, query: str, params: List[Any]) -> List[List[Any]]:
+        """Выполнение запроса во всех шардах"""
+        results = []
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            results.append(cursor.fetchall())
+            conn.close()
+        return results
+
+    async def upsert(self, user_id, username, first_name, last_name, seen_at):
+        conn = sqlite3.connect(self.router.user_path(user_id))
+        cursor = conn.cursor()
+
+        # UPSERT вместо INSERT OR REPLACE: замена строки сбрасывала level/wins
+        cursor.execute('''
+            INSERT INTO bot_users
+            (user_id, username, first_name, last_name, last_seen)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name,
+                last_name = excluded.last_name,
+                last_seen = excluded.last_seen,
+                is_active = 1
+        ''', (user_id, username, first_name, last_name, seen_at))
+
+        # Синхронизация индекса поиска (rowid = user_id)
+        if self.search_enabled:
+            cursor.execute('DELETE FROM bot_users_search WHERE rowid = ?', (user_id,))
+            cursor.execute(
+                'INSERT INTO bot_users_search (rowid, username, first_name) VALUES (?, ?, ?)',
+                (user_id, username or '', first_name or '')
+            )
+
+        conn.commit()
+        conn.close()
+
+    async def get_stats(self, user_id):
+        conn = sqlite3.connect(self.router.user_path(user_id))
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT level, total_games, wins, losses, rating
+            FROM bot_users
+            WHERE user_id = ?
+        ''', (user_id,))
+
+        result = cursor.fetchone()
+        conn.close()
+
+        if result:
+            return {
+                'level': result[0],
+                'total_games': result[1],
+                'wins': result[2],
+                'losses': result[3],
+                'rating': result[4]
+            }
+        return None
+
+    async def get_profile(self, user_id):
+        conn = sqlite3.connect(self.router.user_path(user_id))
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT first_name, level FROM bot_users WHERE user_id = ?',
+            (user_id,)
+        )
+        result = cursor.fetchone()
+        conn.close()
+
+        if result:
+            return {'first_name': result[0], 'level': result[1]}
+        return None
+
+    async def get_brief(self, user_ids):
+        users: Dict[int, Dict[str, Any]] = {}
+        for path, shard_user_ids in self.router.group_users(user_ids).items():
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(shard_user_ids))
+            cursor.execute(
+                f'SELECT user_id, username, first_name FROM bot_users WHERE user_id IN ({placeholders})',
+                shard_user_ids
+            )
+            users.update({row[0]: {'username': row[1], 'firstName': row[2]} for row in cursor.fetchall()})
+            conn.close()
+        return users
+
+    async def get_players(self, user_ids):
+        players: Dict[int, Dict[str, Any]] = {}
+        for path, shard_user_ids in self.router.group_users(user_ids).items():
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(shard_user_ids))
+            cursor.execute(f'''
+                SELECT user_id, username, first_name, last_name, level, total_games, wins, rating
+                FROM bot_users
+                WHERE is_active = 1 AND user_id IN ({placeholders})
+            ''', shard_user_ids)
+            players.update({row[0]: _player_from_row(row) for row in cursor.fetchall()})
+            conn.close()
+        return players
+
+    async def touch(self, user_ids, seen_at):
+        for path, shard_user_ids in self.router.group_users(user_ids).items():
+            conn = sqlite3.connect(path)
+            conn.executemany('UPDATE bot_users SET last_seen = ?, is_active = 1 WHERE user_id = ?',
+                             [(seen_at, user_id) for user_id in shard_user_ids])
+            conn.commit()
+            conn.close()
+
+    async def deactivate(self, user_ids):
+        for path, shard_user_ids in self.router.group_users(user_ids).items():
+            conn = sqlite3.connect(path)
+            placeholders = ','.join('?' * len(shard_user_ids))
+            conn.execute(f'UPDATE bot_users SET is_active = 0 WHERE user_id IN ({placeholders})', shard_user_ids)
+            conn.commit()
+            conn.close()
+
+    async def deactivate_stale(self, before, limit):
+        # Короткая транзакция на шард: выборка по частичному индексу idx_bot_users_seen
+        deactivated: List[int] = []
+        for path in self.router.paths:
+            if len(deactivated) >= limit:
+                break
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM bot_users WHERE is_active = 1 AND last_seen < ? LIMIT ?',
+                           (before, limit - len(deactivated)))
+            user_ids = [row[0] for row in cursor.fetchall()]
+            if user_ids:
+                placeholders = ','.join('?' * len(user_ids))
+                cursor.execute(f'UPDATE bot_users SET is_active = 0 WHERE user_id IN ({placeholders})', user_ids)
+                conn.commit()
+                deactivated.extend(user_ids)
+            conn.close()
+        return deactivated
+
+    async def seen_since(self, since):
+        seen: List[Tuple[int, datetime]] = []
+        for rows in self._query_shards(
+                'SELECT user_id, last_seen FROM bot_users WHERE is_active = 1 AND last_seen > ?', [since]):
+            seen.extend((user_id, datetime.fromisoformat(last_seen)) for user_id, last_seen in rows)
+        return seen
+
+    async def active_top(self, exclude_user_id, since, limit):
+        query = '''
+            SELECT user_id, username, first_name, last_name, level, total_games, wins, rating
+            FROM bot_users
+            WHERE is_active = 1 AND last_seen > ?
+        '''
+        params: List[Any] = [since]
+
+        if exclude_user_id:
+            query += ' AND user_id != ?'
+            params.append(exclude_user_id)
+
+        query += ' ORDER BY level DESC, wins DESC LIMIT ?'
+        params.append(limit)
+
+        # Top-N каждого шарда и слияние в общий top-N
+        rows = merge_sorted(self._query_shards(query, params),
+                            key=lambda row: (-row[4], -row[6]), limit=limit)
+        return [_player_from_row(row) for row in rows]
+
+    async def active_page(self, exclude_user_id, since, cursor_key, backwards, limit):
+        query = '''
+            SELECT user_id, username, first_name, last_name, level, total_games, wins, rating
+            FROM bot_users
+            WHERE is_active = 1 AND last_seen > ?
+        '''
+        params: List[Any] = [since]
+
+        if exclude_user_id:
+            query += ' AND user_id != ?'
+            params.append(exclude_user_id)
+
+        if cursor_key is not None:
+            query += ' AND (level, wins, user_id) > (?, ?, ?)' if backwards \
+                else ' AND (level, wins, user_id) < (?, ?, ?)'
+            params.extend(cursor_key)
+
+        if backwards:
+            query += ' ORDER BY level ASC, wins ASC, user_id ASC LIMIT ?'
+        else:
+            query += ' ORDER BY level DESC, wins DESC, user_id DESC LIMIT ?'
+        params.append(limit)
+
+        results = self._query_shards(query, params)
+        if backwards:
+            rows = merge_sorted(results, key=lambda row: (row[4], row[6], row[0]), limit=limit)
+        else:
+            rows = merge_sorted(results, key=lambda row: (-row[4], -row[6], -row[0]), limit=limit)
+        return [_player_from_row(row) for row in rows]
+
+    async def search(self, query, exclude_user_id, limit):
+        tokens = _search_tokens(query)
+        if not tokens:
+            return []
+
+        if self.search_enabled:
+            # Ограничиваем выборку из индекса, а не итоговый результат, чтобы
+            # короткий префикс не превращался в полный просмотр совпадений
+            match = ' AND '.join(f'"{token}"*' for token in tokens)
+            sql = '''
+                SELECT u.user_id, u.username, u.first_name, u.last_name, u.level, u.total_games, u.wins, u.rating
+                FROM (
+                    SELECT rowid FROM bot_users_search
+                    WHERE bot_users_search MATCH ?
+                    LIMIT ?
+                ) AS s
+                JOIN bot_users u ON u.user_id = s.rowid
+                WHERE u.is_active = 1 AND u.user_id != ?
+                ORDER BY u.level DESC, u.wins DESC
+                LIMIT ?
+            '''
+            params: List[Any] = [match, limit * 5, exclude_user_id or 0, limit]
+        else:
+            prefix = query.lstrip('@').strip().replace('%', '').replace('_', '\\_') + '%'
+            sql = '''
+                SELECT user_id, username, first_name, last_name, level, total_games, wins, rating
+                FROM bot_users
+                WHERE is_active = 1 AND user_id != ?
+                  AND (username LIKE ? ESCAPE '\\' OR first_name LIKE ? ESCAPE '\\')
+                ORDER BY level DESC, wins DESC
+                LIMIT ?
+            '''
+            params = [exclude_user_id or 0, prefix, prefix, limit]
+
+        rows = merge_sorted(self._query_shards(sql, params),
+                            key=lambda row: (-row[4], -row[6]), limit=limit)
+        return [_player_from_row(row) for row in rows]
+
+    async def record_result(self, user_id, won):
+        conn = sqlite3.connect(self.router.user_path(user_id))
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            UPDATE bot_users
+            SET total_games = total_games + 1,
+                wins = wins + ?,
+                losses = losses + ?
+            WHERE user_id = ?
+        ''', (1 if won else 0, 1 if won is False else 0, user_id))
+        cursor.execute('SELECT level, wins, is_active FROM bot_users WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+
+        conn.commit()
+        conn.close()
+
+        if row and row[2]:
+            return row[0], row[1]
+        return None
+
+    async def ranking_rows(self):
+        rows: List[Tuple[int, int, int]] = []
+        for shard_rows in self._query_shards(
+                'SELECT user_id, level, wins FROM bot_users WHERE is_active = 1', []):
+            rows.extend(shard_rows)
+        return rows
+
+    async def get_ratings(self, user_ids):
+        ratings: Dict[int, Tuple[float, int]] = {}
+        for path, shard_user_ids in self.router.group_users(user_ids).items():
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(shard_user_ids))
+            cursor.execute(
+                f'SELECT user_id, rating, total_games FROM bot_users WHERE user_id IN ({placeholders})',
+                shard_user_ids
+            )
+            ratings.update({row[0]: (row[1], row[2]) for row in cursor.fetchall()})
+            conn.close()
+        return ratings
+
+    async def apply_ratings(self, updates):
+        by_shard: Dict[str, List[Tuple[float, int, int]]] = {}
+        for user_id, rating, level in updates:
+            by_shard.setdefault(self.router.user_path(user_id), []).append((rating, level, user_id))
+        for path, rows in by_shard.items():
+            conn = sqlite3.connect(path)
+            conn.executemany('UPDATE bot_users SET rating = ?, level = ? WHERE user_id = ?', rows)
+            conn.commit()
+            conn.close()
+
+    async def reset_ratings(self, rating, level):
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            conn.execute('UPDATE bot_users SET rating = ?, level = ?', (rating, level))
+            conn.commit()
+            conn.close()
+
+
+class SQLiteDuelRepository(DuelRepository):
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+
+    def init_shard(self, cursor: sqlite3.Cursor):
+        """Схема active_duels в одном файле базы"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS active_duels (
+                id TEXT PRIMARY KEY,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                status TEXT DEFAULT 'pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at TIMESTAMP,
+                game_data TEXT,
+                FOREIGN KEY (player1_id) REFERENCES bot_users (user_id),
+                FOREIGN KEY (player2_id) REFERENCES bot_users (user_id)
+            )
+        ''')
+
+    async def create(self, player1_id, player2_id, expires_at):
+        duel_id = self.router.new_duel_id(player1_id)
+
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            INSERT INTO active_duels (id, player1_id, player2_id, expires_at)
+            VALUES (?, ?, ?, ?)
+        ''', (duel_id, player1_id, player2_id, expires_at))
+
+        conn.commit()
+        conn.close()
+
+        return duel_id
+
+    async def create_many(self, pairs, expires_at, status='pending'):
+        duel_ids = [self.router.new_duel_id(player1_id) for player1_id, _ in pairs]
+        by_shard: Dict[str, List[Tuple[Any, ...]]] = {}
+        for duel_id, (player1_id, player2_id) in zip(duel_ids, pairs):
+            by_shard.setdefault(self.router.duel_path(duel_id), []).append(
+                (duel_id, player1_id, player2_id, status, expires_at))
+        for path, rows in by_shard.items():
+            conn = sqlite3.connect(path)
+            conn.executemany('''
+                INSERT INTO active_duels (id, player1_id, player2_id, status, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            conn.commit()
+            conn.close()
+        return duel_ids
+
+    async def get(self, duel_id):
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT player1_id, player2_id, status, expires_at
+            FROM active_duels
+            WHERE id = ?
+        ''', (duel_id,))
+
+        result = cursor.fetchone()
+        conn.close()
+
+        if result:
+            return {
+                'player1_id': result[0],
+                'player2_id': result[1],
+                'status': result[2],
+                'expires_at': result[3]
+            }
+        return None
+
+    async def claim(self, duel_id, user_id):
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            UPDATE active_duels SET player2_id = ?
+            WHERE id = ? AND player2_id IS NULL AND player1_id != ?
+        ''', (user_id, duel_id, user_id))
+        claimed = cursor.rowcount > 0
+
+        conn.commit()
+        conn.close()
+        return claimed
+
+    async def set_status(self, duel_id, status):
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        cursor.execute(
+            'UPDATE active_duels SET status = ? WHERE id = ?',
+            (status, duel_id)
+        )
+
+        conn.commit()
+        conn.close()
+
+    async def update_game(self, duel_id, status, game_data, expires_at):
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        cursor.execute(
+            'UPDATE active_duels SET status = ?, game_data = ?, expires_at = ? WHERE id = ?',
+            (status, game_data, expires_at, duel_id)
+        )
+
+        conn.commit()
+        conn.close()
+
+    async def delete(self, duel_id):
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM active_duels WHERE id = ?', (duel_id,))
+        deleted = cursor.rowcount > 0
+        conn.commit()
+        conn.close()
+        return deleted
+
+    async def delete_expired(self, now):
+        deleted = 0
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+
+            cursor.execute('DELETE FROM active_duels WHERE expires_at < ?', (now,))
+            deleted += cursor.rowcount
+
+            conn.commit()
+            conn.close()
+        return deleted
+
+    async def pending_invites(self, now):
+        invites: List[Tuple[str, int, int, datetime]] = []
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, player1_id, player2_id, expires_at
+                FROM active_duels
+                WHERE status = 'pending' AND player2_id IS NOT NULL AND expires_at > ?
+            ''', (now,))
+            invites.extend(
+                (duel_id, player1_id, player2_id, datetime.fromisoformat(expires_at))
+                for duel_id, player1_id, player2_id, expires_at in cursor.fetchall()
+            )
+            conn.close()
+        return invites
+
+
+_HISTORY_COLUMNS = 'id, player1_id, player2_id, winner_id, score1, score2, finished_at'
+_HISTORY_TABLE = re.compile(rf'^{HISTORY_PREFIX}\d{{6}}$')
+
+
+def _history_from_row(row) -> Dict[str, Any]:
+    return {
+        'duel_id': row[0],
+        'player1_id': row[1],
+        'player2_id': row[2],
+        'winner_id': row[3],
+        'scores': (row[4], row[5]),
+        'finished_at': datetime.fromisoformat(row[6]) if isinstance(row[6], str) else row[6],
+    }
+
+
+class SQLiteHistoryRepository(HistoryRepository):
+    """История в файле шарда дуэли: перенос из active_duels - одна транзакция
+
+    Месячные таблицы держат индексы небольшими, а запрос «последние N»
+    обычно заканчивается на первой-второй таблице. Старые месяцы можно
+    выгрузить и удалить целиком (DROP TABLE) без перестроения индексов.
+    """
+
+    def __init__(self, router: ShardRouter):
+        self.router = router
+
+    def init_shard(self, cursor: sqlite3.Cursor):
+        """Счет личных встреч: строка пары хранится в шарде игрока с меньшим id"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS duel_pair_stats (
+                low_id INTEGER NOT NULL,
+                high_id INTEGER NOT NULL,
+                games INTEGER NOT NULL DEFAULT 0,
+                low_wins INTEGER NOT NULL DEFAULT 0,
+                high_wins INTEGER NOT NULL DEFAULT 0,
+                last_played_at TIMESTAMP,
+                PRIMARY KEY (low_id, high_id)
+            ) WITHOUT ROWID
+        ''')
+
+    @staticmethod
+    def partition(finished_at: datetime) -> str:
+        return f"{HISTORY_PREFIX}{finished_at:%Y%m}"
+
+    @staticmethod
+    def create_partition(cursor: sqlite3.Cursor, table: str):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                id TEXT PRIMARY KEY,
+                player1_id INTEGER NOT NULL,
+                player2_id INTEGER NOT NULL,
+                low_id INTEGER NOT NULL,
+                high_id INTEGER NOT NULL,
+                winner_id INTEGER,
+                score1 INTEGER NOT NULL,
+                score2 INTEGER NOT NULL,
+                finished_at TIMESTAMP NOT NULL,
+                game_data BLOB
+            )
+        ''')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_p1 ON {table} (player1_id, finished_at)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_p2 ON {table} (player2_id, finished_at)')
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_pair ON {table} (low_id, high_id, finished_at)')
+
+    @staticmethod
+    def partitions(cursor: sqlite3.Cursor) -> List[str]:
+        """Месячные таблицы шарда, новые первыми"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE ?",
+                       (f"{HISTORY_PREFIX}%",))
+        return sorted((name for (name,) in cursor.fetchall() if _HISTORY_TABLE.match(name)), reverse=True)
+
+    async def archive(self, duel_id, player1_id, player2_id, winner_id, scores, game_data, finished_at):
+        table = self.partition(finished_at)
+        conn = sqlite3.connect(self.router.duel_path(duel_id))
+        cursor = conn.cursor()
+
+        self.create_partition(cursor, table)
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO {table}
+                (id, player1_id, player2_id, low_id, high_id, winner_id, score1, score2, finished_at, game_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (duel_id, player1_id, player2_id, min(player1_id, player2_id), max(player1_id, player2_id),
+              winner_id, scores[0], scores[1], finished_at, game_data))
+        cursor.execute('DELETE FROM active_duels WHERE id = ?', (duel_id,))
+
+        conn.commit()
+        conn.close()
+
+    def _collect(self, query: str, params: Dict[str, Any], limit: int) -> List[Dict[str, Any]]:
+        """Запрос по месячным таблицам всех шардов, пока не наберется limit строк"""
+        rows: List[Tuple[Any, ...]] = []
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            found = 0
+            for table in self.partitions(cursor):
+                cursor.execute(query.format(table=table), {**params, 'limit': limit - found})
+                batch = cursor.fetchall()
+                rows.extend(batch)
+                found += len(batch)
+                if found >= limit:
+                    break
+            conn.close()
+        rows.sort(key=lambda row: row[6], reverse=True)
+        return [_history_from_row(row) for row in rows[:limit]]
+
+    async def recent(self, user_id, limit):
+        # Каждая половина объединения идет по своему индексу и сама ограничена limit
+        query = f'''
+            SELECT * FROM (SELECT {_HISTORY_COLUMNS} FROM {{table}} WHERE player1_id = :user
+                           ORDER BY finished_at DESC LIMIT :limit)
+            UNION ALL
+            SELECT * FROM (SELECT {_HISTORY_COLUMNS} FROM {{table}} WHERE player2_id = :user
+                           ORDER BY finished_at DESC LIMIT :limit)
+            ORDER BY finished_at DESC LIMIT :limit
+        '''
+        return self._collect(query, {'user': user_id}, limit)
+
+    async def head_to_head(self, user_id, opponent_id, limit):
+        query = f'''
+            SELECT {_HISTORY_COLUMNS} FROM {{table}}
+            WHERE low_id = :low AND high_id = :high
+            ORDER BY finished_at DESC LIMIT :limit
+        '''
+        params = {'low': min(user_id, opponent_id), 'high': max(user_id, opponent_id)}
+        return self._collect(query, params, limit)
+
+    async def record_pair(self, player1_id, player2_id, winner_id, finished_at):
+        low, high = min(player1_id, player2_id), max(player1_id, player2_id)
+        conn = sqlite3.connect(self.router.user_path(low))
+        conn.execute('''
+            INSERT INTO duel_pair_stats (low_id, high_id, games, low_wins, high_wins, last_played_at)
+            VALUES (?, ?, 1, ?, ?, ?)
+            ON CONFLICT(low_id, high_id) DO UPDATE SET
+                games = games + 1,
+                low_wins = low_wins + excluded.low_wins,
+                high_wins = high_wins + excluded.high_wins,
+                last_played_at = excluded.last_played_at
+        ''', (low, high, int(winner_id == low), int(winner_id == high), finished_at))
+        conn.commit()
+        conn.close()
+
+    async def results(self):
+        rows: List[Tuple[Any, ...]] = []
+        for path in self.router.paths:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            for table in self.partitions(cursor):
+                cursor.execute(f'SELECT finished_at, player1_id, player2_id, winner_id FROM {table}')
+                rows.extend(cursor.fetchall())
+            conn.close()
+        # Время хранится в ISO-формате: строки сортируются как даты
+        rows.sort(key=lambda row: row[0])
+        return [row[1:] for row in rows]
+
+    async def pair_stats(self, user_id, opponent_ids):
+        # Пары группируются по шарду меньшего id: один запрос на шард
+        by_shard: Dict[int, List[Tuple[int, int]]] = {}
+        for opponent_id in set(opponent_ids):
+            if opponent_id != user_id:
+                low, high = min(user_id, opponent_id), max(user_id, opponent_id)
+                by_shard.setdefault(self.router.user_shard(low), []).append((low, high))
+
+        records: Dict[int, PairRecord] = {}
+        for shard, pairs in by_shard.items():
+            conn = sqlite3.connect(self.router.paths[shard])
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT low_id, high_id, games, low_wins, high_wins FROM duel_pair_stats
+                WHERE (low_id, high_id) IN (VALUES {', '.join(['(?, ?)'] * len(pairs))})
+            ''', [value for pair in pairs for value in pair])
+            for low, high, games, low_wins, high_wins in cursor.fetchall():
+                if low == user_id:
+                    records[high] = (low_wins, high_wins, games - low_wins - high_wins)
+                else:
+                    records[low] = (high_wins, low_wins, games - low_wins - high_wins)
+            conn.close()
+        return records
+
+
+class SQLiteOutboxRepository(OutboxRepository):
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+
+    def init_tables(self, cursor: sqlite3.Cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                attempts INTEGER DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+    async def add(self, kind, payload):
+        conn = sqlite3.connect(self.database_path)
+        cursor = conn.cursor()
+        cursor.execute(
+            'INSERT INTO outbox (kind, payload) VALUES (?, ?)',
+            (kind, json.dumps(payload, ensure_ascii=False))
+        )
+        message_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return message_id
+
+    async def pending(self, limit=100):
+        conn = sqlite3.connect(self.database_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT id, kind, payload FROM outbox ORDER BY id LIMIT ?', (limit,))
+        rows = [(row[0], row[1], json.loads(row[2])) for row in cursor.fetchall()]
+        conn.close()
+        return rows
+
+    async def mark_sent(self, message_ids):
+        if not message_ids:
+            return
+        conn = sqlite3.connect(self.database_path)
+        conn.executemany('DELETE FROM outbox WHERE id = ?', [(i,) for i in message_ids])
+        conn.commit()
+        conn.close()
+
+    async def mark_failed(self, message_id):
+        conn = sqlite3.connect(self.database_path)
+        conn.execute('UPDATE outbox SET attempts = attempts + 1 WHERE id = ?', (message_id,))
+        conn.commit()
+        conn.close()
+
+
+class SQLiteStorage(Storage):
+    """Хранилище в файлах SQLite (shards > 1 - шардирование по user_id)"""
+
+    name = 'sqlite'
+
+    def __init__(self, database_path: str, shards: int = 1):
+        self.router = ShardRouter(database_path, shards)
+        super().__init__(
+            SQLiteUserRepository(self.router),
+            SQLiteDuelRepository(self.router),
+            SQLiteHistoryRepository(self.router),
+            SQLiteOutboxRepository(database_path)
+        )
+
+    @property
+    def database_path(self) -> str:
+        return self.router.paths[0]
+
+    def connect_state(self):
+        # Таблицы функций живут в шарде 0 рядом с outbox
+        return sqlite3.connect(self.database_path)
+
+    def init(self):
+        for index, path in enumerate(self.router.paths):
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            self.users.init_shard(cursor)  # type: ignore[attr-defined]
+            self.duels.init_shard(cursor)  # type: ignore[attr-defined]
+            self.history.init_shard(cursor)  # type: ignore[attr-defined]
+            if index == 0:
+                self.outbox.init_tables(cursor)  # type: ignore[attr-defined]
+            conn.commit()
+            conn.close()
+
+
+# --- В памяти ---
+
+class InMemoryUserRepository(UserRepository):
+
+    def __init__(self):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+
+    async def upsert(self, user_id, username, first_name, last_name, seen_at):
+        row = self.rows.get(user_id)
+        if row is None:
+            row = self.rows[user_id] = {
+                'is_active': True, 'level': 1, 'total_games': 0, 'wins': 0, 'losses': 0,
+                'rating': DEFAULT_RATING, 'created_at': seen_at
+            }
+        row.update(username=username, first_name=first_name, last_name=last_name, last_seen=seen_at,
+                   is_active=True)
+
+    def _player(self, user_id: int) -> Dict[str, Any]:
+        row = self.rows[user_id]
+        return {
+            'id': user_id,
+            'username': row['username'],
+            'firstName': row['first_name'],
+            'lastName': row['last_name'],
+            'level': row['level'],
+            'totalGames': row['total_games'],
+            'wins': row['wins'],
+            'rating': round(row['rating'])
+        }
+
+    def _active(self, exclude_user_id: Optional[int], since: datetime):
+        for user_id, row in self.rows.items():
+            if row['is_active'] and row['last_seen'] > since and user_id != exclude_user_id:
+                yield user_id, row
+
+    async def get_stats(self, user_id):
+        row = self.rows.get(user_id)
+        if row is None:
+            return None
+        return {key: row[key] for key in ('level', 'total_games', 'wins', 'losses', 'rating')}
+
+    async def get_profile(self, user_id):
+        row = self.rows.get(user_id)
+        if row is None:
+            return None
+        return {'first_name': row['first_name'], 'level': row['level']}
+
+    async def get_brief(self, user_ids):
+        return {
+            user_id: {'username': self.rows[user_id]['username'],
+                      'firstName': self.rows[user_id]['first_name']}
+            for user_id in user_ids if user_id in self.rows
+        }
+
+    async def get_players(self, user_ids):
+        return {user_id: self._player(user_id) for user_id in user_ids
+                if user_id in self.rows and self.rows[user_id]['is_active']}
+
+    async def touch(self, user_ids, seen_at):
+        for user_id in user_ids:
+            if user_id in self.rows:
+                self.rows[user_id].update(last_seen=seen_at, is_active=True)
+
+    async def deactivate(self, user_ids):
+        for user_id in user_ids:
+            if user_id in self.rows:
+                self.rows[user_id]['is_active'] = False
+
+    async def deactivate_stale(self, before, limit):
+        stale = [user_id for user_id, row in self.rows.items()
+                 if row['is_active'] and row['last_seen'] < before][:limit]
+        await self.deactivate(stale)
+        return stale
+
+    async def seen_since(self, since):
+        return [(user_id, row['last_seen']) for user_id, row in self.rows.items()
+                if row['is_active'] and row['last_seen'] > since]
+
+    async def active_top(self, exclude_user_id, since, limit):
+        best = heapq.nsmallest(
+            limit, self._active(exclude_user_id, since),
+            key=lambda item: (-item[1]['level'], -item[1]['wins'])
+        )
+        return [self._player(user_id) for user_id, _ in best]
+
+    async def active_page(self, exclude_user_id, since, cursor_key, backwards, limit):
+        def key(item):
+            return (item[1]['level'], item[1]['wins'], item[0])
+
+        candidates = self._active(exclude_user_id, since)
+        if backwards:
+            if cursor_key is not None:
+                candidates = (item for item in candidates if key(item) > cursor_key)
+            page = heapq.nsmallest(limit, candidates, key=key)
+        else:
+            if cursor_key is not None:
+                candidates = (item for item in candidates if key(item) < cursor_key)
+            page = heapq.nlargest(limit, candidates, key=key)
+        return [self._player(user_id) for user_id, _ in page]
+
+    async def search(self, query, exclude_user_id, limit):
+        tokens = _search_tokens(query)
+        if not tokens:
+            return []
+        found = []
+        for user_id, row in self.rows.items():
+            if not row['is_active'] or user_id == exclude_user_id:
+                continue
+            words = _search_tokens(f"{row['username'] or ''} {row['first_name'] or ''}")
+            if all(any(word.startswith(token) for word in words) for token in tokens):
+                found.append(self._player(user_id))
+        return heapq.nsmallest(limit, found, key=_rank_order)
+
+    async def record_result(self, user_id, won):
+        row = self.rows.get(user_id)
+        if row is None:
+            return None
+        row['total_games'] += 1
+        if won is not None:
+            row['wins' if won else 'losses'] += 1
+        return (row['level'], row['wins']) if row['is_active'] else None
+
+    async def ranking_rows(self):
+        return [(user_id, row['level'], row['wins'])
+                for user_id, row in self.rows.items() if row['is_active']]
+
+    async def get_ratings(self, user_ids):
+        return {user_id: (self.rows[user_id]['rating'], self.rows[user_id]['total_games'])
+                for user_id in user_ids if user_id in self.rows}
+
+    async def apply_ratings(self, updates):
+        for user_id, rating, level in updates:
+            row = self.rows.get(user_id)
+            if row is not None:
+                row.update(rating=rating, level=level)
+
+    async def reset_ratings(self, rating, level):
+        for row in self.rows.values():
+            row.update(rating=rating, level=level)
+
+
+class InMemoryDuelRepository(DuelRepository):
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[str, Any]] = {}
+
+    async def create(self, player1_id, player2_id, expires_at):
+        duel_id = str(uuid.uuid4())
+        self.rows[duel_id] = {
+            'player1_id': player1_id,
+            'player2_id': player2_id,
+            'status': 'pending',
+            'expires_at': expires_at,
+            'game_data': None
+        }
+        return duel_id
+
+    async def create_many(self, pairs, expires_at, status='pending'):
+        duel_ids = []
+        for player1_id, player2_id in pairs:
+            duel_id = await self.create(player1_id, player2_id, expires_at)
+            self.rows[duel_id]['status'] = status
+            duel_ids.append(duel_id)
+        return duel_ids
+
+    async def get(self, duel_id):
+        row = self.rows.get(duel_id)
+        if row is None:
+            return None
+        return {key: row[key] for key in ('player1_id', 'player2_id', 'status', 'expires_at')}
+
+    async def claim(self, duel_id, user_id):
+        row = self.rows.get(duel_id)
+        if row is None or row['player2_id'] is not None or row['player1_id'] == user_id:
+            return False
+        row['player2_id'] = user_id
+        return True
+
+    async def set_status(self, duel_id, status):
+        if duel_id in self.rows:
+            self.rows[duel_id]['status'] = status
+
+    async def update_game(self, duel_id, status, game_data, expires_at):
+        if duel_id in self.rows:
+            self.rows[duel_id].update(status=status, game_data=game_data, expires_at=expires_at)
+
+    async def delete(self, duel_id):
+        return self.rows.pop(duel_id, None) is not None
+
+    async def delete_expired(self, now):
+        expired = [duel_id for duel_id, row in self.rows.items() if row['expires_at'] < now]
+        for duel_id in expired:
+            del self.rows[duel_id]
+        return len(expired)
+
+    async def pending_invites(self, now):
+        return [
+            (duel_id, row['player1_id'], row['player2_id'], row['expires_at'])
+            for duel_id, row in self.rows.items()
+            if row['status'] == 'pending' and row['player2_id'] is not None and row['expires_at'] > now
+        ]
+
+
+class InMemoryHistoryRepository(HistoryRepository):
+
+    def __init__(self, duels: InMemoryDuelRepository):
+        self.duels = duels
+        self.rows: List[Dict[str, Any]] = []  # В порядке завершения
+        self.pairs: Dict[Tuple[int, int], PairRecord] = {}
+
+    async def archive(self, duel_id, player1_id, player2_id, winner_id, scores, game_data, finished_at):
+        self.duels.rows.pop(duel_id, None)
+        self.rows.append({
+            'duel_id': duel_id,
+            'player1_id': player1_id,
+            'player2_id': player2_id,
+            'winner_id': winner_id,
+            'scores': tuple(scores),
+            'finished_at': finished_at,
+            'game_data': game_data,
+        })
+
+    def _latest(self, predicate, limit: int) -> List[Dict[str, Any]]:
+        found = []
+        for row in reversed(self.rows):
+            if predicate(row):
+                found.append({key: value for key, value in row.items() if key != 'game_data'})
+                if len(found) >= limit:
+                    break
+        return found
+
+    async def recent(self, user_id, limit):
+        return self._latest(lambda row: user_id in (row['player1_id'], row['player2_id']), limit)
+
+    async def head_to_head(self, user_id, opponent_id, limit):
+        pair = {user_id, opponent_id}
+        return self._latest(lambda row: {row['player1_id'], row['player2_id']} == pair, limit)
+
+    async def record_pair(self, player1_id, player2_id, winner_id, finished_at):
+        for user_id, opponent_id in ((player1_id, player2_id), (player2_id, player1_id)):
+            wins, losses, draws = self.pairs.get((user_id, opponent_id), (0, 0, 0))
+            if winner_id is None:
+                draws += 1
+            elif winner_id == user_id:
+                wins += 1
+            else:
+                losses += 1
+            self.pairs[(user_id, opponent_id)] = (wins, losses, draws)
+
+    async def results(self):
+        return [(row['player1_id'], row['player2_id'], row['winner_id']) for row in self.rows]
+
+    async def pair_stats(self, user_id, opponent_ids):
+        return {
+            opponent_id: self.pairs[(user_id, opponent_id)]
+            for opponent_id in opponent_ids if (user_id, opponent_id) in self.pairs
+        }
+
+
+class InMemoryOutboxRepository(OutboxRepository):
+
+    def __init__(self):
+        self.messages: Dict[int, Tuple[str, Dict[str, Any]]] = {}
+        self.attempts: Dict[int, int] = {}
+        self._next_id = 1
+
+    async def add(self, kind, payload):
+        message_id = self._next_id
+        self._next_id += 1
+        self.messages[message_id] = (kind, payload)
+        return message_id
+
+    async def pending(self, limit=100):
+        return [(message_id, kind, payload)
+                for message_id, (kind, payload) in list(self.messages.items())[:limit]]
+
+    async def mark_sent(self, message_ids):
+        for message_id in message_ids:
+            self.messages.pop(message_id, None)
+            self.attempts.pop(message_id, None)
+
+    async def mark_failed(self, message_id):
+        self.attempts[message_id] = self.attempts.get(message_id, 0) + 1
+
+
+class InMemoryStorage(Storage):
+    """Хранилище в памяти процесса (данные теряются при перезапуске)"""
+
+    name = 'memory'
+
+    def __init__(self):
+        duels = InMemoryDuelRepository()
+        super().__init__(InMemoryUserRepository(), duels, InMemoryHistoryRepository(duels),
+                         InMemoryOutboxRepository())
+        # Таблицы сезонов и турниров - в общей SQLite-базе в памяти, без файла на диске.
+        # База существует, пока открыто хотя бы одно соединение, поэтому одно держится всегда
+        self._state_uri = f'file:tigerrozetka-{uuid.uuid4().hex}?mode=memory&cache=shared'
+        self._state_keeper = sqlite3.connect(self._state_uri, uri=True)
+
+    def connect_state(self):
+        return sqlite3.connect(self._state_uri, uri=True)
+
+
+def create_storage(backend: str, database_path: str, shards: int = 1) -> Storage:
+    """Создание хранилища по имени бэкенда ('sqlite' или 'memory')"""
+    if backend == 'memory':
+        return InMemoryStorage()
+    if backend == 'sqlite':
+        return SQLiteStorage(database_path, shards)
+    raise ValueError(f"Неизвестный бэкенд хранилища: {backend}")
+
+
+# --- Сравнение бэкендов ---
+
+async def _bench_backend(storage: Storage, users: int, operations: int) -> Dict[str, float]:
+    from datetime import timedelta
+
+    storage.init()
+    now = datetime.now()
+    timings: Dict[str, float] = {}
+
+    started = time.perf_counter()
+    for user_id in range(1, users + 1):
+        await storage.users.upsert(user_id, f"user{user_id}", f"Игрок{user_id}", None, now)
+    timings['upsert'] = users / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for i in range(operations):
+        await storage.users.get_stats(1 + (i * 7919) % users)
+    timings['get_stats'] = operations / (time.perf_counter() - started)
+
+    week_ago = now - timedelta(days=7)
+    started = time.perf_counter()
+    for i in range(operations // 10):
+        await storage.users.active_page(i, week_ago, (1, 0, users - i), False, 11)
+    timings['active_page'] = (operations // 10) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    duel_ids = []
+    for i in range(operations):
+        duel_ids.append(await storage.duels.create(1 + i % users, 1 + (i + 1) % users,
+                                                   now + timedelta(minutes=5)))
+    timings['create_duel'] = operations / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for duel_id in duel_ids:
+        await storage.duels.get(duel_id)
+    timings['get_duel'] = operations / (time.perf_counter() - started)
+    return timings
+
+
+def benchmark(users: int, operations: int, shards: int):
+    """Операций в секунду для каждого бэкенда"""
+    import asyncio
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends: List[Storage] = [
+            InMemoryStorage(),
+            SQLiteStorage(os.path.join(directory, 'bench.db'), shards),
+        ]
+        print(f"📊 Бенчмарк хранилищ: пользователей {users}, операций {operations}, шардов SQLite {shards}")
+        results = {storage.name: asyncio.run(_bench_backend(storage, users, operations))
+                   for storage in backends}
+
+    operations_names = list(next(iter(results.values())))
+    print("operation     " + "".join(f"{name:>14}" for name in results))
+    for operation in operations_names:
+        print(f"{operation:<14}" + "".join(f"{results[name][operation]:>12.0f}/s" for name in results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="TigerRozetka: хранилище данных бота")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    bench_parser = subparsers.add_parser('bench', help='сравнение бэкендов хранилища')
+    bench_parser.add_argument('--users', type=int, default=20000)
+    bench_parser.add_argument('--operations', type=int, default=5000)
+    bench_parser.add_argument('--shards', type=int, default=1)
+    args = parser.parse_args()
+
+    benchmark(args.users, args.operations, args.shards)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - защита от спама
+Счетчики скользящего окна в памяти: на пользователя (все события), на
+пользователя и действие, а для вызовов на дуэль - еще на цель и на пару
+игрок-цель. Проверка события - O(1): на каждый ключ хранятся только
+счетчики текущего и предыдущего окна.
+
+Лимиты задаются в Config.throttle_limits или переменной окружения:
+    BOT_THROTTLE="refresh_players=5/30,challenge=5/60"   # событий/секунд
+"""
+
+import json
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from . import callbacks
+
+# Лимиты по умолчанию: область -> (событий, за секунд)
+DEFAULT_LIMITS: Dict[str, Tuple[int, float]] = {
+    'user': (40, 60),  # Все события одного пользователя
+    'refresh_players': (5, 30),
+    'players_page': (30, 60),
+    'search': (10, 60),
+    'challenge': (5, 60),  # Вызовы от одного игрока
+    'quick_match': (5, 60),
+    'challenge_target': (5, 300),  # Вызовы одной цели от всех игроков
+    'challenge_pair': (2, 300),  # Повторные вызовы одной и той же цели
+    'inline': (20, 60),
+}
+
+# Действия кнопок (см. callbacks.py), объединяемые в одну область лимита
+_CALLBACK_ACTIONS = {
+    'players_next': 'players_page',
+    'players_prev': 'players_page',
+    'players_online': 'refresh_players',
+}
+
+
+def parse_limits(spec: str) -> Dict[str, Tuple[int, float]]:
+    """Разбор строки вида 'challenge=5/60,inline=20/60'"""
+    limits: Dict[str, Tuple[int, float]] = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        scope, _, value = item.partition('=')
+        count, _, period = value.partition('/')
+        limits[scope.strip()] = (int(count), float(period))
+    return limits
+
+
+class SlidingWindowCounter:
+    """Приближенное скользящее окно: текущий счетчик + взвешенный предыдущий"""
+
+    def __init__(self):
+        # ключ -> [номер текущего окна, событий в текущем, событий в предыдущем]
+        self._windows: Dict[Tuple[Any, ...], List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def _window(self, key: Tuple[Any, ...], index: int) -> List[int]:
+        window = self._windows.get(key)
+        if window is None:
+            window = self._windows[key] = [index, 0, 0]
+        elif window[0] != index:
+            window[2] = window[1] if index - window[0] == 1 else 0
+            window[1] = 0
+            window[0] = index
+        return window
+
+    def estimate(self, key: Tuple[Any, ...], period: float, now: float) -> float:
+        """Оценка числа событий за последние period секунд"""
+        position = now / period
+        window = self._window(key, int(position))
+        return window[2] * (1 - (position - window[0])) + window[1]
+
+    def add(self, key: Tuple[Any, ...], period: float, now: float):
+        self._window(key, int(now / period))[1] += 1
+
+    def prune(self, periods: Dict[str, float], now: float) -> int:
+        """Удаление ключей без событий за два окна"""
+        stale = [
+            key for key, window in self._windows.items()
+            if key[0] not in periods or int(now / periods[key[0]]) - window[0] >= 2
+        ]
+        for key in stale:
+            del self._windows[key]
+        return len(stale)
+
+
+class ThrottlingMiddleware:
+    """Outer-middleware aiogram: отбрасывает события сверх лимитов"""
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.clock = clock
+        self.counter = SlidingWindowCounter()
+        self.checked = 0
+        self.throttled: Counter = Counter()
+
+    @staticmethod
+    def classify(event: Any) -> Tuple[Optional[str], Optional[int]]:
+        """(действие, цель) события: команда, префикс callback_data или inline"""
+        data = getattr(event, 'data', None)
+        if isinstance(data, str):
+            decoded = callbacks.decode(data)
+            if decoded is None:
+                return None, None
+            action, args = decoded
+            if action == 'challenge':
+                return action, args[0]
+            return _CALLBACK_ACTIONS.get(action, action), None
+        if hasattr(event, 'query') and hasattr(event, 'offset'):
+            return 'inline', None
+        text = getattr(event, 'text', None)
+        if isinstance(text, str) and text.startswith('/'):
+            command, _, args = text.partition(' ')
+            command = command[1:].split('@')[0]
+            return ('search' if command == 'duel' and args.strip() else command), None
+        return None, None
+
+    def scopes(self, user_id: int, action: Optional[str], target: Optional[int]) -> List[Tuple[Any, ...]]:
+        keys: List[Tuple[Any, ...]] = [('user', user_id)]
+        if action in self.limits:
+            keys.append((action, user_id))
+        if action == 'challenge' and target is not None:
+            keys.append(('challenge_target', target))
+            keys.append(('challenge_pair', user_id, target))
+        return keys
+
+    def allow(self, user_id: int, action: Optional[str] = None, target: Optional[int] = None) -> bool:
+        """Проверка и учет события; False - событие нужно отбросить"""
+        now = self.clock()
+        self.checked += 1
+        keys = self.scopes(user_id, action, target)
+        for key in keys:
+            count, period = self.limits[key[0]]
+            if self.counter.estimate(key, period, now) >= count:
+                self.throttled[key[0]] += 1
+                return False
+        for key in keys:
+            self.counter.add(key, self.limits[key[0]][1], now)
+        return True
+
+    async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+                       event: Any, data: Dict[str, Any]) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+
+        action, target = self.classify(event)
+        if self.allow(user.id, action, target):
+            return await handler(event, data)
+
+        # Отброшенный callback нужно закрыть, иначе кнопка останется в ожидании
+        if hasattr(event, 'data') and hasattr(event, 'answer'):
+            await event.answer("⏳ Слишком часто! Подождите немного", show_alert=False)
+        return None
+
+    async def prune(self):
+        """Периодическая очистка неактивных ключей"""
+        periods = {scope: period for scope, (_, period) in self.limits.items()}
+        self.counter.prune(periods, self.clock())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'checked': self.checked,
+            'throttled': dict(self.throttled),
+            'tracked_keys': len(self.counter),
+        }
+
+    async def http_stats(self, query: Dict[str, str]) -> Tuple[str, str, bytes]:
+        """GET /debug/throttling"""
+        return '200 OK', 'application/json; charset=utf-8', json.dumps(self.stats()).encode()
@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+TigerRozetka Bot - турниры на выбывание поверх обычных дуэлей
+Турнир создается с временем старта (python -m tigerrozetka_bot
+tournament-create), игроки записываются командой /tournament. В момент
+старта участники рассеиваются по рейтингу (сильнейшие встречаются в конце
+сетки, при неполной сетке лучшие посевы проходят первый раунд без игры),
+а дуэли раунда создаются одной пачкой со статусом 'accepted' и сроком
+жизни до конца раунда - обычное истечение active_duels и есть дедлайн.
+
+Итог дуэли турнира (save_duel_result) сразу переводит победителя в
+следующий раунд; когда решены все матчи раунда, создается следующий.
+Не сыгранный к дедлайну матч и ничья засчитываются игроку с более
+высоким посевом. Уведомления о раундах идут через RateLimitedSender.
+
+Таблицы турниров, как и сезоны, - в базе Storage.connect_state: шард 0 SQLite
+или база в памяти для бэкенда memory.
+
+Офлайн-прогон турнира на 1024 игрока:
+    python -m tigerrozetka_bot tournament-sim --players 1024
+"""
+
+import asyncio
+import random
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .manager import TigerRozetkaBotManager
+
+# Уведомление игрока: (user_id, текст, id дуэли для кнопки игры или None)
+Notify = Callable[[int, str, Optional[str]], Any]
+
+
+def bracket_order(size: int) -> List[int]:
+    """Посевы по местам сетки на size (степень двойки) игроков: 1, 8, 4, 5, 2, 7, 3, 6"""
+    order = [1]
+    while len(order) < size:
+        total = 2 * len(order) + 1
+        order = [seed for top in order for seed in (top, total - top)]
+    return order
+
+
+def round_name(round_number: int, rounds: int) -> str:
+    matches = 2 ** (rounds - round_number)
+    if matches == 1:
+        return "финал"
+    if matches == 2:
+        return "полуфинал"
+    return f"1/{matches} финала"
+
+
+def _parse_time(value: Any) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+@dataclass
+class Match:
+    round: int
+    slot: int
+    player1_id: Optional[int] = None
+    player2_id: Optional[int] = None
+    seed1: Optional[int] = None
+    seed2: Optional[int] = None
+    duel_id: Optional[str] = None
+    winner_id: Optional[int] = None
+    result: Optional[str] = None  # played, draw, walkover, bye
+
+    @property
+    def ready(self) -> bool:
+        return self.player1_id is not None and self.player2_id is not None
+
+    def favourite(self) -> Optional[int]:
+        """Игрок с более высоким посевом (меньший номер)"""
+        if self.player2_id is None or (self.seed1 or 0) <= (self.seed2 or 0):
+            return self.player1_id
+        return self.player2_id
+
+    def row(self, tournament_id: int) -> Tuple[Any, ...]:
+        return (tournament_id, self.round, self.slot, self.player1_id, self.player2_id,
+                self.seed1, self.seed2, self.duel_id, self.winner_id, self.result)
+
+
+@dataclass
+class Tournament:
+    id: int
+    name: str
+    round_minutes: int
+    size: int = 0
+    round: int = 0
+    round_deadline: Optional[datetime] = None
+    matches: Dict[Tuple[int, int], Match] = field(default_factory=dict)
+
+    @property
+    def rounds(self) -> int:
+        return self.size.bit_length() - 1
+
+    def round_matches(self, round_number: int) -> List[Match]:
+        return [self.matches[(round_number, slot)] for slot in range(self.size >> round_number)]
+
+
+class TournamentEngine:
+    """Идущие турниры процесса, выполняющего общие фоновые задачи"""
+
+    def __init__(self, manager: "TigerRozetkaBotManager", connect: Callable[[], sqlite3.Connection],
+                 notify: Optional[Notify] = None, result_grace: float = 30.0):
+        self.manager = manager
+        self.connect = connect  # Соединение с базой турнирных таблиц (Storage.connect_state)
+        self.notify = notify
+        # Запас после expires_at идущей дуэли: итог сохраняется примерно в этот момент
+        self.result_grace = timedelta(seconds=result_grace)
+        # Дуэль еще в ретрансляции (итог не сохранен); задается приложением, см. relay.py
+        self.in_progress: Callable[[str], bool] = lambda duel_id: False
+        self.running: Dict[int, Tournament] = {}
+        # Незавершенные дуэли турниров: duel_id -> (турнир, матч)
+        self.by_duel: Dict[str, Tuple[Tournament, Match]] = {}
+
+    def init_tables(self, cursor: sqlite3.Cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tournaments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'registration',
+                starts_at TIMESTAMP NOT NULL,
+                round_minutes INTEGER NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                round INTEGER NOT NULL DEFAULT 0,
+                round_deadline TIMESTAMP,
+                winner_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tournaments_status ON tournaments (status, starts_at)')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tournament_players (
+                tournament_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                seed INTEGER,
+                PRIMARY KEY (tournament_id, user_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tournament_matches (
+                tournament_id INTEGER NOT NULL,
+                round INTEGER NOT NULL,
+                slot INTEGER NOT NULL,
+                player1_id INTEGER,
+                player2_id INTEGER,
+                seed1 INTEGER,
+                seed2 INTEGER,
+                duel_id TEXT,
+                winner_id INTEGER,
+                result TEXT,
+                PRIMARY KEY (tournament_id, round, slot)
+            ) WITHOUT ROWID
+        ''')
+
+    # Регистрация (пишется сразу в базу: турнир может создать другой процесс)
+    def create(self, name: str, starts_at: datetime, round_minutes: int = 15) -> int:
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('INSERT INTO tournaments (name, starts_at, round_minutes) VALUES (?, ?, ?)',
+                       (name, starts_at, round_minutes))
+        tournament_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return tournament_id
+
+    def register(self, tournament_id: int, user_ids: List[int]) -> int:
+        """Запись игроков на турнир в статусе регистрации; возвращает число новых"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM tournaments WHERE id = ? AND status = 'registration'", (tournament_id,))
+        added = 0
+        if cursor.fetchone():
+            cursor.executemany('INSERT OR IGNORE INTO tournament_players (tournament_id, user_id) VALUES (?, ?)',
+                               [(tournament_id, user_id) for user_id in user_ids])
+            added = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return added
+
+    def open_registration(self, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Ближайший турнир с открытой регистрацией: id, name, starts_at, players, joined"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT t.id, t.name, t.starts_at, t.round_minutes,
+                   (SELECT COUNT(*) FROM tournament_players p WHERE p.tournament_id = t.id),
+                   EXISTS(SELECT 1 FROM tournament_players p WHERE p.tournament_id = t.id AND p.user_id = ?)
+            FROM tournaments t
+            WHERE t.status = 'registration'
+            ORDER BY t.starts_at LIMIT 1
+        ''', (user_id or 0,))
+        row = cursor.fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return {'id': row[0], 'name': row[1], 'starts_at': _parse_time(row[2]),
+                'round_minutes': row[3], 'players': row[4], 'joined': bool(row[5])}
+
+    # Состояние идущих турниров
+    def load(self):
+        """Загрузка идущих турниров и их сеток"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, name, round_minutes, size, round, round_deadline
+            FROM tournaments WHERE status = 'running'
+        ''')
+        self.running = {
+            row[0]: Tournament(row[0], row[1], row[2], row[3], row[4], _parse_time(row[5]))
+            for row in cursor.fetchall()
+        }
+        self.by_duel = {}
+        for tournament in self.running.values():
+            cursor.execute('''
+                SELECT round, slot, player1_id, player2_id, seed1, seed2, duel_id, winner_id, result
+                FROM tournament_matches WHERE tournament_id = ?
+            ''', (tournament.id,))
+            for row in cursor.fetchall():
+                match = Match(*row)
+                tournament.matches[(match.round, match.slot)] = match
+                if match.duel_id is not None and match.winner_id is None:
+                    self.by_duel[match.duel_id] = (tournament, match)
+        conn.close()
+        if self.running:
+            print(f"🏆 Загружено идущих турниров: {len(self.running)}")
+
+    def _save(self, tournament: Tournament, matches: List[Match], status: str = 'running',
+              winner_id: Optional[int] = None):
+        """Матчи и состояние турнира - одной транзакцией"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR REPLACE INTO tournament_matches
+                (tournament_id, round, slot, player1_id, player2_id, seed1, seed2, duel_id, winner_id, result)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [match.row(tournament.id) for match in matches])
+        cursor.execute('''
+            UPDATE tournaments SET status = ?, size = ?, round = ?, round_deadline = ?, winner_id = ?
+            WHERE id = ?
+        ''', (status, tournament.size, tournament.round, tournament.round_deadline, winner_id, tournament.id))
+        conn.commit()
+        conn.close()
+
+    def _notify(self, user_id: Optional[int], text: str, duel_id: Optional[str] = None):
+        if self.notify is not None and user_id is not None:
+            self.notify(user_id, text, duel_id)
+
+    # Ход турнира
+    async def start(self, tournament_id: int, now: Optional[datetime] = None) -> Optional[Tournament]:
+        """Посев по рейтингу, сетка и дуэли первого раунда"""
+        now = now or datetime.now()
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, round_minutes FROM tournaments WHERE id = ? AND status = 'registration'",
+                       (tournament_id,))
+        row = cursor.fetchone()
+        cursor.execute('SELECT user_id FROM tournament_players WHERE tournament_id = ?', (tournament_id,))
+        user_ids = [user_id for (user_id,) in cursor.fetchall()]
+        conn.close()
+        if row is None:
+            return None
+
+        tournament = Tournament(tournament_id, row[0], row[1])
+        if len(user_ids) < 2:
+            self._save(tournament, [], status='cancelled')
+            for user_id in user_ids:
+                self._notify(user_id, f"😔 Турнир «{tournament.name}» отменен: недостаточно участников")
+            return None
+
+        # Посев: рейтинг по убыванию, при равенстве - раньше зарегистрированный id
+        ratings = await self.manager.ratings.states(user_ids)
+        initial = self.manager.ratings.model.initial
+        seeded = sorted(user_ids, key=lambda user_id: (-ratings.get(user_id, (initial, 0))[0], user_id))
+        tournament.size = 1 << (len(seeded) - 1).bit_length()
+
+        conn = self.connect()
+        conn.executemany('UPDATE tournament_players SET seed = ? WHERE tournament_id = ? AND user_id = ?',
+                         [(seed, tournament_id, user_id) for seed, user_id in enumerate(seeded, 1)])
+        conn.commit()
+        conn.close()
+
+        order = bracket_order(tournament.size)
+        for round_number in range(1, tournament.rounds + 1):
+            for slot in range(tournament.size >> round_number):
+                tournament.matches[(round_number, slot)] = Match(round_number, slot)
+        for slot in range(tournament.size // 2):
+            match = tournament.matches[(1, slot)]
+            for side, seed in enumerate(order[2 * slot:2 * slot + 2]):
+                if seed <= len(seeded):
+                    setattr(match, f'player{side + 1}_id', seeded[seed - 1])
+                    setattr(match, f'seed{side + 1}', seed)
+
+        self.running[tournament_id] = tournament
+        print(f"🏆 Турнир «{tournament.name}» начат: {len(seeded)} игроков, {tournament.rounds} раундов")
+        await self._open_round(tournament, 1, now)
+        return tournament
+
+    async def _open_round(self, tournament: Tournament, round_number: int, now: datetime):
+        """Дуэли раунда одной пачкой; пропуск (bye) - сразу в следующий раунд"""
+        tournament.round = round_number
+        tournament.round_deadline = now + timedelta(minutes=tournament.round_minutes)
+        matches = tournament.round_matches(round_number)
+        playable = [match for match in matches if match.ready and match.winner_id is None]
+        if playable:
+            duel_ids = await self.manager.create_duels(
+                [(match.player1_id, match.player2_id) for match in playable],  # type: ignore[misc]
+                tournament.round_deadline, status='accepted'
+            )
+            for match, duel_id in zip(playable, duel_ids):
+                match.duel_id = duel_id
+                self.by_duel[duel_id] = (tournament, match)
+        self._save(tournament, matches)
+
+        stage = round_name(round_number, tournament.rounds)
+        deadline = f"{tournament.round_deadline:%H:%M}"
+        names = await self.manager.get_users_brief(
+            [player for match in playable for player in (match.player1_id, match.player2_id)])  # type: ignore[misc]
+        for match in playable:
+            for player, opponent in ((match.player1_id, match.player2_id), (match.player2_id, match.player1_id)):
+                opponent_name = (names.get(opponent) or {}).get('firstName') or f"игрок {opponent}"
+                self._notify(player, f"🏆 Турнир «{tournament.name}», {stage}!\n\n"
+                                     f"⚔️ Ваш соперник: {opponent_name}\n"
+                                     f"⏰ Сыграйте дуэль до {deadline}, иначе победа будет засчитана "
+                                     f"игроку с более высоким посевом", match.duel_id)
+
+        for match in matches:
+            if match.winner_id is None and not match.ready:
+                await self._resolve(tournament, match, match.favourite(), 'bye', now)
+
+    async def _resolve(self, tournament: Tournament, match: Match, winner_id: Optional[int],
+                       result: str, now: datetime):
+        match.winner_id, match.result = winner_id, result
+        if match.duel_id is not None:
+            self.by_duel.pop(match.duel_id, None)
+        loser_id = match.player2_id if winner_id == match.player1_id else match.player1_id
+        if result != 'bye':
+            self._notify(loser_id, f"💀 Турнир «{tournament.name}»: вы выбыли"
+                                   f" ({round_name(match.round, tournament.rounds)})")
+
+        if match.round == tournament.rounds:
+            del self.running[tournament.id]
+            self._save(tournament, [match], status='finished', winner_id=winner_id)
+            self._notify(winner_id, f"🥇 Вы победили в турнире «{tournament.name}»! Поздравляем!")
+            print(f"🥇 Турнир «{tournament.name}» завершен, победитель: {winner_id}")
+            return
+
+        following = tournament.matches[(match.round + 1, match.slot // 2)]
+        side = match.slot % 2 + 1
+        seed = match.seed1 if winner_id == match.player1_id else match.seed2
+        setattr(following, f'player{side}_id', winner_id)
+        setattr(following, f'seed{side}', seed)
+        self._save(tournament, [match, following])
+
+        if all(other.winner_id is not None for other in tournament.round_matches(match.round)):
+            await self._open_round(tournament, match.round + 1, now)
+
+    async def on_result(self, duel_id: str, winner_id: Optional[int], now: Optional[datetime] = None) -> bool:
+        """Итог дуэли (из save_duel_result); False - дуэль не турнирная"""
+        entry = self.by_duel.get(duel_id)
+        if entry is None:
+            return False
+        tournament, match = entry
+        if winner_id is None:
+            await self._resolve(tournament, match, match.favourite(), 'draw', now or datetime.now())
+        else:
+            await self._resolve(tournament, match, winner_id, 'played', now or datetime.now())
+        return True
+
+    async def tick(self, now: Optional[datetime] = None):
+        """Фоновая задача: старт турниров по времени и дедлайны раундов"""
+        now = now or datetime.now()
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM tournaments WHERE status = 'registration' AND starts_at <= ?", (now,))
+        due = [tournament_id for (tournament_id,) in cursor.fetchall()]
+        conn.close()
+        for tournament_id in due:
+            await self.start(tournament_id, now)
+
+        for tournament in list(self.running.values()):
+            if tournament.round_deadline is None or now < tournament.round_deadline:
+                continue
+            for match in tournament.round_matches(tournament.round):
+                if match.winner_id is not None or match.duel_id is None:
+                    continue
+                if self.in_progress(match.duel_id):
+                    continue  # Игра идет или итог сохраняется: он придет из save_duel_result
+                duel_info = await self.manager.get_duel_info(match.duel_id)
+                if duel_info is not None:
+                    expires_at = _parse_time(duel_info['expires_at'])
+                    if (duel_info['status'] == 'playing' and expires_at is not None
+                            and expires_at + self.result_grace > now):
+                        continue
+                    await self.manager.delete_duel(match.duel_id)
+                await self._resolve(tournament, match, match.favourite(), 'walkover', now)
+
+    def current_match(self, user_id: int) -> Optional[Tuple[Tournament, Match]]:
+        """Несыгранный матч игрока в идущем турнире"""
+        for tournament, match in self.by_duel.values():
+            if user_id in (match.player1_id, match.player2_id):
+                return tournament, match
+        return None
+
+
+# --- Офлайн-симуляция ---
+
+class _VirtualClock:
+    """Часы симуляции: sleep отправителя сдвигает время без ожидания"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+async def _simulate(players: int, no_show: float, rate: float, seed: int):
+    import os
+    import tempfile
+
+    from .config import Config
+    from .manager import TigerRozetkaBotManager
+    from .sender import RateLimitedSender
+
+    generator = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = TigerRozetkaBotManager(Config(database_path=os.path.join(tmp, 'tournament.db')))
+        user_ids = list(range(1000, 1000 + players))
+        for user_id in user_ids:
+            await manager.register_user(user_id, f"player{user_id}", f"Игрок {user_id}", None)
+        model = manager.ratings.model
+        await manager.storage.users.apply_ratings([
+            (user_id, rating, model.level(rating))
+            for user_id, rating in ((user_id, generator.gauss(model.initial, 200)) for user_id in user_ids)
+        ])
+        strength = await manager.storage.users.get_ratings(user_ids)
+
+        clock = _VirtualClock()
+        delivered: Dict[int, int] = {}
+
+        async def send(chat_id: int, text: str, reply_markup: Any):
+            delivered[chat_id] = delivered.get(chat_id, 0) + 1
+
+        sender = RateLimitedSender(send, rate=rate, clock=clock, sleep=clock.sleep)
+        sender_task = asyncio.create_task(sender.run())
+        engine = manager.tournaments
+        engine.notify = lambda user_id, text, duel_id: sender.submit(user_id, text)
+
+        moment = datetime.now()
+        tournament_id = engine.create("Симуляция", moment, round_minutes=15)
+        engine.register(tournament_id, user_ids)
+
+        started = time.perf_counter()
+        tournament = await engine.start(tournament_id, moment)
+        assert tournament is not None
+        print(f"🏆 Сетка на {tournament.size} мест, раундов: {tournament.rounds},"
+              f" старт: {(time.perf_counter() - started) * 1000:.0f} мс")
+
+        results: Dict[str, int] = {}
+        while tournament_id in engine.running:
+            round_number = tournament.round
+            round_started = time.perf_counter()
+            for match in tournament.round_matches(round_number):
+                if match.duel_id is None or match.winner_id is not None or generator.random() < no_show:
+                    continue
+                first, second = strength[match.player1_id][0], strength[match.player2_id][0]  # type: ignore[index]
+                chance = model.expected(first, second)
+                winner_id = match.player1_id if generator.random() < chance else match.player2_id
+                await manager.save_duel_result(match.duel_id, match.player1_id, match.player2_id,  # type: ignore[arg-type]
+                                               winner_id, (1, 0), b'')
+                if engine.running.get(tournament_id) is not tournament or tournament.round != round_number:
+                    break
+            if tournament_id in engine.running and tournament.round == round_number:
+                moment += timedelta(minutes=tournament.round_minutes, seconds=1)
+                await engine.tick(moment)
+            for match in tournament.round_matches(round_number):
+                results[match.result or '?'] = results.get(match.result or '?', 0) + 1
+            print(f"  {round_name(round_number, tournament.rounds):<14}"
+                  f" матчей {len(tournament.round_matches(round_number)):>4},"
+                  f" обработка {(time.perf_counter() - round_started) * 1000:.0f} мс")
+        await sender.drain()
+        sender_task.cancel()
+
+        final = tournament.matches[(tournament.rounds, 0)]
+        champion_seed = final.seed1 if final.winner_id == final.player1_id else final.seed2
+        print(f"🥇 Победитель: {final.winner_id} (посев {champion_seed})")
+        print(f"📊 Итоги матчей: {results}")
+        # Первые rate сообщений уходят начальным всплеском без ожидания - скорость
+        # считается только по остальным и только если виртуальное время шло
+        burst = min(sender.sent, int(rate))
+        if clock.now > 0 and sender.sent > burst:
+            speed = f"{(sender.sent - burst) / clock.now:.1f}/с после всплеска {burst} при лимите {rate:.0f}/с"
+        else:
+            speed = f"все в начальном всплеске, лимит {rate:.0f}/с"
+        print(f"📨 Уведомлений: {sender.sent} за {clock.now:.0f} с виртуального времени"
+              f" ({speed}), максимум одному игроку {max(delivered.values())}")
+
+
+def simulate(players: int = 1024, no_show: float = 0.05, rate: float = 25.0, seed: int = 1):
+    asyncio.run(_simulate(players, no_show, rate, seed))